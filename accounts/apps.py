@@ -4,4 +4,8 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
-    verbose_name = '用户管理'
\ No newline at end of file
+    verbose_name = '用户管理'
+
+    def ready(self):
+        # 注册教练搜索投影的增量更新
+        from . import signals  # noqa: F401
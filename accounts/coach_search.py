@@ -0,0 +1,199 @@
+"""
+教练搜索
+
+CoachSearchProfile 为每个教练保存冗余的统计数据：
+    rating / rating_count  CourseEvaluation.coach_rating 的平均值和评价数量
+    experience_years       UserProfile.experience_years
+    current_students       已通过的 CoachStudentRelation 数量
+    campus_ids             在职的 CampusCoach 校区ID
+相关数据变化时由 accounts.signals 调用 refresh 只重算受影响教练的对应字段，
+rebuild_coach_search 命令可全量重建。
+
+搜索在投影表上过滤和排序，使用 (排序字段, 教练ID) 键集分页：
+游标记录上一页最后一行的排序值和ID，翻页不需要 OFFSET，也不需要 COUNT。
+"""
+import base64
+import json
+
+from django.db.models import Avg, Count, Q
+
+from keshe.pagination import cursor_value
+
+from .models import Coach, CoachSearchProfile, UserProfile
+
+FIELDS = ('rating', 'experience_years', 'current_students', 'campus_ids')
+
+# 排序参数 -> 投影表上的排序字段
+ORDER_FIELDS = {
+    'created_at': 'coach__created_at',
+    'rating': 'rating',
+    'experience_years': 'experience_years',
+    'current_students': 'current_students',
+    'real_name': 'coach__user__real_name',
+    'hourly_rate': 'coach__hourly_rate',
+    'coach_level': 'coach__coach_level',
+}
+DEFAULT_ORDERING = '-created_at'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# ---------- 投影维护 ----------
+
+def _compute(user_ids, fields):
+    """计算指定教练用户的投影字段，返回 {user_id: {field: value}}"""
+    from campus.models import CampusCoach
+    from courses.models import CourseEvaluation
+    from reservations.models import CoachStudentRelation
+
+    values = {user_id: {} for user_id in user_ids}
+
+    if 'rating' in fields:
+        for user_id in user_ids:
+            values[user_id].update(rating=0, rating_count=0)
+        rows = CourseEvaluation.objects.filter(course__coach_id__in=user_ids).values('course__coach_id').annotate(
+            average=Avg('coach_rating'), total=Count('id')
+        ).order_by()
+        for row in rows:
+            values[row['course__coach_id']].update(
+                rating=round(row['average'], 2), rating_count=row['total']
+            )
+
+    if 'experience_years' in fields:
+        experience = dict(UserProfile.objects.filter(user_id__in=user_ids).values_list('user_id', 'experience_years'))
+        for user_id in user_ids:
+            values[user_id]['experience_years'] = experience.get(user_id, 0)
+
+    if 'current_students' in fields:
+        counts = dict(CoachStudentRelation.objects.filter(
+            coach_id__in=user_ids, status='approved'
+        ).values('coach_id').annotate(total=Count('id')).order_by().values_list('coach_id', 'total'))
+        for user_id in user_ids:
+            values[user_id]['current_students'] = counts.get(user_id, 0)
+
+    if 'campus_ids' in fields:
+        campuses = {user_id: [] for user_id in user_ids}
+        for user_id, campus_id in CampusCoach.objects.filter(
+            coach_id__in=user_ids, is_active=True
+        ).values_list('coach_id', 'campus_id').order_by('campus_id'):
+            campuses[user_id].append(campus_id)
+        for user_id, campus_ids in campuses.items():
+            values[user_id]['campus_ids'] = f",{','.join(map(str, campus_ids))}," if campus_ids else ''
+
+    return values
+
+
+def refresh(user_ids, fields=FIELDS):
+    """
+    重算指定教练用户（User ID）的投影字段，没有投影的教练会创建完整的投影。
+    返回更新的教练数量。
+    """
+    coach_ids = dict(Coach.objects.filter(user_id__in=set(user_ids)).values_list('user_id', 'id'))
+    if not coach_ids:
+        return 0
+
+    existing = {
+        profile.coach_id: profile
+        for profile in CoachSearchProfile.objects.filter(coach_id__in=coach_ids.values())
+    }
+    if len(existing) < len(coach_ids):
+        fields = FIELDS
+    values = _compute(list(coach_ids), fields)
+
+    to_create, to_update = [], []
+    for user_id, coach_id in coach_ids.items():
+        profile = existing.get(coach_id)
+        if profile is None:
+            to_create.append(CoachSearchProfile(coach_id=coach_id, **values[user_id]))
+            continue
+        for name, value in values[user_id].items():
+            setattr(profile, name, value)
+        to_update.append(profile)
+
+    if to_create:
+        CoachSearchProfile.objects.bulk_create(to_create, ignore_conflicts=True)
+    if to_update:
+        update_fields = list(values[next(iter(coach_ids))].keys()) + ['updated_at']
+        CoachSearchProfile.objects.bulk_update(to_update, update_fields)
+    return len(coach_ids)
+
+
+def rebuild_all(batch_size=500):
+    """全量重建投影，返回处理的教练数量"""
+    user_ids = list(Coach.objects.order_by('id').values_list('user_id', flat=True))
+    total = 0
+    for index in range(0, len(user_ids), batch_size):
+        total += refresh(user_ids[index:index + batch_size])
+    CoachSearchProfile.objects.exclude(coach__user_id__in=user_ids).delete()
+    return total
+
+
+# ---------- 搜索与键集分页 ----------
+
+def campus_filter(campus_ids):
+    """所属校区包含任一 campus_ids 的条件"""
+    condition = Q(pk__in=[])
+    for campus_id in campus_ids:
+        condition |= Q(campus_ids__contains=f',{int(campus_id)},')
+    return condition
+
+
+def parse_ordering(ordering):
+    """返回 (规范化的排序参数, 排序字段, 是否降序)，不支持的排序参数使用默认排序"""
+    name = (ordering or '').lstrip('-')
+    if name not in ORDER_FIELDS:
+        ordering, name = DEFAULT_ORDERING, DEFAULT_ORDERING.lstrip('-')
+    return ordering, ORDER_FIELDS[name], ordering.startswith('-')
+
+
+def _model_field(path):
+    model = CoachSearchProfile
+    for part in path.split('__'):
+        field = model._meta.get_field(part)
+        model = field.related_model or model
+    return field
+
+
+def _value(obj, path):
+    for part in path.split('__'):
+        obj = getattr(obj, part)
+    return obj
+
+
+def encode_cursor(profile, ordering):
+    _, field, _ = parse_ordering(ordering)
+    payload = json.dumps([ordering, cursor_value(_value(profile, field)), profile.coach_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor, ordering):
+    """返回 (排序值, 教练ID)；游标无效或与当前排序不一致时抛出 InvalidCursor"""
+    try:
+        cursor_ordering, value, coach_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        _, field, _ = parse_ordering(ordering)
+        if cursor_ordering != ordering:
+            raise InvalidCursor('游标与排序方式不一致')
+        return _model_field(field).to_python(value), int(coach_id)
+    except InvalidCursor:
+        raise
+    except Exception:
+        raise InvalidCursor('无效的分页游标')
+
+
+def order_queryset(queryset, ordering):
+    ordering, field, descending = parse_ordering(ordering)
+    prefix = '-' if descending else ''
+    return queryset.order_by(f'{prefix}{field}', f'{prefix}coach_id')
+
+
+def after_cursor(queryset, cursor, ordering):
+    """键集分页：取排在游标之后的行"""
+    ordering, field, descending = parse_ordering(ordering)
+    value, coach_id = decode_cursor(cursor, ordering)
+    lookup = 'lt' if descending else 'gt'
+    return queryset.filter(
+        Q(**{f'{field}__{lookup}': value})
+        | Q(**{field: value, f'coach_id__{lookup}': coach_id})
+    )
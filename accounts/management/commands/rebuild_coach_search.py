@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from accounts.coach_search import rebuild_all
+
+
+class Command(BaseCommand):
+    help = '全量重建教练搜索投影（评分、经验年数、当前学员数、所属校区）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='每批处理的教练数量（默认500）'
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'已重建 {total} 个教练的搜索投影'))
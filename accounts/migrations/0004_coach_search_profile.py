@@ -0,0 +1,78 @@
+# Generated by Django 4.2.24 on 2026-10-18 10:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_coach_search_profiles(apps, schema_editor):
+    """为已有教练生成搜索投影"""
+    from django.db.models import Avg, Count
+
+    Coach = apps.get_model('accounts', 'Coach')
+    CoachSearchProfile = apps.get_model('accounts', 'CoachSearchProfile')
+    UserProfile = apps.get_model('accounts', 'UserProfile')
+    CampusCoach = apps.get_model('campus', 'CampusCoach')
+    CourseEvaluation = apps.get_model('courses', 'CourseEvaluation')
+    CoachStudentRelation = apps.get_model('reservations', 'CoachStudentRelation')
+
+    ratings = {
+        row['course__coach_id']: row
+        for row in CourseEvaluation.objects.values('course__coach_id').annotate(
+            average=Avg('coach_rating'), total=Count('id')
+        ).order_by()
+    }
+    experience = dict(UserProfile.objects.values_list('user_id', 'experience_years'))
+    students = dict(
+        CoachStudentRelation.objects.filter(status='approved').values('coach_id').annotate(
+            total=Count('id')
+        ).order_by().values_list('coach_id', 'total')
+    )
+    campuses = {}
+    for coach_id, campus_id in CampusCoach.objects.filter(is_active=True).values_list('coach_id', 'campus_id').order_by('campus_id'):
+        campuses.setdefault(coach_id, []).append(campus_id)
+
+    profiles = []
+    for coach_id, user_id in Coach.objects.values_list('id', 'user_id'):
+        rating = ratings.get(user_id)
+        campus_ids = campuses.get(user_id)
+        profiles.append(CoachSearchProfile(
+            coach_id=coach_id,
+            rating=round(rating['average'], 2) if rating else 0,
+            rating_count=rating['total'] if rating else 0,
+            experience_years=experience.get(user_id, 0),
+            current_students=students.get(user_id, 0),
+            campus_ids=f",{','.join(map(str, campus_ids))}," if campus_ids else '',
+        ))
+    CoachSearchProfile.objects.bulk_create(profiles, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_increase_avatar_field_length'),
+        ('campus', '0003_auto_20250911_1813'),
+        ('courses', '0001_initial'),
+        ('reservations', '0006_classreminder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoachSearchProfile',
+            fields=[
+                ('coach', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_profile', serialize=False, to='accounts.coach', verbose_name='教练员')),
+                ('rating', models.DecimalField(decimal_places=2, default=0, max_digits=3, verbose_name='教练评分')),
+                ('rating_count', models.PositiveIntegerField(default=0, verbose_name='评价数量')),
+                ('experience_years', models.PositiveIntegerField(default=0, verbose_name='经验年数')),
+                ('current_students', models.PositiveIntegerField(default=0, verbose_name='当前学员数')),
+                ('campus_ids', models.CharField(blank=True, default='', max_length=255, verbose_name='所属校区ID')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '教练搜索投影',
+                'verbose_name_plural': '教练搜索投影',
+                'db_table': 'accounts_coach_search_profile',
+                'indexes': [models.Index(fields=['rating', 'coach'], name='accounts_co_rating_13444c_idx'), models.Index(fields=['experience_years', 'coach'], name='accounts_co_experie_e6be3b_idx'), models.Index(fields=['current_students', 'coach'], name='accounts_co_current_69823d_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_coach_search_profiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.24 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_coach_search_profile'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['user_type', 'real_name', 'id'], name='accounts_us_user_ty_8653be_idx'),
+        ),
+    ]
@@ -87,6 +87,10 @@ class User(AbstractUser):
         verbose_name = '用户'
         verbose_name_plural = '用户'
         db_table = 'accounts_user'
+        indexes = [
+            # 学员列表按姓名键集分页
+            models.Index(fields=['user_type', 'real_name', 'id']),
+        ]
     
     def __str__(self):
         return f"{self.real_name}({self.username})"
@@ -256,4 +260,58 @@ class Coach(models.Model):
         elif self.coach_level == 'senior':
             self.hourly_rate = 200.00
         
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class CoachSearchProfile(models.Model):
+    """
+    教练搜索投影：评分、经验、当前学员数和所属校区的冗余数据，
+    由 accounts.coach_search 在相关数据变化时增量更新，供教练搜索排序和分页使用
+    """
+    coach = models.OneToOneField(
+        Coach,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_profile',
+        verbose_name='教练员'
+    )
+    rating = models.DecimalField(
+        max_digits=3,
+        decimal_places=2,
+        default=0,
+        verbose_name='教练评分'
+    )
+    rating_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='评价数量'
+    )
+    experience_years = models.PositiveIntegerField(
+        default=0,
+        verbose_name='经验年数'
+    )
+    current_students = models.PositiveIntegerField(
+        default=0,
+        verbose_name='当前学员数'
+    )
+    campus_ids = models.CharField(
+        max_length=255,
+        blank=True,
+        default='',
+        verbose_name='所属校区ID'
+    )  # 格式为 ",1,3,"，便于用 contains 按校区过滤
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='更新时间'
+    )
+
+    class Meta:
+        verbose_name = '教练搜索投影'
+        verbose_name_plural = '教练搜索投影'
+        db_table = 'accounts_coach_search_profile'
+        indexes = [
+            models.Index(fields=['rating', 'coach']),
+            models.Index(fields=['experience_years', 'coach']),
+            models.Index(fields=['current_students', 'coach']),
+        ]
+
+    def __str__(self):
+        return f"{self.coach_id} - {self.rating}"
@@ -380,6 +380,17 @@ class CoachSerializer(serializers.ModelSerializer):
         ]
 
 
+class CoachSearchSerializer(CoachSerializer):
+    """教练搜索结果序列化器，统计数据取自搜索投影，不再逐个查询"""
+    current_students_count = serializers.IntegerField(source='search_profile.current_students', read_only=True)
+    rating = serializers.DecimalField(source='search_profile.rating', max_digits=3, decimal_places=2, read_only=True)
+    rating_count = serializers.IntegerField(source='search_profile.rating_count', read_only=True)
+    experience_years = serializers.IntegerField(source='search_profile.experience_years', read_only=True)
+
+    class Meta(CoachSerializer.Meta):
+        fields = CoachSerializer.Meta.fields + ['rating', 'rating_count', 'experience_years']
+
+
 class CoachApprovalSerializer(serializers.ModelSerializer):
     """教练员审核序列化器"""
 
@@ -0,0 +1,38 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from campus.models import CampusCoach
+from courses.models import Course, CourseEvaluation
+from reservations.models import CoachStudentRelation
+
+from . import coach_search
+from .models import Coach, UserProfile
+
+
+@receiver(post_save, sender=Coach)
+def create_coach_search_profile(sender, instance, created, **kwargs):
+    """新教练创建搜索投影"""
+    if created:
+        coach_search.refresh([instance.user_id])
+
+
+@receiver([post_save, post_delete], sender=CourseEvaluation)
+def refresh_coach_rating(sender, instance, **kwargs):
+    coach_id = Course.objects.filter(id=instance.course_id).values_list('coach_id', flat=True).first()
+    if coach_id:
+        coach_search.refresh([coach_id], ('rating',))
+
+
+@receiver(post_save, sender=UserProfile)
+def refresh_coach_experience(sender, instance, **kwargs):
+    coach_search.refresh([instance.user_id], ('experience_years',))
+
+
+@receiver([post_save, post_delete], sender=CoachStudentRelation)
+def refresh_coach_students(sender, instance, **kwargs):
+    coach_search.refresh([instance.coach_id], ('current_students',))
+
+
+@receiver([post_save, post_delete], sender=CampusCoach)
+def refresh_coach_campuses(sender, instance, **kwargs):
+    coach_search.refresh([instance.coach_id], ('campus_ids',))
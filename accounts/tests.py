@@ -0,0 +1,110 @@
+from datetime import date
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from campus.models import Campus, CampusCoach, CampusStudent
+from courses.models import Course, CourseEvaluation
+from reservations.models import CoachStudentRelation
+from .coach_search import rebuild_all
+from .models import Coach, CoachSearchProfile, User, UserProfile
+
+
+class CoachSearchTest(TestCase):
+    """教练搜索投影与键集分页测试"""
+
+    def setUp(self):
+        self.campus = Campus.objects.create(
+            name='测试校区', code='TEST001', address='测试地址', phone='13800138000'
+        )
+        self.other_campus = Campus.objects.create(
+            name='其他校区', code='TEST002', address='测试地址', phone='13800138009'
+        )
+        self.student = User.objects.create_user(
+            username='student', password='testpass123', phone='13800138001', user_type='student'
+        )
+        CampusStudent.objects.create(campus=self.campus, student=self.student)
+        self.coaches = [self.create_coach(index) for index in range(5)]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student)
+
+    def create_coach(self, index, campus=None):
+        user = User.objects.create_user(
+            username=f'coach{index}', password='testpass123', real_name=f'教练{index}',
+            phone=f'1390000000{index}', user_type='coach'
+        )
+        coach = Coach.objects.create(user=user, status='approved')
+        CampusCoach.objects.create(campus=campus or self.campus, coach=user)
+        return coach
+
+    def evaluate(self, coach, coach_rating, student):
+        course = Course.objects.create(
+            name='课程', course_type='private', campus=self.campus, coach=coach.user,
+            start_date=date.today(), end_date=date.today()
+        )
+        return CourseEvaluation.objects.create(
+            course=course, student=student, rating=5, coach_rating=coach_rating, facility_rating=5
+        )
+
+    def profile(self, coach):
+        return CoachSearchProfile.objects.get(coach=coach)
+
+    def test_projection_follows_related_changes(self):
+        coach = self.coaches[0]
+        self.evaluate(coach, 5, self.student)
+        evaluation = self.evaluate(coach, 2, self.student)
+        CoachStudentRelation.objects.create(
+            coach=coach.user, student=self.student, status='approved', applied_by='student'
+        )
+        UserProfile.objects.create(user=coach.user, experience_years=8)
+
+        profile = self.profile(coach)
+        self.assertEqual(str(profile.rating), '3.50')
+        self.assertEqual(profile.rating_count, 2)
+        self.assertEqual(profile.current_students, 1)
+        self.assertEqual(profile.experience_years, 8)
+        self.assertEqual(profile.campus_ids, f',{self.campus.id},')
+
+        evaluation.delete()
+        self.assertEqual(str(self.profile(coach).rating), '5.00')
+
+        CoachSearchProfile.objects.all().delete()
+        self.assertEqual(rebuild_all(), 5)
+        self.assertEqual(str(self.profile(coach).rating), '5.00')
+
+    def test_sort_by_rating_with_keyset_pagination(self):
+        self.create_coach(9, campus=self.other_campus)
+        for coach, coach_rating in zip(self.coaches, [3, 5, 1, 4, 5]):
+            self.evaluate(coach, coach_rating, self.student)
+
+        response = self.client.get('/api/accounts/coaches/', {'ordering': '-rating', 'page_size': 2})
+        self.assertEqual(response.data['count'], 5)
+        ids = [item['id'] for item in response.data['results']]
+
+        # 空 cursor 表示键集分页的第一页，同样不统计总数
+        with CaptureQueriesContext(connection) as context:
+            first = self.client.get('/api/accounts/coaches/', {'ordering': '-rating', 'page_size': 2, 'cursor': ''})
+        self.assertNotIn('count', first.data)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in context.captured_queries))
+        self.assertEqual([item['id'] for item in first.data['results']], ids)
+
+        cursor = response.data['next_cursor']
+        while cursor:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get('/api/accounts/coaches/', {
+                    'ordering': '-rating', 'page_size': 2, 'cursor': cursor
+                })
+            self.assertNotIn('count', response.data)
+            self.assertFalse(any('COUNT(' in query['sql'] for query in context.captured_queries))
+            ids.extend(item['id'] for item in response.data['results'])
+            cursor = response.data['next_cursor']
+
+        # 评分相同时按教练ID倒序
+        expected = [self.coaches[4], self.coaches[1], self.coaches[3], self.coaches[0], self.coaches[2]]
+        self.assertEqual(ids, [coach.id for coach in expected])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/accounts/coaches/', {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 400)
@@ -11,10 +11,10 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
-from .models import User, UserProfile, Coach
+from .models import User, UserProfile, Coach, CoachSearchProfile
 from .serializers import (
     UserSerializer, UserProfileSerializer, CoachSerializer, CoachApprovalSerializer,
-    UserRegistrationSerializer, UserProfileUpdateSerializer
+    UserRegistrationSerializer, UserProfileUpdateSerializer, CoachSearchSerializer
 )
 from django.db.models import Count, Q
 from courses.models import Course, CourseEnrollment
@@ -622,10 +622,19 @@ def approve_coach(request, coach_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def coach_list(request):
-    """获取教练员列表API"""
+    """
+    获取教练员列表API
+    
+    在教练搜索投影（CoachSearchProfile）上过滤和排序，支持按评分、经验年数、学员数等真实排序。
+    传 cursor 时使用键集分页（不统计总数，深分页同样快），响应中的 next_cursor 用于获取下一页；
+    不传 cursor 时按 page 分页并返回总数，兼容原有调用方式。
+    """
     try:
         from django.core.paginator import Paginator
-        from campus.models import CampusStudent, CampusCoach
+        from campus.models import CampusStudent
+        from keshe import pagination
+        from search import index as search_index
+        from . import coach_search
 
         # 获取查询参数
         status_filter = request.GET.get('status', 'approved')
@@ -635,59 +644,48 @@ def coach_list(request):
         gender_filter = request.GET.get('gender')
         age_min = request.GET.get('age_min')
         age_max = request.GET.get('age_max')
-        ordering = request.GET.get('ordering', '-created_at')
+        ordering, _, _ = coach_search.parse_ordering(request.GET.get('ordering', coach_search.DEFAULT_ORDERING))
+        cursor = request.GET.get('cursor')
         page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 12))
+        page_size = min(int(request.GET.get('page_size', 12)), 100)
 
         # 构建查询条件
-        queryset = Coach.objects.select_related('user').all()
+        queryset = CoachSearchProfile.objects.select_related('coach__user', 'coach__approved_by')
 
-        # 关键修改：学员只能查看本校区教练（通过CampusStudent中间表查询）
+        # 学员只能查看本校区教练
         if request.user.user_type == 'student':
-            # 查询学员所属的校区ID（通过CampusStudent表）
-            student_campuses = CampusStudent.objects.filter(
-                student=request.user,  # 学员关联的用户
+            student_campuses = list(CampusStudent.objects.filter(
+                student=request.user,
                 is_active=True
-            ).values_list('campus_id', flat=True)  # 提取校区ID列表
-
-            # 如果学员没有关联校区，返回空列表（避免报错）
-            if not student_campuses:
-                queryset = queryset.none()  # 返回空查询集
-            else:
-                # 筛选出教练所属校区在学员校区列表中的教练
-                # 教练的校区关联通过CampusCoach表
-                coach_ids_in_campus = CampusCoach.objects.filter(
-                    campus_id__in=student_campuses,
-                    is_active=True
-                ).values_list('coach_id', flat=True)  # 提取符合条件的教练用户ID
-
-                # 最终筛选：教练的user_id在上述列表中
-                queryset = queryset.filter(user_id__in=coach_ids_in_campus)
+            ).values_list('campus_id', flat=True))
+            queryset = queryset.filter(coach_search.campus_filter(student_campuses))
 
         # 状态筛选
         if status_filter and status_filter != 'all':
-            queryset = queryset.filter(status=status_filter)
+            queryset = queryset.filter(coach__status=status_filter)
 
         # 等级筛选
         if level_filter and level_filter != 'all':
-            queryset = queryset.filter(coach_level=level_filter)
+            queryset = queryset.filter(coach__coach_level=level_filter)
 
         # 校区筛选
         if campus_id:
-            queryset = queryset.filter(user__campus_id=campus_id)
+            queryset = queryset.filter(coach_search.campus_filter([campus_id]))
 
-        # 搜索筛选
+        # 搜索筛选（先用全文索引缩小候选范围）
         if search:
-            queryset = queryset.filter(
-                Q(user__real_name__icontains=search) |
-                Q(user__username__icontains=search) |
-                Q(user__phone__icontains=search) |
-                Q(achievements__icontains=search)
-            )
+            queryset = queryset.filter(search_index.search_filter(
+                search,
+                [('user', 'coach__user'), ('coach', 'coach')],
+                Q(coach__user__real_name__icontains=search) |
+                Q(coach__user__username__icontains=search) |
+                Q(coach__user__phone__icontains=search) |
+                Q(coach__achievements__icontains=search)
+            ))
 
         # 性别筛选
         if gender_filter:
-            queryset = queryset.filter(user__gender=gender_filter)
+            queryset = queryset.filter(coach__user__gender=gender_filter)
 
         # 年龄筛选
         if age_min or age_max:
@@ -699,7 +697,7 @@ def coach_list(request):
                     age_min = int(age_min)
                     # 计算最大出生日期（年龄最小对应的出生日期）
                     max_birth_date = today - timedelta(days=age_min * 365)
-                    queryset = queryset.filter(user__birth_date__lte=max_birth_date)
+                    queryset = queryset.filter(coach__user__birth_date__lte=max_birth_date)
                 except (ValueError, TypeError):
                     pass
 
@@ -708,39 +706,52 @@ def coach_list(request):
                     age_max = int(age_max)
                     # 计算最小出生日期（年龄最大对应的出生日期）
                     min_birth_date = today - timedelta(days=(age_max + 1) * 365)
-                    queryset = queryset.filter(user__birth_date__gte=min_birth_date)
+                    queryset = queryset.filter(coach__user__birth_date__gte=min_birth_date)
                 except (ValueError, TypeError):
                     pass
 
-        # 排序
-        if ordering:
-            if ordering == '-rating':
-                # 按评分排序（暂时使用创建时间，后续可以添加评分字段）
-                queryset = queryset.order_by('-created_at')
-            elif ordering == '-experience_years':
-                # 按经验排序（暂时使用创建时间，后续可以添加经验字段）
-                queryset = queryset.order_by('-created_at')
-            elif ordering == 'real_name':
-                queryset = queryset.order_by('user__real_name')
-            else:
-                queryset = queryset.order_by(ordering)
-
-        # 分页
-        paginator = Paginator(queryset, page_size)
-        page_obj = paginator.get_page(page)
+        # 排序（以教练ID作为第二排序键，保证顺序稳定）
+        queryset = coach_search.order_queryset(queryset, ordering)
 
-        serializer = CoachSerializer(page_obj.object_list, many=True)
+        if pagination.use_cursor(request):
+            # 键集分页：cursor 为空时取第一页，多取一行判断是否还有下一页
+            if cursor:
+                try:
+                    queryset = coach_search.after_cursor(queryset, cursor, ordering)
+                except coach_search.InvalidCursor as e:
+                    return Response({
+                        'success': False,
+                        'message': str(e)
+                    }, status=status.HTTP_400_BAD_REQUEST)
+            profiles = list(queryset[:page_size + 1])
+            has_next = len(profiles) > page_size
+            profiles = profiles[:page_size]
+            response_data = {
+                'success': True,
+                'page_size': page_size,
+                'has_next': has_next,
+            }
+        else:
+            paginator = Paginator(queryset, page_size)
+            page_obj = paginator.get_page(page)
+            profiles = list(page_obj.object_list)
+            has_next = page_obj.has_next()
+            response_data = {
+                'success': True,
+                'count': paginator.count,
+                'num_pages': paginator.num_pages,
+                'current_page': page,
+                'page_size': page_size,
+                'has_next': has_next,
+                'has_previous': page_obj.has_previous()
+            }
 
-        return Response({
-            'success': True,
-            'results': serializer.data,
-            'count': paginator.count,
-            'num_pages': paginator.num_pages,
-            'current_page': page,
-            'page_size': page_size,
-            'has_next': page_obj.has_next(),
-            'has_previous': page_obj.has_previous()
-        })
+        serializer = CoachSearchSerializer([profile.coach for profile in profiles], many=True)
+        response_data['results'] = serializer.data
+        response_data['next_cursor'] = (
+            coach_search.encode_cursor(profiles[-1], ordering) if has_next and profiles else None
+        )
+        return Response(response_data)
 
     except Exception as e:
         return Response({
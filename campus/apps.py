@@ -4,4 +4,8 @@ from django.apps import AppConfig
 class CampusConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'campus'
-    verbose_name = '校区管理'
\ No newline at end of file
+    verbose_name = '校区管理'
+
+    def ready(self):
+        # 注册校区学员/教练/分校区计数的维护
+        from . import signals  # noqa: F401
@@ -0,0 +1,111 @@
+"""
+校区和课程的冗余计数
+
+Campus.student_count / coach_count / branch_count 和 Course.enrollment_count 保存有效
+（is_active）关联记录的数量，序列化时直接读取字段，不再每次访问都 COUNT。
+
+关联记录保存/删除时由信号（keshe.signal_counters）比较 (所属记录ID, 是否有效) 的新旧值，
+在同一事务中用 F() 增减计数；QuerySet.update()/bulk_create() 不触发信号，调用方需自行调用
+Counter.move，或运行 reconcile_counters 命令重新统计。
+"""
+from django.db.models import Count, F
+
+from keshe.signal_counters import UNKNOWN, SignalCounter
+
+# 已注册的计数，由各应用的 signals 模块在启动时注册
+registry = []
+
+
+class CounterFieldsMixin:
+    """
+    计数字段只通过 F() 更新。整行保存已有记录时跳过计数字段，
+    避免把内存中已过期的计数写回数据库。
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not args and not self._state.adding and self.pk is not None
+            and kwargs.get('update_fields') is None and not kwargs.get('force_insert')
+        ):
+            skipped = set(self.counter_fields) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+
+class Counter(SignalCounter):
+    """model 中 is_active 为真的记录数，按外键 fk_name 计入 parent_model.field"""
+
+    def __init__(self, model, fk_name, parent_model, field, active_field='is_active'):
+        self.model = model
+        self.fk_name = fk_name
+        self.fk_attname = model._meta.get_field(fk_name).attname
+        self.parent_model = parent_model
+        self.field = field
+        self.active_field = active_field
+        self.name = field
+        self.fields = (fk_name, self.fk_attname, active_field)
+
+    def __str__(self):
+        return f'{self.parent_model.__name__}.{self.field}'
+
+    def key_of(self, instance):
+        """记录当前计入的所属记录ID，不计入时为 None；只读取已加载的字段，不触发查询"""
+        values = instance.__dict__
+        if self.fk_attname not in values or self.active_field not in values:
+            return UNKNOWN
+        if values[self.fk_attname] is None or not values[self.active_field]:
+            return None
+        return values[self.fk_attname]
+
+    def stored_key(self, instance):
+        """数据库中该记录当前计入的所属记录ID"""
+        row = self.model.objects.filter(pk=instance.pk).values_list(self.fk_attname, self.active_field).first()
+        if row is None or row[0] is None or not row[1]:
+            return None
+        return row[0]
+
+    def adjust(self, parent_id, delta):
+        """增减计数，应与对应的记录修改在同一事务中调用"""
+        if not delta or parent_id is None:
+            return
+        parents = self.parent_model.objects.filter(pk=parent_id)
+        if delta < 0:
+            parents = parents.filter(**{f'{self.field}__gte': -delta})
+        parents.update(**{self.field: F(self.field) + delta})
+
+    def actual_counts(self):
+        """重新统计的计数 {所属记录ID: 数量}"""
+        return dict(
+            self.model.objects.filter(**{self.active_field: True, f'{self.fk_attname}__isnull': False})
+            .values_list(self.fk_attname)
+            .annotate(total=Count('pk'))
+            .order_by()
+        )
+
+    def find_drift(self):
+        """计数与实际不一致的记录 [(所属记录ID, 保存的计数, 实际数量)]"""
+        actual = self.actual_counts()
+        return [
+            (parent_id, stored, actual.get(parent_id, 0))
+            for parent_id, stored in self.parent_model.objects.values_list('pk', self.field).order_by('pk')
+            if stored != actual.get(parent_id, 0)
+        ]
+
+    def repair(self, drift):
+        """把 find_drift 找出的计数改为实际数量"""
+        for parent_id, _, actual in drift:
+            self.parent_model.objects.filter(pk=parent_id).update(**{self.field: actual})
+
+
+def register(*args, **kwargs):
+    counter = Counter(*args, **kwargs)
+    registry.append(counter)
+    return counter
+
+
+def counters_for(model):
+    return [counter for counter in registry if counter.model is model]
@@ -0,0 +1,54 @@
+"""
+公开校区目录缓存
+
+注册页面等不带筛选条件的 campus_list 请求返回全部校区，内容与用户无关（校区管理员除外）。
+目录按版本号缓存预先渲染好的响应体和 ETag：校区变化或学员、教练计数变化时（事务提交后）
+递增版本号，下次请求重新生成。命中缓存时不查询数据库，客户端带 If-None-Match 且
+内容未变时返回 304。管理员姓名等关联数据的变化不触发失效，最多延迟 CACHE_TIMEOUT 秒。
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.utils.http import quote_etag
+from rest_framework.renderers import JSONRenderer
+
+from keshe import cache_versions
+
+CACHE_TIMEOUT = 600
+# 浏览器和代理可直接复用响应的秒数
+MAX_AGE = 60
+
+VERSION_CACHE_KEY = 'campus:directory:version'
+PAYLOAD_CACHE_KEY = 'campus:directory:{version}'
+
+
+def get_version():
+    return cache_versions.get_version(VERSION_CACHE_KEY)
+
+
+def invalidate():
+    cache_versions.bump(VERSION_CACHE_KEY)
+
+
+def build():
+    """查询并渲染目录，返回 (ETag, 响应体)"""
+    from .models import Campus
+    from .serializers import CampusSerializer
+
+    campuses = list(Campus.objects.select_related('manager', 'parent_campus'))
+    body = JSONRenderer().render({
+        'success': True,
+        'data': CampusSerializer(campuses, many=True).data,
+        'count': len(campuses)
+    })
+    return quote_etag(hashlib.md5(body).hexdigest()), body
+
+
+def get_directory():
+    """返回当前版本目录的 (ETag, 响应体)，未缓存时生成并写入缓存"""
+    key = PAYLOAD_CACHE_KEY.format(version=get_version())
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        cache.set(key, payload, CACHE_TIMEOUT)
+    return payload
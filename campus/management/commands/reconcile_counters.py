@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from campus import counters
+
+
+class Command(BaseCommand):
+    help = '重新统计校区学员/教练/分校区数和课程报名人数，检查并修复与实际不一致的计数'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='修复不一致的计数（默认只检查）'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for counter in counters.registry:
+            with transaction.atomic():
+                drift = counter.find_drift()
+                if options['fix']:
+                    counter.repair(drift)
+            total += len(drift)
+            for parent_id, stored, actual in drift:
+                self.stdout.write(f'  {counter} #{parent_id}：记录 {stored}，实际 {actual}')
+            self.stdout.write(f'{counter}：{len(drift)} 条不一致')
+
+        if not total:
+            self.stdout.write(self.style.SUCCESS('全部计数一致'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'已修复 {total} 条计数'))
+        else:
+            self.stdout.write(self.style.WARNING(f'共 {total} 条计数不一致，使用 --fix 修复'))
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.24 on 2026-10-18 11:07
+
+from django.db import migrations, models
+
+
+def backfill_campus_counters(apps, schema_editor):
+    """按有效的学员、教练和分校区统计每个校区的计数"""
+    from collections import defaultdict
+
+    from django.db.models import Count
+
+    Campus = apps.get_model('campus', 'Campus')
+    CampusStudent = apps.get_model('campus', 'CampusStudent')
+    CampusCoach = apps.get_model('campus', 'CampusCoach')
+
+    counts = defaultdict(dict)
+    # MySQL 不允许 UPDATE 的子查询引用被更新的表，分校区数不能用子查询回填，统一先统计再逐个校区更新
+    for model, fk_name, field in (
+        (CampusStudent, 'campus', 'student_count'),
+        (CampusCoach, 'campus', 'coach_count'),
+        (Campus, 'parent_campus', 'branch_count'),
+    ):
+        rows = model.objects.filter(is_active=True, **{f'{fk_name}__isnull': False}).values(fk_name).annotate(
+            total=Count('pk')
+        ).order_by()
+        for row in rows:
+            counts[row[fk_name]][field] = row['total']
+    for campus_id, fields in counts.items():
+        Campus.objects.filter(pk=campus_id).update(**fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campus', '0003_auto_20250911_1813'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campus',
+            name='branch_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='启用的分校区数'),
+        ),
+        migrations.AddField(
+            model_name='campus',
+            name='coach_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='在职教练数'),
+        ),
+        migrations.AddField(
+            model_name='campus',
+            name='student_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='在读学员数'),
+        ),
+        migrations.RunPython(backfill_campus_counters, migrations.RunPython.noop),
+    ]
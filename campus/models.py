@@ -2,8 +2,10 @@ from django.db import models
 from django.utils import timezone
 from accounts.models import User
 
+from .counters import CounterFieldsMixin
 
-class Campus(models.Model):
+
+class Campus(CounterFieldsMixin, models.Model):
     """校区模型"""
     CAMPUS_TYPE_CHOICES = [
         ('center', '中心校区'),
@@ -84,6 +86,22 @@ class Campus(models.Model):
         default=True,
         verbose_name='是否启用'
     )
+    # 以下计数由信号维护，见 campus.counters
+    student_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='在读学员数'
+    )
+    coach_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='在职教练数'
+    )
+    branch_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='启用的分校区数'
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name='创建时间'
@@ -92,6 +110,8 @@ class Campus(models.Model):
         auto_now=True,
         verbose_name='更新时间'
     )
+
+    counter_fields = ('student_count', 'coach_count', 'branch_count')
     
     class Meta:
         verbose_name = '校区'
@@ -105,12 +125,12 @@ class Campus(models.Model):
     @property
     def current_students_count(self):
         """当前学员数量"""
-        return self.students.filter(is_active=True).count()
+        return self.student_count
 
     @property
     def current_coaches_count(self):
         """当前教练数量"""
-        return self.coaches.filter(is_active=True).count()
+        return self.coach_count
     
     @property
     def is_center_campus(self):
@@ -121,7 +141,7 @@ class Campus(models.Model):
     def branch_campuses_count(self):
         """分校区数量（仅对中心校区有效）"""
         if self.is_center_campus:
-            return self.branch_campuses.filter(is_active=True).count()
+            return self.branch_count
         return 0
     
     def can_manage_by_user(self, user):
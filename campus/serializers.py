@@ -6,8 +6,8 @@ from accounts.serializers import UserSerializer
 class CampusSerializer(serializers.ModelSerializer):
     """校区序列化器"""
     manager_name = serializers.CharField(source='manager.real_name', read_only=True)
-    current_students_count = serializers.ReadOnlyField()
-    current_coaches_count = serializers.ReadOnlyField()
+    current_students_count = serializers.IntegerField(source='student_count', read_only=True)
+    current_coaches_count = serializers.IntegerField(source='coach_count', read_only=True)
     campus_type_display = serializers.CharField(source='get_campus_type_display', read_only=True)
     parent_campus_name = serializers.CharField(source='parent_campus.name', read_only=True)
     is_center_campus = serializers.ReadOnlyField()
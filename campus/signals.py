@@ -0,0 +1,60 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, directory
+from .models import Campus, CampusCoach, CampusStudent
+
+counters.register(CampusStudent, 'campus', Campus, 'student_count')
+counters.register(CampusCoach, 'campus', Campus, 'coach_count')
+counters.register(Campus, 'parent_campus', Campus, 'branch_count')
+
+
+@receiver(post_init, sender=Campus)
+@receiver(post_init, sender=CampusStudent)
+@receiver(post_init, sender=CampusCoach)
+def remember_counter_keys(sender, instance, **kwargs):
+    """记录加载时的所属校区和是否有效，保存时据此增减计数"""
+    for counter in counters.counters_for(sender):
+        counter.remember(instance)
+
+
+@receiver(pre_save, sender=Campus)
+@receiver(pre_save, sender=CampusStudent)
+@receiver(pre_save, sender=CampusCoach)
+def load_counter_keys(sender, instance, raw=False, **kwargs):
+    # 外键或 is_active 被延迟加载时，保存前从数据库读取原值
+    if not raw and instance.pk:
+        for counter in counters.counters_for(sender):
+            counter.load(instance)
+
+
+@receiver(post_save, sender=Campus)
+@receiver(post_save, sender=CampusStudent)
+@receiver(post_save, sender=CampusCoach)
+def update_counters_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """所属校区或是否有效变化时，在同一事务中更新校区的计数"""
+    if raw:
+        return
+    for counter in counters.counters_for(sender):
+        counter.saved(instance, created, update_fields)
+
+
+@receiver(post_delete, sender=Campus)
+@receiver(post_delete, sender=CampusStudent)
+@receiver(post_delete, sender=CampusCoach)
+def update_counters_on_delete(sender, instance, **kwargs):
+    for counter in counters.counters_for(sender):
+        counter.deleted(instance)
+
+
+
+@receiver(post_save, sender=Campus)
+@receiver(post_delete, sender=Campus)
+@receiver(post_save, sender=CampusStudent)
+@receiver(post_delete, sender=CampusStudent)
+@receiver(post_save, sender=CampusCoach)
+@receiver(post_delete, sender=CampusCoach)
+def invalidate_directory(sender, instance, **kwargs):
+    """校区信息或学员、教练计数变化后，提交时使公开校区目录失效"""
+    transaction.on_commit(directory.invalidate)
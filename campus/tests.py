@@ -0,0 +1,193 @@
+from datetime import date
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from courses.models import Course, CourseEnrollment
+from courses.serializers import CourseSerializer
+from . import directory
+from .models import Campus, CampusCoach, CampusStudent
+
+
+class CounterTest(TestCase):
+    """校区和课程冗余计数测试"""
+
+    def setUp(self):
+        self.center = Campus.objects.create(
+            name='中心校区', code='CENTER', campus_type='center', address='测试地址', phone='13800138000'
+        )
+        self.campus = Campus.objects.create(
+            name='分校区', code='BRANCH', parent_campus=self.center, address='测试地址', phone='13800138001'
+        )
+        self.coach = User.objects.create_user(
+            username='coach', password='testpass123', phone='13900000000', user_type='coach'
+        )
+        self.students = [
+            User.objects.create_user(
+                username=f'student{index}', password='testpass123', phone=f'1380000000{index}', user_type='student'
+            )
+            for index in range(3)
+        ]
+
+    def refreshed(self, instance):
+        instance.refresh_from_db()
+        return instance
+
+    def test_campus_counts_follow_membership_changes(self):
+        memberships = [CampusStudent.objects.create(campus=self.campus, student=student) for student in self.students]
+        CampusCoach.objects.create(campus=self.campus, coach=self.coach)
+        self.assertEqual(self.refreshed(self.campus).current_students_count, 3)
+        self.assertEqual(self.campus.current_coaches_count, 1)
+        self.assertEqual(self.refreshed(self.center).branch_campuses_count, 1)
+
+        # 停用、换校区、删除
+        memberships[0].is_active = False
+        memberships[0].save()
+        memberships[1].campus = self.center
+        memberships[1].save()
+        memberships[2].delete()
+        self.assertEqual(self.refreshed(self.campus).student_count, 0)
+        self.assertEqual(self.refreshed(self.center).student_count, 1)
+
+        # 延迟加载 is_active 时从数据库读取原值
+        membership = CampusStudent.objects.only('id').get(pk=memberships[0].pk)
+        membership.is_active = True
+        membership.save()
+        self.assertEqual(self.refreshed(self.campus).student_count, 1)
+
+        self.campus.is_active = False
+        self.campus.save()
+        self.assertEqual(self.refreshed(self.center).branch_count, 0)
+
+    def test_saving_stale_instance_keeps_counts(self):
+        stale = Campus.objects.get(pk=self.campus.pk)
+        CampusStudent.objects.create(campus=self.campus, student=self.students[0])
+        stale.name = '新名称'
+        stale.save()
+        campus = self.refreshed(self.campus)
+        self.assertEqual(campus.name, '新名称')
+        self.assertEqual(campus.student_count, 1)
+
+    def test_course_enrollment_count(self):
+        CampusCoach.objects.create(campus=self.campus, coach=self.coach)
+        course = Course.objects.create(
+            name='课程', description='描述', course_type='group', campus=self.campus, coach=self.coach,
+            max_students=2, start_date=date.today(), end_date=date.today()
+        )
+        enrollments = [CourseEnrollment.objects.create(course=course, student=student) for student in self.students[:2]]
+        course = self.refreshed(course)
+        self.assertEqual(course.current_enrollments_count, 2)
+        self.assertTrue(course.is_full)
+
+        enrollments[0].is_active = False
+        enrollments[0].save()
+        data = CourseSerializer(self.refreshed(course)).data
+        self.assertEqual(data['current_enrollments_count'], 1)
+        self.assertEqual(data['available_spots'], 1)
+        self.assertFalse(data['is_full'])
+
+        enrollments[1].delete()
+        self.assertEqual(self.refreshed(course).enrollment_count, 0)
+
+    def test_campus_list_query_count_is_constant(self):
+        for student in self.students:
+            CampusStudent.objects.create(campus=self.campus, student=student)
+        client = APIClient()
+        with CaptureQueriesContext(connection) as context:
+            response = client.get('/api/campus/api/list/', {'is_active': 'true'})
+        self.assertEqual(response.status_code, 200)
+        data = {item['code']: item for item in response.data['data']}
+        self.assertEqual(data['BRANCH']['current_students_count'], 3)
+        self.assertEqual(data['CENTER']['branch_campuses_count'], 1)
+
+        Campus.objects.create(name='分校区2', code='BRANCH2', parent_campus=self.center, address='地址', phone='1')
+        with CaptureQueriesContext(connection) as more:
+            client.get('/api/campus/api/list/', {'is_active': 'true'})
+        self.assertEqual(len(more.captured_queries), len(context.captured_queries))
+
+    def test_reconcile_counters(self):
+        CampusStudent.objects.create(campus=self.campus, student=self.students[0])
+        # 批量写入不触发信号，造成计数偏差
+        CampusStudent.objects.bulk_create([
+            CampusStudent(campus=self.campus, student=student) for student in self.students[1:]
+        ])
+        Campus.objects.filter(pk=self.center.pk).update(branch_count=5)
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('共 2 条计数不一致', out.getvalue())
+        self.assertEqual(self.refreshed(self.campus).student_count, 1)
+
+        call_command('reconcile_counters', '--fix', stdout=StringIO())
+        self.assertEqual(self.refreshed(self.campus).student_count, 3)
+        self.assertEqual(self.refreshed(self.center).branch_count, 1)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('全部计数一致', out.getvalue())
+
+
+class CampusDirectoryTest(TestCase):
+    """公开校区目录缓存测试"""
+
+    def setUp(self):
+        cache.clear()
+        self.campus = Campus.objects.create(
+            name='测试校区', code='TEST001', address='测试地址', phone='13800138000'
+        )
+        self.client = APIClient()
+
+    def tearDown(self):
+        cache.clear()
+
+    def get(self, **headers):
+        return self.client.get('/api/campus/api/list/', **headers)
+
+    def test_cached_directory_and_conditional_get(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertEqual(response.json()['data'][0]['code'], 'TEST001')
+        self.assertIn('public', response['Cache-Control'])
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.get().content, response.content)
+            not_modified = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], etag)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_invalidated_on_campus_and_membership_changes(self):
+        etag = self.get()['ETag']
+        student = User.objects.create_user(
+            username='student', password='testpass123', phone='13800138001', user_type='student'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            CampusStudent.objects.create(campus=self.campus, student=student)
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'][0]['current_students_count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.campus.name = '新校区'
+            self.campus.save()
+        self.assertEqual(self.get().json()['data'][0]['name'], '新校区')
+
+    def test_filters_and_campus_admin_bypass_directory(self):
+        self.get()
+        version = directory.get_version()
+        admin = User.objects.create_user(
+            username='admin', password='testpass123', phone='13800138002', user_type='campus_admin'
+        )
+        Campus.objects.filter(pk=self.campus.pk).update(manager=admin)
+        self.client.force_authenticate(user=admin)
+        response = self.get()
+        self.assertNotIn('ETag', response)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(directory.get_version(), version)
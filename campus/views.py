@@ -4,6 +4,9 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from django.db.models import Q
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from . import directory
 from .models import Campus, CampusArea, CampusStudent, CampusCoach
 from .serializers import (
     CampusSerializer, CampusAreaSerializer,
@@ -31,15 +34,30 @@ def check_campus_permission(user, campus=None, action='view'):
 @api_view(['GET'])
 @permission_classes([])  # 允许未认证用户访问，用于注册时选择校区
 def campus_list(request):
-    """校区列表API"""
+    """
+    校区列表API
+
+    不带筛选条件且不是校区管理员时返回缓存的公开校区目录（见 campus.directory），
+    响应带 ETag，客户端携带 If-None-Match 且目录未变化时返回 304。
+    """
     try:
         # 获取查询参数
         search = request.GET.get('search', '')
         is_active = request.GET.get('is_active')
         campus_type = request.GET.get('campus_type')
         
-        # 构建查询条件
-        queryset = Campus.objects.all()
+        is_campus_admin = getattr(request.user, 'user_type', None) == 'campus_admin'
+        if not (search or is_active is not None or campus_type or is_campus_admin):
+            etag, body = directory.get_directory()
+            response = HttpResponse(body, content_type='application/json')
+            response['ETag'] = etag
+            response['Cache-Control'] = f'public, max-age={directory.MAX_AGE}'
+            # 校区管理员看到的列表不同，共享缓存需按登录凭据区分
+            patch_vary_headers(response, ('Authorization', 'Cookie'))
+            return get_conditional_response(request, etag=etag, response=response)
+        
+        # 构建查询条件（学员/教练/分校区数读取冗余计数，不再逐个校区统计）
+        queryset = Campus.objects.select_related('manager', 'parent_campus')
         
         # 权限过滤 - 只有认证用户才进行权限过滤
         if hasattr(request, 'user') and request.user.is_authenticated and hasattr(request.user, 'user_type') and request.user.user_type == 'campus_admin':
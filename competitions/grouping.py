@@ -0,0 +1,150 @@
+"""
+比赛分组
+
+分组分三步，只在内存中计算，结果由 save_groups 一次 bulk_create 写入：
+1. 排种子：按选手在以往比赛中的成绩排序（最好总排名、胜率、比赛场次），
+   没有历史成绩的选手排在后面，按随机种子打乱。
+2. 蛇形分配：种子顺序每 N 人（N 为组数）为一行，奇数行从第一组分到第 N 组，
+   偶数行反向，各组实力均衡、人数最多相差 1 人。
+3. 校区分开：同一行内按蛇形顺序为每名选手选择本校区选手最少的小组，
+   只在同一行内调整，不影响种子的强弱分布。
+
+随机种子相同、报名和历史成绩不变时，重新分组的结果完全相同。
+"""
+import math
+import random
+from collections import Counter
+
+from django.db.models import Count, Min, Sum
+
+DEFAULT_GROUP_SIZE = 4
+
+
+def group_name(index):
+    """第 index 个小组（从 0 开始）的名称：小组A ~ 小组Z，之后为 第27组 等"""
+    return f'小组{chr(ord("A") + index)}' if index < 26 else f'第{index + 1}组'
+
+
+def group_count_for(player_count, group_size=DEFAULT_GROUP_SIZE):
+    """每组不超过 group_size 人且每组至少 2 人时的组数"""
+    if group_size < 2:
+        raise ValueError('每组人数必须大于1')
+    return max(1, min(math.ceil(player_count / group_size), player_count // 2))
+
+
+def seed_order(participant_ids, competition=None, seed=None):
+    """按历史成绩排列选手（强者在前），competition 为当前比赛时不计入其成绩"""
+    from .models import CompetitionResult
+
+    history = CompetitionResult.objects.filter(participant_id__in=participant_ids, matches_played__gt=0)
+    if competition is not None:
+        history = history.exclude(competition=competition)
+    records = {
+        row['participant_id']: row
+        for row in history.values('participant_id').annotate(
+            best_rank=Min('overall_rank'),
+            won=Sum('matches_won'),
+            played=Sum('matches_played'),
+            competitions=Count('id'),
+        )
+    }
+
+    # 先按 ID 排序再打乱，与传入顺序无关
+    players = sorted(set(participant_ids))
+    random.Random(seed).shuffle(players)
+
+    def strength(player):
+        record = records.get(player)
+        if record is None:
+            return (2, 0, 0, 0)
+        best_rank = record['best_rank']
+        return (
+            0 if best_rank is not None else 1,
+            best_rank or 0,
+            -record['won'] / record['played'],
+            -record['played'],
+        )
+
+    # sort 是稳定的，实力相同的选手保持打乱后的顺序
+    return sorted(players, key=strength)
+
+
+def snake_groups(players, group_count, campuses=None):
+    """
+    按蛇形顺序把已排序的选手分为 group_count 组，返回各组选手列表（组内按种子顺序）。
+    campuses 为 {选手ID: 校区ID}，同一行内尽量把同校区的选手分到不同小组。
+    """
+    groups = [[] for _ in range(group_count)]
+    campus_counts = [Counter() for _ in range(group_count)]
+    campuses = campuses or {}
+    for row_start in range(0, len(players), group_count):
+        order = list(range(group_count))
+        if (row_start // group_count) % 2:
+            order.reverse()
+        for player in players[row_start:row_start + group_count]:
+            campus = campuses.get(player)
+            index = order[0]
+            if campus is not None:
+                index = min(order, key=lambda group_index: campus_counts[group_index][campus])
+            order.remove(index)
+            groups[index].append(player)
+            if campus is not None:
+                campus_counts[index][campus] += 1
+    return groups
+
+
+def player_campuses(participant_ids):
+    """{选手ID: 校区ID}，同时在多个校区有效时取最近加入的校区"""
+    from campus.models import CampusStudent
+
+    # dict 保留最后一行，按 ID 升序时即为最新的记录
+    return dict(CampusStudent.objects.filter(
+        student_id__in=participant_ids, is_active=True
+    ).order_by('id').values_list('student_id', 'campus_id'))
+
+
+def build_groups(competition, participant_ids, group_size=DEFAULT_GROUP_SIZE, seed=None):
+    """计算分组，返回各组选手ID列表，组内按种子顺序"""
+    players = seed_order(participant_ids, competition, seed)
+    return snake_groups(players, group_count_for(len(players), group_size), player_campuses(players))
+
+
+def save_groups(competition, groups):
+    """
+    bulk_create 写入小组及组员（种子号为选手在组内的顺序），返回各组的 CompetitionGroup ID。
+    小组的组别取组内人数最多的报名组别；必须在事务内调用。
+    """
+    from .models import CompetitionGroup, CompetitionGroupMember, CompetitionRegistration
+
+    divisions = dict(CompetitionRegistration.objects.filter(
+        competition=competition, participant_id__in=[player for group in groups for player in group]
+    ).values_list('participant_id', 'group'))
+    names = [group_name(index) for index in range(len(groups))]
+    CompetitionGroup.objects.bulk_create([
+        CompetitionGroup(
+            competition=competition,
+            group_name=name,
+            group_type=Counter(divisions.get(player, 'A') for player in group).most_common(1)[0][0],
+        )
+        for name, group in zip(names, groups)
+    ])
+    # MySQL 的 bulk_create 不回填主键，按名称重新查询
+    group_ids = dict(CompetitionGroup.objects.filter(competition=competition).values_list('group_name', 'id'))
+    CompetitionGroupMember.objects.bulk_create([
+        CompetitionGroupMember(group_id=group_ids[name], participant_id=player, seed_number=seed_number)
+        for name, group in zip(names, groups)
+        for seed_number, player in enumerate(group, 1)
+    ], batch_size=1000)
+    return [group_ids[name] for name in names]
+
+
+def saved_groups(competition):
+    """已写入的分组 [(CompetitionGroup ID, [选手ID])]，按小组创建顺序，组内按种子号"""
+    from .models import CompetitionGroupMember
+
+    groups = {}
+    for group_id, player in CompetitionGroupMember.objects.filter(
+        group__competition=competition
+    ).order_by('group_id', 'seed_number', 'id').values_list('group_id', 'participant_id'):
+        groups.setdefault(group_id, []).append(player)
+    return list(groups.items())
@@ -0,0 +1,87 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import User
+from campus.models import Campus
+from competitions import scheduling
+from competitions.models import Competition, CompetitionMatch
+from reservations.models import Table
+
+BENCHMARK_PREFIX = 'bench_match_'
+BENCHMARK_CAMPUS_CODE = 'BENCH_MATCH'
+
+
+class Command(BaseCommand):
+    help = '生成测试选手，测量全循环对阵的编排和写入耗时（结束后删除测试数据）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--players',
+            type=int,
+            nargs='+',
+            default=[64, 256],
+            help='参赛人数，可指定多个（默认64 256）'
+        )
+        parser.add_argument(
+            '--tables',
+            type=int,
+            default=8,
+            help='校区球台数（默认8）'
+        )
+
+    def handle(self, *args, **options):
+        counts = sorted(options['players'])
+        if counts[0] < 2 or options['tables'] < 1:
+            raise CommandError('--players 必须大于1，--tables 必须大于0')
+        if Campus.objects.filter(code=BENCHMARK_CAMPUS_CODE).exists():
+            raise CommandError('存在上次未删除的测试数据，请先删除编号为 BENCH_MATCH 的校区')
+
+        try:
+            self.create_data(counts[-1], options['tables'])
+            tables = scheduling.table_numbers(self.campus)
+            for count in counts:
+                self.measure(self.player_ids[:count], tables)
+        finally:
+            self.cleanup()
+
+    def create_data(self, count, table_count):
+        self.campus = Campus.objects.create(
+            name='对阵编排测试校区', code=BENCHMARK_CAMPUS_CODE, address='测试地址', phone='13800000000'
+        )
+        Table.objects.bulk_create([Table(campus=self.campus, number=str(number)) for number in range(1, table_count + 1)])
+        User.objects.bulk_create([
+            User(username=f'{BENCHMARK_PREFIX}{number}', password='!', phone=f'1720000{number:04d}', user_type='student')
+            for number in range(count)
+        ])
+        self.player_ids = list(
+            User.objects.filter(username__startswith=BENCHMARK_PREFIX).order_by('id').values_list('id', flat=True)
+        )
+        now = timezone.now()
+        self.competition = Competition.objects.create(
+            title='对阵编排测试', campus=self.campus, competition_date=now + timedelta(days=7),
+            registration_start=now, registration_end=now + timedelta(days=1),
+            created_by_id=self.player_ids[0]
+        )
+
+    def measure(self, player_ids, tables):
+        started = time.perf_counter()
+        fixtures = scheduling.round_robin_fixtures([player_ids])
+        slots = scheduling.assign_slots(fixtures, len(tables))
+        scheduled = time.perf_counter()
+        with transaction.atomic():
+            CompetitionMatch.objects.filter(competition=self.competition).delete()
+            scheduling.create_matches(self.competition, fixtures, tables)
+        saved = time.perf_counter()
+        self.stdout.write(
+            f'{len(player_ids)} 人：{len(fixtures)} 场，{slots} 个时段，'
+            f'编排 {(scheduled - started) * 1000:.1f} ms，写入 {(saved - scheduled) * 1000:.1f} ms'
+        )
+
+    def cleanup(self):
+        # 删除校区时级联删除球台、比赛和对阵
+        Campus.objects.filter(code=BENCHMARK_CAMPUS_CODE).delete()
+        User.objects.filter(username__startswith=BENCHMARK_PREFIX).delete()
@@ -61,13 +61,13 @@ class CompetitionGroupMemberSerializer(serializers.ModelSerializer):
     """
     比赛分组成员序列化器
     """
-    student_name = serializers.CharField(source='student.username', read_only=True)
-    student_real_name = serializers.CharField(source='student.real_name', read_only=True)
+    participant_name = serializers.CharField(source='participant.username', read_only=True)
+    participant_real_name = serializers.CharField(source='participant.real_name', read_only=True)
     
     class Meta:
         model = CompetitionGroupMember
         fields = [
-            'id', 'student', 'student_name', 'student_real_name', 'joined_at'
+            'id', 'participant', 'participant_name', 'participant_real_name', 'seed_number'
         ]
 
 
@@ -75,20 +75,20 @@ class CompetitionGroupSerializer(serializers.ModelSerializer):
     """
     比赛分组序列化器
     """
-    members = CompetitionGroupMemberSerializer(many=True, read_only=True)
+    members = CompetitionGroupMemberSerializer(source='competitiongroupmember_set', many=True, read_only=True)
     competition_name = serializers.CharField(source='competition.title', read_only=True)
     member_count = serializers.SerializerMethodField()
     
     class Meta:
         model = CompetitionGroup
         fields = [
-            'id', 'competition', 'competition_name', 'group_name', 'group_number',
+            'id', 'competition', 'competition_name', 'group_name', 'group_type',
             'members', 'member_count', 'created_at'
         ]
     
     def get_member_count(self, obj):
-        """获取组员数量"""
-        return obj.members.count()
+        """获取组员数量（使用预取的组员）"""
+        return len(obj.competitiongroupmember_set.all())
 
 
 class CompetitionMatchSerializer(serializers.ModelSerializer):
@@ -102,7 +102,7 @@ class CompetitionMatchSerializer(serializers.ModelSerializer):
     competition_name = serializers.CharField(source='competition.name', read_only=True)
     group_name = serializers.CharField(source='group.group_name', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
-    winner_name = serializers.CharField(source='winner.user.username', read_only=True)
+    winner_name = serializers.CharField(source='winner.username', read_only=True)
     
     class Meta:
         model = CompetitionMatch
@@ -110,34 +110,34 @@ class CompetitionMatchSerializer(serializers.ModelSerializer):
             'id', 'competition', 'competition_name', 'group', 'group_name',
             'player1', 'player1_name', 'player1_real_name',
             'player2', 'player2_name', 'player2_real_name',
-            'round_number', 'scheduled_time',
+            'match_type', 'round_number', 'scheduled_time',
             'actual_start_time', 'actual_end_time', 'table_number',
+            'player1_score', 'player2_score',
             'status', 'status_display', 'winner', 'winner_name', 'notes'
         ]
-        read_only_fields = ['actual_start_time', 'actual_end_time', 'winner']
+        read_only_fields = [
+            'actual_start_time', 'actual_end_time', 'player1_score', 'player2_score', 'winner'
+        ]
 
 
 class CompetitionResultSerializer(serializers.ModelSerializer):
     """
-    比赛结果序列化器
+    比赛成绩序列化器（每名选手的统计和排名，由记录比赛结果时自动更新）
     """
-    match_info = CompetitionMatchSerializer(source='match', read_only=True)
-    recorded_by_name = serializers.CharField(source='recorded_by.username', read_only=True)
-    winner_name = serializers.CharField(source='winner.user.username', read_only=True)
+    participant_name = serializers.CharField(source='participant.username', read_only=True)
+    participant_real_name = serializers.CharField(source='participant.real_name', read_only=True)
+    score_difference = serializers.IntegerField(read_only=True)
+    win_rate = serializers.FloatField(read_only=True)
     
     class Meta:
         model = CompetitionResult
         fields = [
-            'id', 'match', 'match_info', 'player1_score', 'player2_score',
-            'winner', 'winner_name', 'recorded_by', 'recorded_by_name',
-            'recorded_at', 'notes'
+            'id', 'competition', 'participant', 'participant_name', 'participant_real_name',
+            'group', 'matches_played', 'matches_won', 'matches_lost',
+            'total_score_for', 'total_score_against', 'score_difference', 'win_rate',
+            'group_rank', 'overall_rank', 'award', 'updated_at'
         ]
-        read_only_fields = ['recorded_by', 'recorded_at']
-    
-    def create(self, validated_data):
-        """创建比赛结果时自动设置记录者"""
-        validated_data['recorded_by'] = self.context['request'].user
-        return super().create(validated_data)
+        read_only_fields = fields
 
 
 class CompetitionListSerializer(serializers.ModelSerializer):
@@ -0,0 +1,251 @@
+"""
+比赛积分与排名
+
+记录一场比赛结果时只更新受影响的数据：
+- 两名选手的 CompetitionResult 统计（场次、胜负、得失分）用 F() 增量更新；
+- 小组赛结果只重新排序该小组的 CompetitionResult（全循环赛整个比赛为一组），
+  只写回名次变化的记录，代价为 O(小组人数)；
+- 小组赛全部结束后，各组第一名按小组顺序两两配对生成第一轮淘汰赛（奇数时最后一人轮空）；
+  淘汰赛每轮结束后，胜者和轮空选手进入下一轮，直至决出冠军，比赛状态改为已完成。
+
+组内排名：胜场多者在前，其次净胜分、总得分，仍相同时按选手ID排序以保证名次唯一。
+小组全部比赛结束时（最终名次），胜场相同的选手先比较相互之间比赛的胜场，再比较净胜分等。
+总排名：全循环赛（只有一组）即组内排名；小组+淘汰赛中冠军为 1，淘汰赛某轮的负者为
+"进入下一轮的人数 + 1"（决赛负者 2，半决赛负者并列 3，依此类推），小组赛被淘汰的选手没有总排名。
+
+所有写入在锁定比赛记录后进行，同一比赛的结果按顺序处理，不会重复生成下一轮淘汰赛。
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+
+from . import scheduling
+from .models import (
+    Competition, CompetitionGroup, CompetitionGroupMember, CompetitionMatch,
+    CompetitionRegistration, CompetitionResult
+)
+
+# 第一轮淘汰赛的轮次（小组赛为第 1 轮）
+FIRST_KNOCKOUT_ROUND = 2
+UNFINISHED_STATUSES = ('scheduled', 'in_progress')
+
+
+class ResultError(ValueError):
+    pass
+
+
+def create_results(competition, participant_ids):
+    """为尚无统计记录的选手创建 CompetitionResult，组别取报名组别"""
+    existing = set(CompetitionResult.objects.filter(
+        competition=competition, participant_id__in=participant_ids
+    ).values_list('participant_id', flat=True))
+    missing = [participant_id for participant_id in participant_ids if participant_id not in existing]
+    if not missing:
+        return
+    divisions = dict(CompetitionRegistration.objects.filter(
+        competition=competition, participant_id__in=missing
+    ).values_list('participant_id', 'group'))
+    CompetitionResult.objects.bulk_create([
+        CompetitionResult(competition=competition, participant_id=participant_id, group=divisions.get(participant_id, 'A'))
+        for participant_id in missing
+    ], batch_size=1000)
+
+
+def record_result(match, player1_score, player2_score):
+    """
+    记录比赛结果，更新两名选手的统计和所在小组的排名，必要时生成下一轮淘汰赛。
+    返回新生成的对阵数；必须在事务内调用。
+    """
+    competition = Competition.objects.select_for_update().get(pk=match.competition_id)
+    match = CompetitionMatch.objects.select_for_update().get(pk=match.pk)
+    if match.status not in UNFINISHED_STATUSES:
+        raise ResultError('比赛状态不正确')
+    if player1_score < 0 or player2_score < 0:
+        raise ResultError('比分不能为负数')
+    if player1_score == player2_score and match.match_type != 'group_stage':
+        raise ResultError('淘汰赛必须分出胜负')
+
+    now = timezone.now()
+    if player1_score == player2_score:
+        match.winner_id = None
+    else:
+        match.winner_id = match.player1_id if player1_score > player2_score else match.player2_id
+    match.player1_score, match.player2_score = player1_score, player2_score
+    match.status = 'completed'
+    match.actual_start_time = match.actual_start_time or now
+    match.actual_end_time = now
+    match.save(update_fields=[
+        'player1_score', 'player2_score', 'winner', 'status', 'actual_start_time', 'actual_end_time'
+    ])
+
+    create_results(competition, [match.player1_id, match.player2_id])
+    for player_id, score_for, score_against in (
+        (match.player1_id, player1_score, player2_score),
+        (match.player2_id, player2_score, player1_score),
+    ):
+        won = match.winner_id == player_id
+        lost = match.winner_id is not None and not won
+        CompetitionResult.objects.filter(competition=competition, participant_id=player_id).update(
+            matches_played=F('matches_played') + 1,
+            matches_won=F('matches_won') + int(won),
+            matches_lost=F('matches_lost') + int(lost),
+            total_score_for=F('total_score_for') + score_for,
+            total_score_against=F('total_score_against') + score_against,
+            updated_at=now
+        )
+
+    if match.match_type == 'group_stage':
+        rank_group(competition, match.group_id)
+        if not competition.matches.filter(match_type='group_stage', status__in=UNFINISHED_STATUSES).exists():
+            return start_knockout(competition)
+        return 0
+    if competition.matches.exclude(match_type='group_stage').filter(
+        round_number=match.round_number, status__in=UNFINISHED_STATUSES
+    ).exists():
+        return 0
+    return advance_knockout(competition, match.round_number)
+
+
+def _group_matches(competition, group_id):
+    return competition.matches.filter(match_type='group_stage', group_id=group_id)
+
+
+def _head_to_head_wins(competition, group_id, results):
+    """胜场相同的选手之间比赛的胜场 {选手ID: 胜场}"""
+    wins = {result.participant_id: result.matches_won for result in results}
+    tied = Counter(wins.values())
+    tied_ids = [participant_id for participant_id, won in wins.items() if tied[won] > 1]
+    head_to_head = Counter()
+    if not tied_ids:
+        return head_to_head
+    rows = _group_matches(competition, group_id).filter(
+        player1_id__in=tied_ids, player2_id__in=tied_ids, winner__isnull=False
+    ).values_list('player1_id', 'player2_id', 'winner_id')
+    for player1_id, player2_id, winner_id in rows:
+        if wins[player1_id] == wins[player2_id]:
+            head_to_head[winner_id] += 1
+    return head_to_head
+
+
+def rank_group(competition, group_id):
+    """重新排序一个小组（group_id 为 None 时为全循环赛的全部选手），只写回名次变化的记录"""
+    results = CompetitionResult.objects.filter(competition=competition)
+    if group_id is not None:
+        results = results.filter(participant_id__in=CompetitionGroupMember.objects.filter(
+            group_id=group_id
+        ).values('participant_id'))
+    results = list(results)
+
+    # 相互之间比赛的胜场只用于最终名次，小组未结束时的名次为临时名次
+    finished = not _group_matches(competition, group_id).filter(status__in=UNFINISHED_STATUSES).exists()
+    head_to_head = _head_to_head_wins(competition, group_id, results) if finished else Counter()
+    results.sort(key=lambda result: (
+        -result.matches_won,
+        -head_to_head[result.participant_id],
+        -result.score_difference,
+        -result.total_score_for,
+        result.participant_id,
+    ))
+
+    # 全循环赛只有一组，总排名即组内排名
+    fields = ['group_rank'] if group_id is not None else ['group_rank', 'overall_rank']
+    changed = []
+    for rank, result in enumerate(results, 1):
+        if any(getattr(result, field) != rank for field in fields):
+            for field in fields:
+                setattr(result, field, rank)
+            changed.append(result)
+    CompetitionResult.objects.bulk_update(changed, fields, batch_size=500)
+
+
+def _group_winners(competition):
+    """各小组第一名，按小组创建顺序"""
+    members = CompetitionGroupMember.objects.filter(group__competition=competition).values_list('group_id', 'participant_id')
+    first = set(CompetitionResult.objects.filter(
+        competition=competition, group_rank=1
+    ).values_list('participant_id', flat=True))
+    winners = {}
+    for group_id, participant_id in members:
+        if participant_id in first:
+            winners[group_id] = participant_id
+    return [winners[group_id] for group_id in sorted(winners)]
+
+
+def start_knockout(competition):
+    """小组赛全部结束：多个小组时生成第一轮淘汰赛，返回生成的对阵数"""
+    if competition.matches.exclude(match_type='group_stage').exists():
+        return 0
+    if CompetitionGroup.objects.filter(competition=competition).count() < 2:
+        # 全循环赛或只有一个小组，小组名次即最终名次
+        CompetitionResult.objects.filter(competition=competition).update(overall_rank=F('group_rank'))
+        _finish(competition)
+        return 0
+    return _create_knockout_round(competition, _group_winners(competition), FIRST_KNOCKOUT_ROUND)
+
+
+def _next_entrants(entrants, round_matches):
+    """本轮胜者（按对阵顺序）加上轮空选手"""
+    played = {player for match in round_matches for player in (match.player1_id, match.player2_id)}
+    return [match.winner_id for match in round_matches] + [player for player in entrants if player not in played]
+
+
+def _knockout_rounds(competition):
+    """{轮次: 该轮对阵（按创建顺序）}"""
+    rounds = defaultdict(list)
+    for match in competition.matches.exclude(match_type='group_stage').order_by('id'):
+        rounds[match.round_number].append(match)
+    return rounds
+
+
+def advance_knockout(competition, round_number):
+    """淘汰赛一轮结束：确定本轮负者的名次，生成下一轮或决出冠军，返回生成的对阵数"""
+    rounds = _knockout_rounds(competition)
+    entrants = _group_winners(competition)
+    for number in range(FIRST_KNOCKOUT_ROUND, round_number):
+        entrants = _next_entrants(entrants, rounds[number])
+    next_entrants = _next_entrants(entrants, rounds[round_number])
+
+    losers = [
+        match.player2_id if match.winner_id == match.player1_id else match.player1_id
+        for match in rounds[round_number]
+    ]
+    CompetitionResult.objects.filter(competition=competition, participant_id__in=losers).update(
+        overall_rank=len(next_entrants) + 1
+    )
+    if len(next_entrants) > 1:
+        return _create_knockout_round(competition, next_entrants, round_number + 1)
+    CompetitionResult.objects.filter(competition=competition, participant_id__in=next_entrants).update(overall_rank=1)
+    _finish(competition)
+    return 0
+
+
+def _create_knockout_round(competition, entrants, round_number):
+    """按顺序两两配对生成一轮淘汰赛，排在已有对阵之后的时段"""
+    fixtures = [
+        scheduling.Fixture(
+            entrants[index], entrants[index + 1],
+            match_type='final' if len(entrants) == 2 else 'knockout',
+            round_number=round_number,
+            notes=f'第{round_number}轮淘汰赛'
+        )
+        for index in range(0, len(entrants) - 1, 2)
+    ]
+    latest = competition.matches.order_by('-scheduled_time').values_list('scheduled_time', flat=True).first()
+    minutes = scheduling.match_minutes_of(competition)
+    start_time, resting = timezone.now(), set()
+    if latest is not None and latest + timedelta(minutes=minutes) > start_time:
+        # 紧接着已有对阵的下一时段开始，最后一个时段出场的选手先休息一个时段
+        start_time = latest + timedelta(minutes=minutes)
+        for players in competition.matches.filter(scheduled_time=latest).values_list('player1_id', 'player2_id'):
+            resting.update(players)
+
+    tables = scheduling.table_numbers(competition.campus_id)
+    scheduling.assign_slots(fixtures, len(tables), resting=resting)
+    return scheduling.create_matches(competition, fixtures, tables, minutes, start_time)
+
+
+def _finish(competition):
+    competition.status = 'completed'
+    competition.save(update_fields=['status', 'updated_at'])
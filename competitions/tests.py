@@ -1,3 +1,408 @@
+from collections import defaultdict
+from datetime import timedelta
+from itertools import combinations
+from decimal import Decimal
+from unittest import mock
+
+from django.db import DatabaseError
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from campus.models import Campus, CampusStudent
+from payments.models import UserAccount
+from reservations.models import Table
+from . import grouping, scheduling
+from .views import _registration_key
+from .models import (
+    Competition, CompetitionGroup, CompetitionMatch, CompetitionRegistration, CompetitionResult
+)
+
+
+class CompetitionTestMixin:
+    """比赛测试的公共数据"""
+
+    def create_competition(self, player_count, status='registration'):
+        self.campus = Campus.objects.create(
+            name='测试校区', code='TEST001', address='测试地址', phone='13800138000'
+        )
+        self.admin = User.objects.create_user(
+            username='admin', password='testpass123', phone='13700000000', user_type='super_admin'
+        )
+        now = timezone.now()
+        self.competition = Competition.objects.create(
+            title='月赛', campus=self.campus, competition_date=now + timedelta(days=7),
+            registration_start=now - timedelta(days=7), registration_end=now + timedelta(days=1),
+            status=status, created_by=self.admin
+        )
+        User.objects.bulk_create([
+            User(username=f'player{index}', password='!', real_name=f'选手{index}',
+                 phone=f'1380000{index:04d}', user_type='student')
+            for index in range(player_count)
+        ])
+        self.players = list(User.objects.filter(username__startswith='player').order_by('id'))
+        CompetitionRegistration.objects.bulk_create([
+            CompetitionRegistration(competition=self.competition, participant=player, group='A', status='confirmed')
+            for player in self.players
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+
+
+class RegistrationTest(CompetitionTestMixin, TestCase):
+    """报名和取消报名测试"""
+
+    def setUp(self):
+        self.create_competition(0)
+        Competition.objects.filter(pk=self.competition.pk).update(registration_fee=Decimal('30.00'))
+        self.student = User.objects.create_user(
+            username='student', password='testpass123', phone='13900000000', user_type='student'
+        )
+        UserAccount.objects.create(user=self.student, balance=Decimal('100.00'))
+        self.client.force_authenticate(user=self.student)
+        response = self.client.post(f'/api/competitions/{self.competition.id}/register/')
+        self.assertEqual(response.status_code, 201)
+
+    def balance(self):
+        return UserAccount.objects.get(user=self.student).balance
+
+    def cancel(self):
+        return self.client.post(f'/api/competitions/{self.competition.id}/cancel-registration/')
+
+    def test_cancel_refunds_fee(self):
+        self.assertEqual(self.balance(), Decimal('70.00'))
+        response = self.cancel()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['refund_amount'], 30.0)
+        self.assertEqual(self.balance(), Decimal('100.00'))
+        self.assertFalse(CompetitionRegistration.objects.filter(participant=self.student).exists())
+
+    def test_failed_delete_rolls_back_refund(self):
+        with mock.patch.object(CompetitionRegistration, 'delete', side_effect=DatabaseError):
+            self.assertEqual(self.cancel().status_code, 500)
+        self.assertEqual(self.balance(), Decimal('70.00'))
+        self.assertTrue(CompetitionRegistration.objects.filter(participant=self.student).exists())
+
+    def test_register_again_after_cancel_charges_and_refunds_again(self):
+        """取消后重新报名，即使报名ID被复用也重新扣费和退费"""
+        self.assertEqual(self.cancel().status_code, 200)
+        response = self.client.post(f'/api/competitions/{self.competition.id}/register/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.balance(), Decimal('70.00'))
+        self.assertEqual(self.cancel().data['refund_amount'], 30.0)
+        self.assertEqual(self.balance(), Decimal('100.00'))
+
+    def test_registration_key_differs_when_id_is_reused(self):
+        """MySQL 重启后可能复用已删除报名的ID，幂等键不能只取决于报名ID"""
+        registration = CompetitionRegistration.objects.get(participant=self.student)
+        reused = CompetitionRegistration(
+            id=registration.id, competition=self.competition, participant=self.student,
+            registration_time=registration.registration_time + timedelta(microseconds=1)
+        )
+        self.assertNotEqual(_registration_key(registration, 'fee'), _registration_key(reused, 'fee'))
+
+class SchedulingEngineTest(TestCase):
+    """对阵编排测试"""
+
+    def test_circle_rounds_pair_everyone_once(self):
+        for count in (2, 5, 8):
+            rounds = scheduling.circle_rounds(range(count))
+            self.assertEqual(len(rounds), count - 1 if count % 2 == 0 else count)
+            pairs = [frozenset(pair) for matches in rounds for pair in matches]
+            self.assertEqual(set(pairs), {frozenset(pair) for pair in combinations(range(count), 2)})
+            self.assertEqual(len(pairs), count * (count - 1) // 2)
+            for matches in rounds:
+                players = [player for pair in matches for player in pair]
+                self.assertEqual(len(players), len(set(players)))
+
+    def test_assign_slots_respects_tables_and_rest(self):
+        fixtures = scheduling.round_robin_fixtures([list(range(10))])
+        slots = scheduling.assign_slots(fixtures, 3)
+
+        by_slot = defaultdict(list)
+        for fixture in fixtures:
+            by_slot[fixture.slot].append(fixture)
+        self.assertTrue(all(len(matches) <= 3 for matches in by_slot.values()))
+        for slot in range(slots):
+            tables = [fixture.table for fixture in by_slot[slot]]
+            self.assertEqual(len(tables), len(set(tables)))
+            players = {player for fixture in by_slot[slot] for player in (fixture.player1, fixture.player2)}
+            following = {player for fixture in by_slot[slot + 1] for player in (fixture.player1, fixture.player2)}
+            self.assertFalse(players & following)
+        # 人数远多于球台时，休息约束不影响球台利用率
+        fixtures = scheduling.round_robin_fixtures([list(range(64))])
+        self.assertEqual(scheduling.assign_slots(fixtures, 8), 2016 // 8)
+
+    def test_groups_play_in_parallel(self):
+        fixtures = scheduling.round_robin_fixtures([[1, 2, 3, 4], [5, 6, 7, 8]], notes=lambda index: f'组{index}')
+        scheduling.assign_slots(fixtures, 4)
+        first_slot = [fixture.notes for fixture in fixtures if fixture.slot == 0]
+        self.assertEqual(sorted(first_slot), ['组0', '组0', '组1', '组1'])
+
+
+class GenerateMatchesTest(CompetitionTestMixin, TestCase):
+    """生成对阵接口测试"""
+
+    def generate(self, **data):
+        return self.client.post(
+            f'/api/competitions/{self.competition.id}/generate-matches/', data, format='json'
+        )
+
+    def test_round_robin_uses_campus_tables(self):
+        self.create_competition(12)
+        Table.objects.bulk_create([Table(campus=self.campus, number=str(number)) for number in (3, 5, 7)])
+        Table.objects.create(campus=self.campus, number='9', status='maintenance')
+
+        response = self.generate(match_minutes=20)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_matches'], 66)
+        self.assertEqual(response.data['table_count'], 3)
+
+        matches = CompetitionMatch.objects.filter(competition=self.competition)
+        self.assertEqual(set(matches.values_list('table_number', flat=True)), {3, 5, 7})
+        pairs = {frozenset(pair) for pair in matches.values_list('player1_id', 'player2_id')}
+        self.assertEqual(len(pairs), 66)
+        start = self.competition.competition_date
+        for scheduled_time in matches.values_list('scheduled_time', flat=True):
+            self.assertEqual((scheduled_time - start) % timedelta(minutes=20), timedelta(0))
+
+    def test_group_knockout_creates_groups_without_knockout(self):
+        self.create_competition(16)
+        response = self.generate(match_format='group_knockout')
+        self.assertEqual(response.status_code, 200)
+
+        groups = CompetitionGroup.objects.filter(competition=self.competition)
+        self.assertEqual(groups.count(), 4)
+        matches = CompetitionMatch.objects.filter(competition=self.competition)
+        self.assertFalse(matches.exclude(match_type='group_stage').exists())
+        self.assertFalse(matches.filter(group__isnull=True).exists())
+        for group in groups:
+            members = set(group.competitiongroupmember_set.values_list('participant_id', flat=True))
+            for player1_id, player2_id in matches.filter(group=group).values_list('player1_id', 'player2_id'):
+                self.assertTrue({player1_id, player2_id} <= members)
+        self.assertEqual(CompetitionResult.objects.filter(competition=self.competition).count(), 16)
+
+    def test_non_numeric_tables_get_unused_numbers(self):
+        self.create_competition(2)
+        Table.objects.bulk_create([Table(campus=self.campus, number=number) for number in ('A', '2', 'B', '1')])
+        self.assertEqual(scheduling.table_numbers(self.campus), [3, 2, 4, 1])
+
+    def test_rejects_unknown_format(self):
+        self.create_competition(4)
+        self.assertEqual(self.generate(match_format='swiss').status_code, 400)
+        self.assertEqual(self.generate(match_minutes=0).status_code, 400)
+
+
+class StandingsTest(CompetitionTestMixin, TestCase):
+    """比赛成绩和排名测试"""
+
+    def generate(self, player_count, match_format):
+        self.create_competition(player_count)
+        response = self.client.post(
+            f'/api/competitions/{self.competition.id}/generate-matches/',
+            {'match_format': match_format}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def record(self, match, player1_score, player2_score):
+        return self.client.post(
+            f'/api/matches/{match.id}/record-result/',
+            {'player1_score': player1_score, 'player2_score': player2_score}, format='json'
+        )
+
+    def play(self, winner_of):
+        """按 winner_of(比赛) 返回的胜者记录比分，返回最后一次响应"""
+        response = None
+        while True:
+            match = CompetitionMatch.objects.filter(
+                competition=self.competition, status='scheduled'
+            ).order_by('scheduled_time', 'id').first()
+            if match is None:
+                return response
+            if winner_of(match) == match.player1_id:
+                response = self.record(match, 3, 1)
+            else:
+                response = self.record(match, 1, 3)
+            self.assertEqual(response.status_code, 200)
+
+    def result(self, player):
+        return CompetitionResult.objects.get(competition=self.competition, participant=player)
+
+    def test_round_robin_ranks_update_incrementally(self):
+        self.generate(4, 'round_robin')
+        match = CompetitionMatch.objects.filter(competition=self.competition).order_by('id').first()
+        response = self.record(match, 3, 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['match']['winner'], match.player1_id)
+        self.assertEqual(response.data['next_round_matches'], 0)
+
+        winner = self.result(match.player1)
+        self.assertEqual((winner.matches_won, winner.score_difference, winner.group_rank), (1, 2, 1))
+        self.assertEqual(self.result(match.player2).group_rank, 4)
+        self.assertEqual(self.record(match, 3, 0).status_code, 400)
+
+        # 编号小的选手全胜，名次即编号顺序
+        self.play(lambda match: min(match.player1_id, match.player2_id))
+        ranks = [self.result(player).overall_rank for player in self.players]
+        self.assertEqual(ranks, [1, 2, 3, 4])
+        self.competition.refresh_from_db()
+        self.assertEqual(self.competition.status, 'completed')
+
+        response = self.client.get(f'/api/competitions/{self.competition.id}/results/')
+        self.assertEqual([row['participant'] for row in response.data], [player.id for player in self.players])
+
+    def test_head_to_head_breaks_final_ties(self):
+        self.generate(4, 'round_robin')
+        a, b, c, d = [player.id for player in self.players]
+        # b、c 同为两胜，c 净胜分更多，但 b 赢了 c；a、d 同为一胜，d 赢了 a
+        winners = {
+            frozenset((b, c)): b, frozenset((a, b)): a, frozenset((b, d)): b,
+            frozenset((a, c)): c, frozenset((c, d)): c, frozenset((a, d)): d,
+        }
+        matches = {
+            frozenset((match.player1_id, match.player2_id)): match
+            for match in CompetitionMatch.objects.filter(competition=self.competition)
+        }
+        for pair, winner in winners.items():
+            match = matches[pair]
+            loser_score = 0 if winner == c else 9
+            if winner == match.player1_id:
+                self.assertEqual(self.record(match, 11, loser_score).status_code, 200)
+            else:
+                self.assertEqual(self.record(match, loser_score, 11).status_code, 200)
+            if pair == frozenset((c, d)):
+                # 小组未结束时按净胜分排名
+                self.assertEqual([self.result(player).group_rank for player in self.players[1:3]], [2, 1])
+
+        ranks = [self.result(player).overall_rank for player in self.players]
+        self.assertEqual(ranks, [4, 1, 2, 3])
+
+    def test_group_stage_winners_advance_to_knockout(self):
+        self.generate(12, 'group_knockout')
+        groups = list(CompetitionGroup.objects.filter(competition=self.competition).order_by('id'))
+        self.assertEqual(len(groups), 3)
+        group_winners = [min(group.competitiongroupmember_set.values_list('participant_id', flat=True)) for group in groups]
+
+        # 编号小的选手获胜，小组赛最后一场结束时生成第一轮淘汰赛
+        last_group_match = CompetitionMatch.objects.filter(competition=self.competition).latest('scheduled_time')
+        CompetitionMatch.objects.filter(pk=last_group_match.pk).update(status='in_progress')
+        self.play(lambda match: min(match.player1_id, match.player2_id))
+        response = self.record(last_group_match, 3, 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['next_round_matches'], 1)
+
+        first_round = CompetitionMatch.objects.get(competition=self.competition, round_number=2)
+        self.assertEqual([first_round.player1_id, first_round.player2_id], group_winners[:2])
+        self.assertGreater(first_round.scheduled_time, last_group_match.scheduled_time)
+        self.assertEqual(self.record(first_round, 2, 2).status_code, 400)
+
+        # 第三组第一名轮空，直接进入决赛；之后编号大的选手获胜
+        self.play(lambda match: max(match.player1_id, match.player2_id))
+        semifinal_winner, semifinal_loser = max(group_winners[:2]), min(group_winners[:2])
+        champion, runner_up = max(semifinal_winner, group_winners[2]), min(semifinal_winner, group_winners[2])
+        final = CompetitionMatch.objects.get(competition=self.competition, match_type='final')
+        self.assertEqual(final.round_number, 3)
+        self.assertEqual({final.player1_id, final.player2_id}, {champion, runner_up})
+
+        ranks = {
+            participant_id: rank for participant_id, rank in CompetitionResult.objects.filter(
+                competition=self.competition, overall_rank__isnull=False
+            ).values_list('participant_id', 'overall_rank')
+        }
+        self.assertEqual(ranks, {champion: 1, runner_up: 2, semifinal_loser: 3})
+        self.competition.refresh_from_db()
+        self.assertEqual(self.competition.status, 'completed')
+
+
+class GroupingTest(CompetitionTestMixin, TestCase):
+    """比赛分组测试"""
+
+    def create_groups(self, **data):
+        return self.client.post(
+            f'/api/competitions/{self.competition.id}/create-groups/', data, format='json'
+        )
+
+    def test_snake_groups_balance_seeds_and_campuses(self):
+        groups = grouping.snake_groups(list(range(10)), 3)
+        self.assertEqual(groups, [[0, 5, 6], [1, 4, 7], [2, 3, 8, 9]])
+
+        # 同一行内同校区的选手分到不同小组
+        campuses = {0: 'x', 1: 'y', 2: 'y', 3: 'y', 4: 'x', 5: 'x'}
+        groups = grouping.snake_groups(list(range(6)), 3, campuses)
+        self.assertEqual(groups, [[0, 3], [1, 5], [2, 4]])
+        for group in groups:
+            self.assertEqual(len({campuses[player] for player in group}), 2)
+
+    def test_player_campuses_uses_latest_membership(self):
+        self.create_competition(1)
+        other = Campus.objects.create(name='分校区', code='TEST002', address='测试地址', phone='13800138001')
+        player = self.players[0]
+        CampusStudent.objects.create(campus=self.campus, student=player)
+        CampusStudent.objects.create(campus=other, student=player)
+        self.assertEqual(grouping.player_campuses([player.id]), {player.id: other.id})
+
+    def test_seed_order_uses_history_and_is_reproducible(self):
+        self.create_competition(8)
+        previous = Competition.objects.create(
+            title='上月月赛', campus=self.campus, competition_date=timezone.now() - timedelta(days=30),
+            registration_start=timezone.now() - timedelta(days=40),
+            registration_end=timezone.now() - timedelta(days=31),
+            status='completed', created_by=self.admin
+        )
+        champion, runner_up, veteran = self.players[5], self.players[2], self.players[7]
+        CompetitionResult.objects.bulk_create([
+            CompetitionResult(competition=previous, participant=champion, group='A',
+                              matches_played=3, matches_won=3, overall_rank=1),
+            CompetitionResult(competition=previous, participant=runner_up, group='A',
+                              matches_played=3, matches_won=2, overall_rank=2),
+            CompetitionResult(competition=previous, participant=veteran, group='A',
+                              matches_played=3, matches_won=1),
+        ])
+        ids = [player.id for player in self.players]
+        order = grouping.seed_order(ids, self.competition, seed=1)
+        self.assertEqual(order[:3], [champion.id, runner_up.id, veteran.id])
+        self.assertEqual(order, grouping.seed_order(list(reversed(ids)), self.competition, seed=1))
+        self.assertNotEqual(
+            [grouping.seed_order(ids, self.competition, seed=seed)[3:] for seed in range(5)],
+            [order[3:]] * 5
+        )
+
+    def test_create_groups_endpoint(self):
+        self.create_competition(10)
+        other = Campus.objects.create(name='分校区', code='TEST002', address='测试地址', phone='13800138001')
+        CampusStudent.objects.bulk_create([
+            CampusStudent(campus=self.campus if index % 2 else other, student=player)
+            for index, player in enumerate(self.players)
+        ])
+        CompetitionRegistration.objects.filter(participant=self.players[-1]).update(status='pending')
+
+        response = self.create_groups(group_size=3, seed=7)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['seed'], 7)
+        groups = response.data['groups']
+        self.assertEqual([len(group['members']) for group in groups], [3, 3, 3])
+        self.assertEqual([group['member_count'] for group in groups], [3, 3, 3])
+        self.assertEqual([member['seed_number'] for member in groups[0]['members']], [1, 2, 3])
+        members = [[member['participant'] for member in group['members']] for group in groups]
+        self.assertNotIn(self.players[-1].id, [player for group in members for player in group])
+        campuses = dict(CampusStudent.objects.values_list('student_id', 'campus_id'))
+        self.assertTrue(all(len({campuses[player] for player in group}) == 2 for group in members))
+
+        # 相同种子重新分组结果相同，旧分组被替换
+        regrouped = self.create_groups(group_size=3, seed=7).data['groups']
+        self.assertEqual([[member['participant'] for member in group['members']] for group in regrouped], members)
+        self.assertEqual(CompetitionGroup.objects.filter(competition=self.competition).count(), 3)
+        self.assertEqual(self.client.get(f'/api/competitions/{self.competition.id}/groups/').data[1]['group_name'], '小组B')
+        self.assertEqual(self.create_groups(group_size=1).status_code, 400)
 
-# Create your tests here.
+        # 生成小组赛对阵时沿用已创建的分组
+        response = self.client.post(
+            f'/api/competitions/{self.competition.id}/generate-matches/',
+            {'match_format': 'group_knockout'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_matches'], 9)
+        saved = [group for _, group in grouping.saved_groups(self.competition)]
+        self.assertEqual(saved, members)
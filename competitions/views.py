@@ -3,13 +3,14 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
-from django.db import transaction
+from django.db import transaction, IntegrityError
+from django.db.models import F, Prefetch
 from django.utils import timezone
-from datetime import datetime, timedelta
-import random
+from datetime import datetime, timedelta, timezone as dt_timezone
 from logs.utils import log_user_action
 from logs.decorators import log_user_operation
 
+from . import grouping, scheduling, standings
 from .models import (
     Competition, CompetitionRegistration, CompetitionGroup, 
     CompetitionGroupMember, CompetitionMatch, CompetitionResult
@@ -19,6 +20,19 @@ from .serializers import (
     CompetitionGroupSerializer, CompetitionMatchSerializer,
     CompetitionResultSerializer
 )
+
+
+def _registration_key(registration, operation):
+    """
+    报名扣费/退费的幂等键。取消报名会删除记录，报名ID可能被重新报名复用，
+    因此用比赛、参赛者和报名时间（微秒，UTC）标识一次报名。
+    """
+    registered_at = registration.registration_time.astimezone(dt_timezone.utc).strftime('%Y%m%d%H%M%S%f')
+    return (
+        f'competition_registration:{registration.competition_id}:'
+        f'{registration.participant_id}:{registered_at}:{operation}'
+    )
+
 # Student模型已整合到User模型中，通过user_type字段区分
 
 
@@ -114,8 +128,7 @@ class CompetitionViewSet(viewsets.ModelViewSet):
         """
         学员报名参加比赛
         """
-        from payments.models import UserAccount, AccountTransaction
-        from decimal import Decimal
+        from payments import ledger
         
         competition = self.get_object()
         user = request.user
@@ -163,54 +176,43 @@ class CompetitionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # 检查用户账户余额
-        try:
-            student_account = UserAccount.objects.get(user=student)
-        except UserAccount.DoesNotExist:
-            # 如果用户没有账户，创建一个余额为0的账户
-            student_account = UserAccount.objects.create(
-                user=student,
-                balance=Decimal('0.00')
-            )
-        
-        # 检查余额是否足够支付报名费
+        # 扣除报名费并创建报名记录（同一事务，余额不足时整体回滚）
         registration_fee = competition.registration_fee
-        if student_account.available_balance < registration_fee:
+        try:
+            with transaction.atomic():
+                registration = CompetitionRegistration.objects.create(
+                    competition=competition,
+                    participant=student,
+                    group='A',  # 默认分配到甲组
+                    status='confirmed',
+                    payment_status=True  # 标记为已缴费
+                )
+                fee_record = None
+                if registration_fee > 0:
+                    fee_record, _ = ledger.debit(
+                        student, registration_fee,
+                        idempotency_key=_registration_key(registration, 'fee'),
+                        description=f'比赛报名费 - {competition.name}（{competition.title}）'
+                    )
+        except ledger.InsufficientBalance as e:
             return Response({
-                'error': f'账户余额不足。当前可用余额：¥{student_account.available_balance:.2f}，报名费：¥{registration_fee:.2f}。请先充值。',
-                'current_balance': float(student_account.available_balance),
+                'error': f'账户余额不足。当前可用余额：¥{e.available:.2f}，报名费：¥{registration_fee:.2f}。请先充值。',
+                'current_balance': float(e.available),
                 'required_amount': float(registration_fee),
                 'need_recharge': True
             }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # 扣除报名费
-        student_account.balance -= registration_fee
-        student_account.save()
-        
-        # 创建交易记录
-        AccountTransaction.objects.create(
-            account=student_account,
-            transaction_type='payment',
-            amount=registration_fee,
-            balance_before=student_account.balance + registration_fee,
-            balance_after=student_account.balance,
-            description=f'比赛报名费 - {competition.name}（{competition.title}）'
-        )
-        
-        # 创建报名记录
-        registration = CompetitionRegistration.objects.create(
-            competition=competition,
-            participant=student,
-            group='A',  # 默认分配到甲组
-            status='confirmed',
-            payment_status=True  # 标记为已缴费
-        )
+        except IntegrityError:
+            return Response(
+                {'error': '您已经报名了这个比赛'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        remaining_balance = fee_record.balance_after if fee_record else ledger.get_account(student).balance
         
         serializer = CompetitionRegistrationSerializer(registration)
         return Response({
             'message': f'报名成功！已扣除报名费¥{registration_fee:.2f}',
             'registration': serializer.data,
-            'remaining_balance': float(student_account.balance)
+            'remaining_balance': float(remaining_balance)
         }, status=status.HTTP_201_CREATED)
     
     @action(detail=True, methods=['post'])
@@ -218,7 +220,8 @@ class CompetitionViewSet(viewsets.ModelViewSet):
         """
         取消比赛报名
         """
-        from payments.models import UserAccount, AccountTransaction
+        from payments.models import UserAccount
+        from payments import ledger
         from decimal import Decimal
         
         competition = self.get_object()
@@ -247,45 +250,31 @@ class CompetitionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # 处理退费逻辑
+        # 处理退费逻辑（没有账户时不处理退费）
         refund_amount = Decimal('0.00')
-        if registration.payment_status:
-            # 获取用户账户
-            try:
-                student_account = UserAccount.objects.get(user=user)
-                
-                # 计算退费金额（可以根据取消时间设置不同的退费比例）
-                now = timezone.now()
-                if now <= competition.registration_end:
-                    # 报名期内取消，全额退费
-                    refund_amount = competition.registration_fee
-                elif now <= competition.competition_date - timedelta(days=1):
-                    # 比赛前一天取消，退费80%
-                    refund_amount = competition.registration_fee * Decimal('0.8')
-                else:
-                    # 比赛当天取消，不退费
-                    refund_amount = Decimal('0.00')
-                
-                if refund_amount > 0:
-                    # 退费到账户
-                    student_account.balance += refund_amount
-                    student_account.save()
-                    
-                    # 创建退费交易记录
-                    AccountTransaction.objects.create(
-                        account=student_account,
-                        transaction_type='refund',
-                        amount=refund_amount,
-                        balance_before=student_account.balance - refund_amount,
-                        balance_after=student_account.balance,
-                        description=f'比赛报名费退费 - {competition.name}（{competition.title}）'
-                    )
-                    
-            except UserAccount.DoesNotExist:
-                # 如果没有账户，不处理退费
-                pass
+        if registration.payment_status and UserAccount.objects.filter(user=user).exists():
+            # 计算退费金额（可以根据取消时间设置不同的退费比例）
+            now = timezone.now()
+            if now <= competition.registration_end:
+                # 报名期内取消，全额退费
+                refund_amount = competition.registration_fee
+            elif now <= competition.competition_date - timedelta(days=1):
+                # 比赛前一天取消，退费80%
+                refund_amount = competition.registration_fee * Decimal('0.8')
+            else:
+                # 比赛当天取消，不退费
+                refund_amount = Decimal('0.00')
         
-        registration.delete()
+        # 退费和删除报名在同一事务内，避免退费后报名仍然有效
+        with transaction.atomic():
+            if refund_amount > 0:
+                # 退费到账户
+                ledger.refund(
+                    user, refund_amount,
+                    idempotency_key=_registration_key(registration, 'refund'),
+                    description=f'比赛报名费退费 - {competition.name}（{competition.title}）'
+                )
+            registration.delete()
         
         if refund_amount > 0:
             return Response({
@@ -332,70 +321,60 @@ class CompetitionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # 获取所有报名的学员
-        registrations = CompetitionRegistration.objects.filter(
-            competition=competition
-        ).select_related('participant')
-        
-        if registrations.count() < 2:
+        try:
+            group_size = int(request.data.get('group_size', grouping.DEFAULT_GROUP_SIZE))  # 默认每组4人
+            seed = int(request.data.get('seed', competition.id))  # 相同的随机种子得到相同的分组
+        except (TypeError, ValueError):
+            group_size = seed = None
+        if group_size is None or group_size < 2:
             return Response(
-                {'error': '报名人数不足，无法创建分组'},
+                {'error': '每组人数必须为大于1的整数'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # 删除已有的分组
-        CompetitionGroup.objects.filter(competition=competition).delete()
-        
-        # 根据比赛类型创建分组
-        participants = list(registrations)
-        random.shuffle(participants)  # 随机打乱
+        # 获取所有确认报名的学员
+        participant_ids = list(CompetitionRegistration.objects.filter(
+            competition=competition,
+            status='confirmed'
+        ).values_list('participant_id', flat=True))
         
-        group_size = request.data.get('group_size', 4)  # 默认每组4人
-        groups_created = []
+        if len(participant_ids) < 2:
+            return Response(
+                {'error': '报名人数不足，无法创建分组'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
+        # 按历史成绩排种子，蛇形分组，同校区选手尽量分开
+        groups = grouping.build_groups(competition, participant_ids, group_size, seed)
         with transaction.atomic():
-            group_number = 1
-            for i in range(0, len(participants), group_size):
-                group_participants = participants[i:i + group_size]
-                
-                # 创建分组
-                group = CompetitionGroup.objects.create(
-                    competition=competition,
-                    group_name=f"第{group_number}组",
-                    group_number=group_number
-                )
-                
-                # 添加组员
-                for registration in group_participants:
-                    CompetitionGroupMember.objects.create(
-                        group=group,
-                        student=registration.student
-                    )
-                
-                groups_created.append(group)
-                group_number += 1
-        
-        # 更新比赛状态
-        competition.status = 'preparation'
-        competition.save()
+            # 删除已有的分组
+            CompetitionGroup.objects.filter(competition=competition).delete()
+            grouping.save_groups(competition, groups)
         
-        serializer = CompetitionGroupSerializer(groups_created, many=True)
+        serializer = CompetitionGroupSerializer(self._groups_queryset(competition), many=True)
         return Response({
-            'message': f'成功创建{len(groups_created)}个分组',
+            'message': f'成功创建{len(groups)}个分组',
+            'seed': seed,
             'groups': serializer.data
         })
     
+    def _groups_queryset(self, competition):
+        return CompetitionGroup.objects.filter(
+            competition=competition
+        ).select_related('competition').prefetch_related(
+            Prefetch(
+                'competitiongroupmember_set',
+                queryset=CompetitionGroupMember.objects.select_related('participant').order_by('seed_number', 'id')
+            )
+        ).order_by('id')
+    
     @action(detail=True, methods=['get'])
     def groups(self, request, pk=None):
         """
         获取比赛分组信息
         """
         competition = self.get_object()
-        groups = CompetitionGroup.objects.filter(
-            competition=competition
-        ).prefetch_related('members__student__user')
-        
-        serializer = CompetitionGroupSerializer(groups, many=True)
+        serializer = CompetitionGroupSerializer(self._groups_queryset(competition), many=True)
         return Response(serializer.data)
     
     @action(detail=True, methods=['post'])
@@ -421,173 +400,85 @@ class CompetitionViewSet(viewsets.ModelViewSet):
         # 获取比赛类型和对阵模式
         match_format = request.data.get('match_format', 'round_robin')  # round_robin 或 group_knockout
         
-        # 删除已有的比赛对阵
-        CompetitionMatch.objects.filter(competition=competition).delete()
+        if match_format not in ('round_robin', 'group_knockout'):
+            return Response(
+                {'error': '不支持的对阵模式'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            match_minutes = int(request.data.get('match_minutes', scheduling.DEFAULT_MATCH_MINUTES))
+        except (TypeError, ValueError):
+            match_minutes = 0
+        if match_minutes < 1:
+            return Response(
+                {'error': '每场比赛时长必须为正整数（分钟）'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         # 获取所有确认报名的参赛者
-        registrations = CompetitionRegistration.objects.filter(
+        participant_ids = list(CompetitionRegistration.objects.filter(
             competition=competition, 
             status='confirmed'
-        ).select_related('participant')
+        ).values_list('participant_id', flat=True))
         
-        if registrations.count() < 2:
+        if len(participant_ids) < 2:
             return Response(
                 {'error': '参赛人数不足，至少需要2人'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        matches_created = []
+        # 按校区实际可用的球台数并行安排比赛
+        tables = scheduling.table_numbers(competition.campus_id)
         
         with transaction.atomic():
+            # 删除已有的对阵和成绩
+            CompetitionMatch.objects.filter(competition=competition).delete()
+            CompetitionResult.objects.filter(competition=competition).delete()
+            standings.create_results(competition, participant_ids)
+            
             if match_format == 'round_robin':
-                # 全循环赛制
-                matches_created = self._generate_round_robin_matches(competition, registrations)
-            elif match_format == 'group_knockout':
-                # 小组循环+交叉淘汰赛制
-                matches_created = self._generate_group_knockout_matches(competition, registrations)
+                # 全循环赛制，不保留小组
+                CompetitionGroup.objects.filter(competition=competition).delete()
+                fixtures = scheduling.round_robin_fixtures([participant_ids])
             else:
-                return Response(
-                    {'error': '不支持的对阵模式'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+                # 小组循环+交叉淘汰赛制，淘汰赛在小组赛全部结束后按名次生成
+                fixtures = self._group_stage_fixtures(competition, participant_ids)
+            scheduling.assign_slots(fixtures, len(tables))
+            total_matches = scheduling.create_matches(competition, fixtures, tables, match_minutes)
         
         # 更新比赛状态
         competition.status = 'in_progress'
         competition.save()
         
-        serializer = CompetitionMatchSerializer(matches_created, many=True)
+        # 大型比赛的对阵可达数万场，响应只返回编排摘要，对阵列表通过 matches 接口获取
+        start_time = competition.competition_date
         return Response({
-            'message': f'成功生成{len(matches_created)}场比赛',
+            'message': f'成功生成{total_matches}场比赛',
             'match_format': match_format,
-            'total_matches': len(matches_created),
-            'matches': serializer.data
+            'total_matches': total_matches,
+            'table_count': len(tables),
+            'match_minutes': match_minutes,
+            'first_match_time': start_time,
+            'last_match_time': start_time + timedelta(minutes=max(fixture.slot for fixture in fixtures) * match_minutes),
         })
     
-    def _generate_round_robin_matches(self, competition, registrations):
-        """生成全循环赛对阵"""
-        participants = [reg.participant for reg in registrations]
-        matches_created = []
-        match_number = 1
-        
-        # 计算比赛开始时间
-        start_time = competition.competition_date
-        
-        # 全循环：每个人都要和其他所有人比赛一场
-        for i in range(len(participants)):
-            for j in range(i + 1, len(participants)):
-                # 计算球台号（假设有8个球台）
-                table_number = ((match_number - 1) % 8) + 1
-                
-                # 计算比赛时间（每场比赛间隔30分钟）
-                scheduled_time = start_time + timedelta(minutes=(match_number - 1) * 30)
-                
-                match = CompetitionMatch.objects.create(
-                    competition=competition,
-                    player1=participants[i],
-                    player2=participants[j],
-                    match_type='group_stage',
-                    round_number=1,
-                    table_number=table_number,
-                    scheduled_time=scheduled_time,
-                    status='scheduled'
-                )
-                matches_created.append(match)
-                match_number += 1
-        
-        return matches_created
-    
-    def _generate_group_knockout_matches(self, competition, registrations):
-        """生成小组循环+交叉淘汰赛对阵"""
-        participants = [reg.participant for reg in registrations]
-        matches_created = []
-        
-        # 分组（每组4-6人）
-        group_size = min(6, max(4, len(participants) // 4))  # 动态调整组大小
-        groups = []
-        
-        # 随机分组
-        import random
-        random.shuffle(participants)
-        
-        for i in range(0, len(participants), group_size):
-            group = participants[i:i + group_size]
-            if len(group) >= 2:  # 确保每组至少2人
-                groups.append(group)
-        
-        # 如果最后一组人数太少，合并到前一组
-        if len(groups) > 1 and len(groups[-1]) < 2:
-            groups[-2].extend(groups[-1])
-            groups.pop()
-        
-        match_number = 1
-        start_time = competition.competition_date
-        
-        # 第一阶段：小组循环赛
-        group_winners = []
-        for group_idx, group in enumerate(groups):
-            group_letter = chr(ord('A') + group_idx)
-            
-            # 组内循环赛
-            for i in range(len(group)):
-                for j in range(i + 1, len(group)):
-                    table_number = ((match_number - 1) % 8) + 1
-                    scheduled_time = start_time + timedelta(minutes=(match_number - 1) * 30)
-                    
-                    match = CompetitionMatch.objects.create(
-                        competition=competition,
-                        player1=group[i],
-                        player2=group[j],
-                        match_type='group_stage',
-                        round_number=1,
-                        table_number=table_number,
-                        scheduled_time=scheduled_time,
-                        status='scheduled',
-                        notes=f'小组{group_letter}循环赛'
-                    )
-                    matches_created.append(match)
-                    match_number += 1
-            
-            # 记录每组的第一名（实际应该根据比赛结果确定）
-            group_winners.append(group[0])  # 临时设置第一个为组内第一
-        
-        # 第二阶段：交叉淘汰赛（如果有多个组）
-        if len(groups) > 1:
-            knockout_participants = group_winners
-            round_number = 2
-            
-            while len(knockout_participants) > 1:
-                next_round = []
-                
-                # 配对进行淘汰赛
-                for i in range(0, len(knockout_participants), 2):
-                    if i + 1 < len(knockout_participants):
-                        table_number = ((match_number - 1) % 8) + 1
-                        scheduled_time = start_time + timedelta(minutes=(match_number - 1) * 30)
-                        
-                        match = CompetitionMatch.objects.create(
-                            competition=competition,
-                            player1=knockout_participants[i],
-                            player2=knockout_participants[i + 1],
-                            match_type='knockout' if round_number < len(groups) + 1 else 'final',
-                            round_number=round_number,
-                            table_number=table_number,
-                            scheduled_time=scheduled_time,
-                            status='scheduled',
-                            notes=f'第{round_number}轮淘汰赛'
-                        )
-                        matches_created.append(match)
-                        match_number += 1
-                        
-                        # 临时设置第一个选手晋级（实际应该根据比赛结果）
-                        next_round.append(knockout_participants[i])
-                    else:
-                        # 奇数情况，直接晋级
-                        next_round.append(knockout_participants[i])
-                
-                knockout_participants = next_round
-                round_number += 1
-        
-        return matches_created
+    def _group_stage_fixtures(self, competition, participant_ids):
+        """小组循环赛对阵：沿用已创建的分组，没有或参赛者已变化时重新分组，各组同一轮并行"""
+        saved = grouping.saved_groups(competition)
+        if sorted(player for _, group in saved for player in group) != sorted(participant_ids):
+            CompetitionGroup.objects.filter(competition=competition).delete()
+            # 分组（每组4-6人）
+            group_size = min(6, max(4, len(participant_ids) // 4))  # 动态调整组大小
+            groups = grouping.build_groups(competition, participant_ids, group_size, seed=competition.id)
+            saved = list(zip(grouping.save_groups(competition, groups), groups))
+        
+        group_ids = [group_id for group_id, _ in saved]
+        return scheduling.round_robin_fixtures(
+            [group for _, group in saved],
+            notes=lambda group_index: f'{grouping.group_name(group_index)}循环赛',
+            group_ids=group_ids
+        )
     
     @action(detail=True, methods=['get'])
     def my_matches(self, request, pk=None):
@@ -700,10 +591,10 @@ class CompetitionViewSet(viewsets.ModelViewSet):
         """
         competition = self.get_object()
         results = CompetitionResult.objects.filter(
-            match__competition=competition
-        ).select_related(
-            'match__player1__user', 'match__player2__user'
-        ).order_by('match__round_number', 'match__scheduled_time')
+            competition=competition
+        ).select_related('participant').order_by(
+            F('overall_rank').asc(nulls_last=True), 'group', 'group_rank', 'participant_id'
+        )
         
         serializer = CompetitionResultSerializer(results, many=True)
         return Response(serializer.data)
@@ -732,46 +623,32 @@ class CompetitionMatchViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # 检查比赛状态
-        if match.status != 'scheduled':
+        # 获取比赛结果数据
+        try:
+            player1_score = int(request.data.get('player1_score'))
+            player2_score = int(request.data.get('player2_score'))
+        except (TypeError, ValueError):
             return Response(
-                {'error': '比赛状态不正确'},
+                {'error': '请提供完整的比分'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # 获取比赛结果数据
-        player1_score = request.data.get('player1_score')
-        player2_score = request.data.get('player2_score')
-        
-        if player1_score is None or player2_score is None:
+        # 更新双方成绩和小组名次，轮次结束时生成下一轮淘汰赛
+        try:
+            with transaction.atomic():
+                next_round_matches = standings.record_result(match, player1_score, player2_score)
+        except standings.ResultError as e:
             return Response(
-                {'error': '请提供完整的比分'},
+                {'error': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # 确定获胜者
-        if player1_score > player2_score:
-            winner = match.player1
-        elif player2_score > player1_score:
-            winner = match.player2
-        else:
-            winner = None  # 平局
-        
-        with transaction.atomic():
-            # 创建比赛结果
-            result = CompetitionResult.objects.create(
-                match=match,
-                player1_score=player1_score,
-                player2_score=player2_score,
-                winner=winner,
-                recorded_by=user
-            )
-            
-            # 更新比赛状态
-            match.status = 'completed'
-            match.actual_start_time = timezone.now()
-            match.actual_end_time = timezone.now()
-            match.save()
-        
-        serializer = CompetitionResultSerializer(result)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        match = CompetitionMatch.objects.select_related('player1', 'player2', 'winner').get(pk=match.pk)
+        results = CompetitionResult.objects.filter(
+            competition_id=match.competition_id, participant_id__in=[match.player1_id, match.player2_id]
+        ).select_related('participant')
+        return Response({
+            'match': CompetitionMatchSerializer(match).data,
+            'results': CompetitionResultSerializer(results, many=True).data,
+            'next_round_matches': next_round_matches
+        })
@@ -4,4 +4,8 @@ from django.apps import AppConfig
 class CoursesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'courses'
-    verbose_name = '课程管理'
\ No newline at end of file
+    verbose_name = '课程管理'
+
+    def ready(self):
+        # 注册课程报名人数的维护
+        from . import signals  # noqa: F401
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.24 on 2026-10-18 11:07
+
+from django.db import migrations, models
+
+
+def backfill_enrollment_counts(apps, schema_editor):
+    """按有效的报名记录统计每门课程的报名人数"""
+    from django.db.models import Count, OuterRef, Subquery, Value
+    from django.db.models.functions import Coalesce
+
+    Course = apps.get_model('courses', 'Course')
+    CourseEnrollment = apps.get_model('courses', 'CourseEnrollment')
+    Course.objects.update(enrollment_count=Coalesce(Subquery(
+        CourseEnrollment.objects.filter(course=OuterRef('pk'), is_active=True)
+        .values('course').annotate(total=Count('pk')).values('total')[:1]
+    ), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='enrollment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='当前报名人数'),
+        ),
+        migrations.RunPython(backfill_enrollment_counts, migrations.RunPython.noop),
+    ]
@@ -2,10 +2,11 @@ from django.db import models
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from accounts.models import User
+from campus.counters import CounterFieldsMixin
 from campus.models import Campus, CampusArea
 
 
-class Course(models.Model):
+class Course(CounterFieldsMixin, models.Model):
     """课程模型"""
     COURSE_TYPE_CHOICES = [
         ('beginner', '初级课程'),
@@ -95,6 +96,12 @@ class Course(models.Model):
         null=True,
         verbose_name='所需器材'
     )
+    # 由信号维护，见 campus.counters
+    enrollment_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='当前报名人数'
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name='创建时间'
@@ -103,6 +110,8 @@ class Course(models.Model):
         auto_now=True,
         verbose_name='更新时间'
     )
+
+    counter_fields = ('enrollment_count',)
     
     class Meta:
         verbose_name = '课程'
@@ -116,7 +125,7 @@ class Course(models.Model):
     @property
     def current_enrollments_count(self):
         """当前报名人数"""
-        return self.enrollments.filter(is_active=True).count()
+        return self.enrollment_count
     
     @property
     def available_spots(self):
@@ -13,7 +13,7 @@ class CourseSerializer(serializers.ModelSerializer):
     campus_name = serializers.CharField(source='campus.name', read_only=True)
     coach_name = serializers.CharField(source='coach.real_name', read_only=True)
     area_name = serializers.CharField(source='area.name', read_only=True)
-    current_enrollments_count = serializers.ReadOnlyField()
+    current_enrollments_count = serializers.IntegerField(source='enrollment_count', read_only=True)
     available_spots = serializers.ReadOnlyField()
     is_full = serializers.ReadOnlyField()
     total_price = serializers.ReadOnlyField()
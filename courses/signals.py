@@ -0,0 +1,33 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from campus import counters
+
+from .models import Course, CourseEnrollment
+
+enrollment_counter = counters.register(CourseEnrollment, 'course', Course, 'enrollment_count')
+
+
+@receiver(post_init, sender=CourseEnrollment)
+def remember_enrollment_key(sender, instance, **kwargs):
+    """记录加载时的所属课程和是否有效，保存时据此增减报名人数"""
+    enrollment_counter.remember(instance)
+
+
+@receiver(pre_save, sender=CourseEnrollment)
+def load_enrollment_key(sender, instance, raw=False, **kwargs):
+    # 外键或 is_active 被延迟加载时，保存前从数据库读取原值
+    if not raw and instance.pk:
+        enrollment_counter.load(instance)
+
+
+@receiver(post_save, sender=CourseEnrollment)
+def update_enrollment_count_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """报名的课程或是否有效变化时，在同一事务中更新课程的报名人数"""
+    if not raw:
+        enrollment_counter.saved(instance, created, update_fields)
+
+
+@receiver(post_delete, sender=CourseEnrollment)
+def update_enrollment_count_on_delete(sender, instance, **kwargs):
+    enrollment_counter.deleted(instance)
@@ -0,0 +1,60 @@
+"""
+缓存版本号
+
+按版本号组织的缓存把版本号放进缓存键：数据变化时递增版本号，旧版本的缓存项不再被读取，
+随过期时间淘汰，不需要逐个删除。版本号键本身不过期。
+
+版本号键被淘汰（或缓存重启）后用当前毫秒时间戳重新生成，不能与仍在缓存中的旧版本重复。
+
+版本号必须保存在各进程共享的缓存中（设置 REDIS_URL），否则一个进程的失效对其他进程不可见，
+球台占用索引、课表缓存和校区目录会一直返回旧数据；非调试模式下使用进程内缓存时，
+系统检查（runserver/migrate/check 启动时）给出警告。
+"""
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+
+# 只在当前进程内有效的缓存后端
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def _new_version():
+    return int(time.time() * 1000)
+
+
+def get_version(key):
+    """返回版本号，不存在时初始化"""
+    version = cache.get(key)
+    if version is None:
+        # 并发初始化时由 add 保证只有一个值生效
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump(*keys):
+    """递增版本号，使对应的缓存项全部失效"""
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs=None, **kwargs):
+    """多进程部署（非调试模式）时默认缓存必须在进程间共享"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if settings.DEBUG or backend not in PROCESS_LOCAL_BACKENDS:
+        return []
+    return [checks.Warning(
+        f'默认缓存 {backend} 不在进程间共享，缓存版本号的递增只对当前进程生效。',
+        hint='多进程部署时设置 REDIS_URL 使用 Redis 缓存，否则球台占用索引、课表缓存和校区目录'
+             '在其他进程中会返回旧数据。',
+        id='keshe.W001',
+    )]
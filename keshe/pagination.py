@@ -0,0 +1,131 @@
+"""
+键集（游标）分页
+
+Paginator / PageNumberPagination 每页都要 COUNT(*) 全部结果，并用 OFFSET 跳过前面的行，
+页码越大越慢。键集分页按 (排序字段, id) 排序，游标记录上一页最后一行的排序值和ID，
+下一页用 WHERE (field, id) < (value, last_id) 直接从索引定位，不需要 OFFSET。
+
+列表接口传 cursor 参数时使用键集分页（第一页传空字符串 cursor=），
+不传时保持原有的页码分页。键集分页默认不统计总数，可通过 count 参数选择：
+    count=exact     精确总数（COUNT(*)）
+    count=estimate  最多统计 ESTIMATE_LIMIT 行，超过时返回 ESTIMATE_LIMIT 且 count_exact 为 False
+排序字段需要有 (过滤字段..., 排序字段, id) 的复合索引。
+"""
+import base64
+import json
+from decimal import Decimal
+
+from django.db.models import Q
+from rest_framework import pagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+ESTIMATE_LIMIT = 1000
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def use_cursor(request):
+    """请求是否使用键集分页"""
+    return 'cursor' in request.GET
+
+
+def cursor_value(value):
+    """游标中保存的排序值；时间保留微秒（DjangoJSONEncoder 只保留到毫秒，同一毫秒内的行会被跳过）"""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(obj, field='created_at'):
+    payload = json.dumps([cursor_value(getattr(obj, field)), obj.pk])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor, model, field='created_at'):
+    """返回 (排序值, ID)，游标无效时抛出 InvalidCursor"""
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return model._meta.get_field(field).to_python(value), int(pk)
+    except Exception:
+        raise InvalidCursor('无效的分页游标')
+
+
+def count_results(queryset, mode):
+    """按 count 参数统计总数，返回 (总数, 是否精确)；不统计时返回 (None, False)"""
+    if mode == 'exact':
+        return queryset.count(), True
+    if mode == 'estimate':
+        count = queryset[:ESTIMATE_LIMIT + 1].count()
+        if count > ESTIMATE_LIMIT:
+            return ESTIMATE_LIMIT, False
+        return count, True
+    return None, False
+
+
+def keyset_page(queryset, cursor, page_size, field='created_at', descending=True):
+    """
+    取 cursor 之后的一页，返回 (对象列表, 下一页游标)；cursor 为空时取第一页。
+    queryset 上已有的排序会被替换为 (field, id)。
+    """
+    prefix = '-' if descending else ''
+    queryset = queryset.order_by(f'{prefix}{field}', f'{prefix}pk')
+    if cursor:
+        value, pk = decode_cursor(cursor, queryset.model, field)
+        lookup = 'lt' if descending else 'gt'
+        queryset = queryset.filter(
+            Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'pk__{lookup}': pk})
+        )
+    objects = list(queryset[:page_size + 1])
+    next_cursor = encode_cursor(objects[page_size - 1], field) if len(objects) > page_size else None
+    return objects[:page_size], next_cursor
+
+
+def paginate(request, queryset, default_page_size=10, field='created_at', descending=True):
+    """
+    @api_view 列表接口使用的键集分页，返回 (对象列表, 分页信息)。
+    分页信息包含 page_size、has_next、next_cursor，按 count 参数附带 count、count_exact。
+    """
+    try:
+        page_size = min(max(int(request.GET.get('page_size', default_page_size)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        page_size = default_page_size
+    count, exact = count_results(queryset, request.GET.get('count'))
+    objects, next_cursor = keyset_page(queryset, request.GET.get('cursor'), page_size, field, descending)
+    meta = {
+        'page_size': page_size,
+        'has_next': next_cursor is not None,
+        'next_cursor': next_cursor,
+    }
+    if count is not None:
+        meta.update(count=count, count_exact=exact)
+    return objects, meta
+
+
+class CreatedAtCursorPagination(pagination.PageNumberPagination):
+    """
+    视图集使用的分页：传 cursor 参数时按 (created_at, id) 键集分页，否则与 PageNumberPagination 相同
+    """
+    cursor_field = 'created_at'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = use_cursor(request)
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+        try:
+            objects, self.meta = paginate(
+                request, queryset, default_page_size=self.page_size, field=self.cursor_field
+            )
+        except InvalidCursor as e:
+            raise ValidationError({'cursor': str(e)})
+        return objects
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response({**self.meta, 'results': data})
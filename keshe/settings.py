@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +51,7 @@ INSTALLED_APPS = [
     "notifications",
     "competitions",
     "logs",
+    "search",
 ]
 
 MIDDLEWARE = [
@@ -216,6 +219,71 @@ LOGOUT_REDIRECT_URL = '/'
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 
+# 缓存配置：设置 REDIS_URL 环境变量时使用 Redis，多进程部署可共享消息计数、球台索引版本号等缓存；
+# 未设置时使用进程内存缓存，只适合单进程运行，非调试模式下系统检查会给出警告（keshe.W001）
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'keshe-default',
+        }
+    }
+
+# 通知发件箱配置（见 notifications/outbox.py）
+NOTIFICATION_OUTBOX = {
+    'AUTO_DISPATCH': True,  # 事务提交后在后台线程投递；关闭后需运行 dispatch_notifications 命令
+    'BATCH_SIZE': 200,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY_SECONDS': 30,
+}
+
+# 是否在运行测试（manage.py test）
+TESTING = sys.argv[1:2] == ['test']
+
+# 测试运行器关闭 DEBUG，但测试只在单个进程中运行，不需要共享缓存的警告（见 keshe/cache_versions.py）
+SILENCED_SYSTEM_CHECKS = ['keshe.W001'] if TESTING else []
+
+# 用户操作日志缓冲写入：请求中产生的日志由后台线程批量写入；
+# 测试时同步写入，避免后台线程和退出时的写入越过测试数据库的生命周期
+SYSTEM_LOG_BUFFER = {
+    'ENABLED': not TESTING,
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 2.0,  # 秒
+    'MAX_PENDING': 10000,
+}
+
+# 日志统计：跨度不少于 ROLLUP_MIN_DAYS 天的统计读取日汇总表（需定时运行 rollup_log_statistics）
+LOG_STATISTICS = {
+    'ROLLUP_MIN_DAYS': 30,
+}
+
+# 实时消息推送（SSE，需 ASGI 部署）：多进程部署时通过 Redis 在进程之间转发事件
+NOTIFICATION_STREAM = {
+    'BACKEND': 'notifications.pubsub.RedisBackend' if REDIS_URL else 'notifications.pubsub.InMemoryBackend',
+    'OPTIONS': {'url': REDIS_URL} if REDIS_URL else {},
+    'HEARTBEAT_SECONDS': 15,
+    'MAX_DURATION_SECONDS': 300,
+}
+
+# 全文搜索：n-gram 倒排索引，教练/学员/系统日志搜索先用索引缩小范围（首次部署后运行 rebuild_search_index）
+SEARCH_INDEX = {
+    'ENABLED': True,
+    'BATCH_SIZE': 500,
+    'MAX_QUERY_TERMS': 12,
+    'MAX_CANDIDATES': 2000,
+}
+
 # 确保logs目录存在
 import os
 LOGS_DIR = BASE_DIR / 'logs'
@@ -0,0 +1,80 @@
+"""
+信号驱动的冗余计数
+
+每条记录按若干字段计入一个"键"（如所属校区ID、(用户ID, 月份)），计数保存在数据库中。
+记录保存/删除时由信号比较新旧键，在同一事务中把计数从旧键移到新键。
+子类实现：
+    key_of(instance)      由已加载的字段计算键，不计入时为 None，字段被延迟加载时返回 UNKNOWN
+    stored_key(instance)  数据库中该记录当前的键
+    adjust(key, delta)    增减键对应的计数
+各应用的信号处理函数依次调用 remember(post_init) / load(pre_save) / saved(post_save) / deleted(post_delete)。
+QuerySet.update()/bulk_create() 不触发信号，调用方需自行调用 move / move_many。
+"""
+from collections import Counter
+
+# post_init 时计算键的字段被延迟加载（.only()/.defer()），无法得知保存前的值
+UNKNOWN = object()
+
+
+class SignalCounter:
+    # 保存在 instance._counter_keys 中的名称，同一模型上的计数不能重复
+    name = None
+    # 决定键的字段；save(update_fields=...) 不包含其中任何字段时不会改变键
+    fields = ()
+
+    def key_of(self, instance):
+        raise NotImplementedError
+
+    def stored_key(self, instance):
+        raise NotImplementedError
+
+    def adjust(self, key, delta):
+        raise NotImplementedError
+
+    def move(self, old_key, new_key, count=1):
+        """count 条记录的计入位置从 old_key 变为 new_key"""
+        if old_key == new_key:
+            return
+        if old_key:
+            self.adjust(old_key, -count)
+        if new_key:
+            self.adjust(new_key, count)
+
+    def move_many(self, old_keys, new_key):
+        """批量 UPDATE 后，一批记录的计入位置都变为 new_key（按原位置分组，每组一次更新）"""
+        counts = Counter(key for key in old_keys if key != new_key)
+        for old_key, count in counts.items():
+            self.move(old_key, new_key, count)
+
+    def remembered(self, instance):
+        """加载（或上次保存）时记录的键"""
+        return instance.__dict__.get('_counter_keys', {}).get(self.name, UNKNOWN)
+
+    def _remember(self, instance, key):
+        instance.__dict__.setdefault('_counter_keys', {})[self.name] = key
+
+    # 以下由信号调用
+
+    def remember(self, instance):
+        self._remember(instance, self.key_of(instance))
+
+    def load(self, instance):
+        if self.remembered(instance) is UNKNOWN:
+            self._remember(instance, self.stored_key(instance))
+
+    def saved(self, instance, created, update_fields=None):
+        if update_fields is not None and not set(self.fields) & set(update_fields):
+            return
+        new_key = self.key_of(instance)
+        if new_key is UNKNOWN:
+            new_key = self.stored_key(instance)
+        old_key = None if created else self.remembered(instance)
+        self.move(old_key, new_key)
+        self._remember(instance, new_key)
+
+    def deleted(self, instance):
+        key = self.remembered(instance)
+        if key is UNKNOWN:
+            key = self.key_of(instance)
+        if key and key is not UNKNOWN:
+            self.move(key, None)
@@ -4,4 +4,8 @@ from django.apps import AppConfig
 class LogsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'logs'
-    verbose_name = '系统日志'
\ No newline at end of file
+    verbose_name = '系统日志'
+
+    def ready(self):
+        # 注册用户校区缓存失效的信号处理
+        from . import signals  # noqa: F401
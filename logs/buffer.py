@@ -0,0 +1,156 @@
+"""
+系统日志缓冲写入
+
+请求处理中产生的操作日志先放入进程内缓冲区，由后台线程在以下任一条件满足时
+用 bulk_create 批量写入：
+    - 缓冲数量达到 BATCH_SIZE
+    - 距上次写入超过 FLUSH_INTERVAL 秒
+进程退出时（atexit）写入剩余日志。日志在请求所在事务提交后才进入缓冲区，事务回滚时不记录。
+每条日志记录产生时的数据库名，写入时数据库已切换（如测试数据库销毁后）的日志直接丢弃，
+不会写入其他数据库。
+bulk_create 不触发 post_save，后台线程每次写入后由 search.index.catch_up 为新日志建搜索索引。
+
+缓冲区中的日志在进程异常退出（如 kill -9）时会丢失，需要强一致记录的场景请直接使用
+SystemLog.create_log。
+
+配置（settings.SYSTEM_LOG_BUFFER，均可省略）：
+    ENABLED         是否启用缓冲写入，关闭后同步写入，默认 True
+    BATCH_SIZE      每批写入数量，默认 100
+    FLUSH_INTERVAL  最长缓冲时间（秒），默认 2
+    MAX_PENDING     缓冲上限，超出时丢弃最旧的日志，默认 10000
+"""
+import atexit
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+
+from search import index as search_index
+
+from .models import SystemLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 2.0,
+    'MAX_PENDING': 10000,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'SYSTEM_LOG_BUFFER', {}).get(name, DEFAULTS[name])
+
+
+def _database_name():
+    return connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+
+
+class SystemLogBuffer:
+    """进程内日志缓冲区，后台线程按数量或时间阈值批量写入"""
+
+    def __init__(self):
+        self._records = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._records)
+
+    def add(self, log):
+        with self._lock:
+            if len(self._records) >= get_setting('MAX_PENDING'):
+                self._records.popleft()
+                self.dropped += 1
+            self._records.append((_database_name(), log))
+            pending = len(self._records)
+            self._ensure_thread()
+        if pending >= get_setting('BATCH_SIZE'):
+            self._wakeup.set()
+
+    def flush(self):
+        """写入缓冲区中的全部日志，返回写入数量"""
+        written = 0
+        batch_size = get_setting('BATCH_SIZE')
+        while True:
+            with self._lock:
+                batch = [self._records.popleft() for _ in range(min(batch_size, len(self._records)))]
+            if not batch:
+                return written
+            database = _database_name()
+            logs = [log for name, log in batch if name == database]
+            if len(logs) < len(batch):
+                self.dropped += len(batch) - len(logs)
+                logger.warning(f"Dropped {len(batch) - len(logs)} system logs made on another database")
+            if logs:
+                written += self._write(logs)
+
+    def _write(self, batch):
+        try:
+            SystemLog.objects.bulk_create(batch)
+            return len(batch)
+        except Exception as e:
+            # 整批失败时逐条写入，避免一条坏数据拖累整批
+            logger.warning(f"Bulk system log write failed, retrying one by one: {e}")
+        written = 0
+        for log in batch:
+            try:
+                log.save()
+                written += 1
+            except Exception as e:
+                logger.error(f"写入系统日志失败: {e}")
+        return written
+
+    def _index(self, written):
+        # 每次最多处理本次写入量的两倍，新日志之外顺带补建历史日志的索引
+        try:
+            search_index.catch_up('system_log', limit=written * 2)
+        except Exception as e:
+            logger.error(f"Index system logs failed: {e}")
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='system-log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(get_setting('FLUSH_INTERVAL'))
+            self._wakeup.clear()
+            if not self._records:
+                continue
+            close_old_connections()
+            try:
+                written = self.flush()
+            except Exception as e:
+                logger.error(f"Background system log flush failed: {e}")
+                continue
+            if written:
+                self._index(written)
+
+
+log_buffer = SystemLogBuffer()
+
+
+@atexit.register
+def _flush_on_exit():
+    if len(log_buffer):
+        try:
+            log_buffer.flush()
+        except Exception as e:
+            logger.error(f"Flush system logs on exit failed: {e}")
+
+
+def enqueue_log(log):
+    """
+    提交一条未保存的 SystemLog：启用缓冲时在事务提交后放入缓冲区，否则立即写入
+    """
+    if not get_setting('ENABLED'):
+        log.save()
+        return
+    transaction.on_commit(lambda: log_buffer.add(log))
@@ -0,0 +1,94 @@
+"""
+用户与校区关系缓存
+
+1. 用户所属校区：记录系统日志时需要按用户类型查找所属校区（校区管理员查 managed_campus，
+   学员查 campus_memberships，教练查 campus_assignments），每条日志多 1~2 次查询，
+   这里按用户缓存校区ID。
+2. 校区成员：校区管理员、在校学员和在职教练的用户ID集合，按校区缓存，
+   用于校区管理员查看单条日志时的权限判断。
+
+校区关系变化时由 logs.signals 清除对应的缓存。
+"""
+from django.core.cache import cache
+from django.db.models import Q
+
+CACHE_TIMEOUT = 300
+CAMPUS_CACHE_KEY = 'logs:user_campus:{user_id}'
+CAMPUS_MEMBERS_CACHE_KEY = 'logs:campus_members:{campus_id}'
+
+# 缓存中表示“没有所属校区”
+NO_CAMPUS = 0
+
+
+def _key(user_id):
+    return CAMPUS_CACHE_KEY.format(user_id=user_id)
+
+
+def _lookup(user):
+    from campus.models import Campus
+
+    if user.user_type == 'campus_admin':
+        return Campus.objects.filter(manager_id=user.id).values_list('id', flat=True).first()
+    if user.user_type == 'student':
+        return user.campus_memberships.filter(is_active=True).values_list('campus_id', flat=True).first()
+    if user.user_type == 'coach':
+        return user.campus_assignments.filter(is_active=True).values_list('campus_id', flat=True).first()
+    return None
+
+
+def get_campus_id(user):
+    """获取用户所属校区ID，没有时返回 None"""
+    key = _key(user.id)
+    campus_id = cache.get(key)
+    if campus_id is None:
+        campus_id = _lookup(user) or NO_CAMPUS
+        cache.set(key, campus_id, CACHE_TIMEOUT)
+    return campus_id or None
+
+
+def invalidate(*user_ids):
+    cache.delete_many([_key(user_id) for user_id in user_ids if user_id])
+
+
+def members_filter(manager, field='user'):
+    """
+    校区管理员所管理校区的成员过滤条件（子查询，不加载成员列表），
+    成员包括校区管理员本人、在校学员和在职教练
+    """
+    from campus.models import Campus, CampusCoach, CampusStudent
+
+    return (
+        Q(**{f'{field}__in': Campus.objects.filter(manager=manager).values('manager_id')})
+        | Q(**{f'{field}__in': CampusStudent.objects.filter(
+            campus__manager=manager, is_active=True
+        ).values('student_id')})
+        | Q(**{f'{field}__in': CampusCoach.objects.filter(
+            campus__manager=manager, is_active=True
+        ).values('coach_id')})
+    )
+
+
+def get_member_ids(campus_id):
+    """获取校区成员的用户ID集合"""
+    key = CAMPUS_MEMBERS_CACHE_KEY.format(campus_id=campus_id)
+    member_ids = cache.get(key)
+    if member_ids is None:
+        from campus.models import Campus, CampusCoach, CampusStudent
+
+        # 三类成员合并为一次 UNION 查询
+        managers = Campus.objects.filter(
+            id=campus_id, manager__isnull=False
+        ).values_list('manager_id', flat=True).order_by()
+        students = CampusStudent.objects.filter(
+            campus_id=campus_id, is_active=True
+        ).values_list('student_id', flat=True).order_by()
+        coaches = CampusCoach.objects.filter(
+            campus_id=campus_id, is_active=True
+        ).values_list('coach_id', flat=True).order_by()
+        member_ids = set(managers.union(students, coaches))
+        cache.set(key, member_ids, CACHE_TIMEOUT)
+    return member_ids
+
+
+def invalidate_members(*campus_ids):
+    cache.delete_many([CAMPUS_MEMBERS_CACHE_KEY.format(campus_id=campus_id) for campus_id in campus_ids if campus_id])
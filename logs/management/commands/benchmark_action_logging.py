@@ -0,0 +1,96 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from accounts.models import User
+from logs import campus_cache
+from logs.buffer import log_buffer
+from logs.middleware import UserActionLoggingMiddleware
+from logs.models import SystemLog
+
+BENCHMARK_USER_AGENT = 'benchmark_action_logging'
+
+
+class Command(BaseCommand):
+    help = '测量用户操作日志中间件为每个请求增加的耗时（同步写入 vs 缓冲批量写入）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='每种模式模拟的请求数（默认500）'
+        )
+        parser.add_argument(
+            '--username',
+            help='模拟请求的用户（默认使用第一个有所属校区的学员）'
+        )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['username'])
+        count = options['requests']
+        if count < 1:
+            raise CommandError('--requests 必须大于0')
+        self.stdout.write(f'模拟用户：{user.username}（{user.user_type}），每种模式 {count} 个请求')
+
+        try:
+            with override_settings(SYSTEM_LOG_BUFFER={'ENABLED': False}):
+                before = self.run(user, count, cached_campus=False)
+            self.report('同步写入（原实现）', before)
+
+            with override_settings(SYSTEM_LOG_BUFFER={'BATCH_SIZE': count + 1, 'FLUSH_INTERVAL': 3600}):
+                after = self.run(user, count, cached_campus=True)
+                started = time.perf_counter()
+                flushed = log_buffer.flush()
+                flush_ms = (time.perf_counter() - started) * 1000
+            self.report('缓冲批量写入', after)
+            self.stdout.write(
+                f'  后台批量写入 {flushed} 条耗时 {flush_ms:.1f} ms，'
+                f'折合每请求 {flush_ms / max(flushed, 1):.3f} ms（不在请求线程中）'
+            )
+        finally:
+            SystemLog.objects.filter(user_agent=BENCHMARK_USER_AGENT).delete()
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'用户 {username} 不存在')
+        user = User.objects.filter(user_type='student', campus_memberships__is_active=True).first()
+        if user is None:
+            raise CommandError('没有找到有所属校区的学员，请通过 --username 指定用户')
+        return user
+
+    def run(self, user, count, cached_campus):
+        middleware = UserActionLoggingMiddleware(lambda request: HttpResponse(status=201))
+        factory = RequestFactory()
+        durations = []
+        queries = 0
+        for _ in range(count):
+            if not cached_campus:
+                campus_cache.invalidate(user.id)
+            # 使用会被中间件记录的写操作地址；响应是固定的，不会执行真正的视图
+            request = factory.post('/api/reservations/bookings/1/confirm/', HTTP_USER_AGENT=BENCHMARK_USER_AGENT)
+            request.user = user
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                middleware(request)
+                durations.append((time.perf_counter() - started) * 1000)
+            queries += len(context.captured_queries)
+        durations.sort()
+        return {
+            'avg': sum(durations) / count,
+            'p95': durations[int(count * 0.95) - 1],
+            'queries': queries / count,
+        }
+
+    def report(self, label, result):
+        self.stdout.write(self.style.SUCCESS(
+            f'{label}：平均 {result["avg"]:.3f} ms，P95 {result["p95"]:.3f} ms，'
+            f'每请求 {result["queries"]:.1f} 次查询'
+        ))
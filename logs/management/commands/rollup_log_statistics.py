@@ -0,0 +1,60 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from logs.models import LoginLog, SystemLog
+from logs.statistics import UTC, rollup_days
+
+
+class Command(BaseCommand):
+    help = '汇总系统日志和登录日志的每日统计（UTC 日期），供长时间跨度的统计接口使用'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=2,
+            help='重新汇总最近多少个完整日期（默认2天，覆盖跨零点写入的日志）'
+        )
+        parser.add_argument(
+            '--since',
+            help='从指定日期（YYYY-MM-DD）开始汇总到昨天，用于首次回填'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='从最早的日志开始汇总到昨天'
+        )
+
+    def handle(self, *args, **options):
+        last = timezone.now().astimezone(UTC).date() - datetime.timedelta(days=1)
+
+        if options['all']:
+            earliest = [
+                value for value in (
+                    SystemLog.objects.aggregate(value=Min('created_at'))['value'],
+                    LoginLog.objects.aggregate(value=Min('login_time'))['value'],
+                ) if value
+            ]
+            if not earliest:
+                self.stdout.write(self.style.WARNING('没有需要汇总的日志'))
+                return
+            first = min(earliest).astimezone(UTC).date()
+        elif options['since']:
+            try:
+                first = datetime.date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since 日期格式应为 YYYY-MM-DD')
+        else:
+            if options['days'] < 1:
+                raise CommandError('--days 必须大于0')
+            first = last - datetime.timedelta(days=options['days'] - 1)
+
+        if first > last:
+            self.stdout.write(self.style.WARNING('没有完整的日期需要汇总'))
+            return
+
+        days = rollup_days(first, last)
+        self.stdout.write(self.style.SUCCESS(f'已汇总 {first} 至 {last} 共 {days} 天的日志统计'))
@@ -207,7 +207,8 @@ class UserActionLoggingMiddleware(MiddlewareMixin):
                 resource_id=action_info['resource_id'],
                 description=description,
                 request=request,
-                extra_data=extra_data
+                extra_data=extra_data,
+                buffered=True
             )
             
         except Exception as e:
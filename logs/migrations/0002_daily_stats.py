@@ -0,0 +1,49 @@
+# Generated by Django 4.2.24 on 2026-10-18 10:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campus', '0003_auto_20250911_1813'),
+        ('logs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoginLogDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='日期')),
+                ('successful', models.PositiveIntegerField(default=0, verbose_name='成功次数')),
+                ('failed', models.PositiveIntegerField(default=0, verbose_name='失败次数')),
+                ('rolled_up_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='汇总时间')),
+            ],
+            options={
+                'verbose_name': '登录日志日汇总',
+                'verbose_name_plural': '登录日志日汇总',
+                'db_table': 'logs_login_log_daily_stat',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SystemLogDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('action_type', models.CharField(choices=[('create', '创建'), ('update', '更新'), ('delete', '删除'), ('login', '登录'), ('logout', '登出'), ('approve', '审核'), ('reject', '拒绝'), ('cancel', '取消'), ('confirm', '确认'), ('payment', '支付'), ('refund', '退款'), ('register', '注册'), ('other', '其他')], max_length=20, verbose_name='操作类型')),
+                ('resource_type', models.CharField(choices=[('user', '用户'), ('campus', '校区'), ('student', '学员'), ('coach', '教练'), ('booking', '预约'), ('course', '课程'), ('payment', '支付'), ('competition', '比赛'), ('notification', '通知'), ('system', '系统'), ('other', '其他')], max_length=20, verbose_name='资源类型')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='日志数量')),
+                ('campus', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='log_daily_stats', to='campus.campus', verbose_name='所属校区')),
+            ],
+            options={
+                'verbose_name': '系统日志日汇总',
+                'verbose_name_plural': '系统日志日汇总',
+                'db_table': 'logs_system_log_daily_stat',
+                'unique_together': {('date', 'campus', 'action_type', 'resource_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-18 10:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0002_daily_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='systemlog',
+            name='search_indexed',
+            field=models.BooleanField(db_index=True, default=False, verbose_name='已建搜索索引'),
+        ),
+    ]
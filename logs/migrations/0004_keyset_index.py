@@ -0,0 +1,17 @@
+# Generated by Django 4.2.24 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0003_system_log_search_indexed'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='systemlog',
+            index=models.Index(fields=['created_at', 'id'], name='logs_system_created_3a5edd_idx'),
+        ),
+    ]
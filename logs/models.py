@@ -3,6 +3,8 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 import json
 
+from . import campus_cache
+
 User = get_user_model()
 
 
@@ -98,6 +100,11 @@ class SystemLog(models.Model):
         default=timezone.now,
         verbose_name='操作时间'
     )
+    search_indexed = models.BooleanField(
+        default=False,
+        db_index=True,
+        verbose_name='已建搜索索引'
+    )
     
     class Meta:
         verbose_name = '系统日志'
@@ -109,47 +116,56 @@ class SystemLog(models.Model):
             models.Index(fields=['action_type', 'created_at']),
             models.Index(fields=['resource_type', 'created_at']),
             models.Index(fields=['campus', 'created_at']),
+            # 键集分页
+            models.Index(fields=['created_at', 'id']),
         ]
     
     def __str__(self):
         user_name = self.user.real_name if self.user and self.user.real_name else (self.user.username if self.user else '系统')
         return f"{user_name} - {self.get_action_type_display()} - {self.description}"
     
+    @classmethod
+    def build_log(cls, user=None, action_type='other', resource_type='other',
+                  resource_id=None, resource_name=None, description='',
+                  ip_address=None, user_agent=None, extra_data=None, campus=None):
+        """构造未保存的系统日志，用于批量写入"""
+        log = cls(
+            user=user,
+            action_type=action_type,
+            resource_type=resource_type,
+            resource_id=str(resource_id) if resource_id else None,
+            resource_name=resource_name,
+            description=description,
+            ip_address=ip_address,
+            user_agent=user_agent,
+            extra_data=extra_data or {},
+            campus=campus
+        )
+        # 如果用户有校区信息且没有指定校区，自动设置校区
+        # （校区管理员使用其管理的校区，学员使用其所属校区，教练使用其工作的校区）
+        if user and not campus:
+            log.campus_id = campus_cache.get_campus_id(user)
+        return log
+
     @classmethod
     def create_log(cls, user=None, action_type='other', resource_type='other', 
                    resource_id=None, resource_name=None, description='', 
                    ip_address=None, user_agent=None, extra_data=None, campus=None):
         """创建系统日志的便捷方法"""
-        # 如果用户有校区信息且没有指定校区，自动设置校区
-        if user and not campus:
-            # 对于校区管理员，使用其管理的校区
-            if user.user_type == 'campus_admin':
-                managed_campus = user.managed_campus.first()
-                if managed_campus:
-                    campus = managed_campus
-            # 对于学员，使用其所属的校区
-            elif user.user_type == 'student':
-                student_campus = user.campus_memberships.filter(is_active=True).first()
-                if student_campus:
-                    campus = student_campus.campus
-            # 对于教练，使用其工作的校区
-            elif user.user_type == 'coach':
-                coach_campus = user.campus_assignments.filter(is_active=True).first()
-                if coach_campus:
-                    campus = coach_campus.campus
-        
-        return cls.objects.create(
+        log = cls.build_log(
             user=user,
             action_type=action_type,
             resource_type=resource_type,
-            resource_id=str(resource_id) if resource_id else None,
+            resource_id=resource_id,
             resource_name=resource_name,
             description=description,
             ip_address=ip_address,
             user_agent=user_agent,
-            extra_data=extra_data or {},
+            extra_data=extra_data,
             campus=campus
         )
+        log.save()
+        return log
 
 
 class LoginLog(models.Model):
@@ -216,4 +232,56 @@ class LoginLog(models.Model):
         """会话持续时间"""
         if self.logout_time:
             return self.logout_time - self.login_time
-        return None
\ No newline at end of file
+        return None
+
+class SystemLogDailyStat(models.Model):
+    """系统日志按日汇总（UTC 日期），由 rollup_log_statistics 命令维护"""
+    date = models.DateField(verbose_name='日期')
+    campus = models.ForeignKey(
+        'campus.Campus',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='log_daily_stats',
+        verbose_name='所属校区'
+    )
+    action_type = models.CharField(
+        max_length=20,
+        choices=SystemLog.ACTION_TYPE_CHOICES,
+        verbose_name='操作类型'
+    )
+    resource_type = models.CharField(
+        max_length=20,
+        choices=SystemLog.RESOURCE_TYPE_CHOICES,
+        verbose_name='资源类型'
+    )
+    count = models.PositiveIntegerField(default=0, verbose_name='日志数量')
+
+    class Meta:
+        verbose_name = '系统日志日汇总'
+        verbose_name_plural = '系统日志日汇总'
+        db_table = 'logs_system_log_daily_stat'
+        unique_together = ['date', 'campus', 'action_type', 'resource_type']
+
+    def __str__(self):
+        return f"{self.date} - {self.action_type}/{self.resource_type} - {self.count}"
+
+
+class LoginLogDailyStat(models.Model):
+    """
+    登录日志按日汇总（UTC 日期），由 rollup_log_statistics 命令维护。
+    汇总过的日期即使没有登录也会有一行，同时用来判断某天是否已汇总。
+    """
+    date = models.DateField(unique=True, verbose_name='日期')
+    successful = models.PositiveIntegerField(default=0, verbose_name='成功次数')
+    failed = models.PositiveIntegerField(default=0, verbose_name='失败次数')
+    rolled_up_at = models.DateTimeField(default=timezone.now, verbose_name='汇总时间')
+
+    class Meta:
+        verbose_name = '登录日志日汇总'
+        verbose_name_plural = '登录日志日汇总'
+        db_table = 'logs_login_log_daily_stat'
+        ordering = ['date']
+
+    def __str__(self):
+        return f"{self.date} - 成功 {self.successful} / 失败 {self.failed}"
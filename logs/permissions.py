@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from . import campus_cache
+
 
 class LogViewPermission(permissions.BasePermission):
     """日志查看权限"""
@@ -25,23 +27,16 @@ class LogViewPermission(permissions.BasePermission):
             return True
         elif user.is_campus_admin:
             # 校区管理员只能查看自己管理的校区的日志
-            managed_campuses = user.managed_campus.all()
+            managed_campus_ids = list(user.managed_campus.values_list('id', flat=True))
             
-            if hasattr(obj, 'campus') and obj.campus:
-                return obj.campus in managed_campuses
-            elif hasattr(obj, 'user') and obj.user:
-                # 检查用户是否属于管理的校区
-                for campus in managed_campuses:
-                    # 检查是否是校区管理员
-                    if campus.manager == obj.user:
-                        return True
-                    # 检查是否是校区学员
-                    if campus.students.filter(student=obj.user, is_active=True).exists():
-                        return True
-                    # 检查是否是校区教练
-                    if campus.coaches.filter(coach=obj.user, is_active=True).exists():
-                        return True
-                return False
+            if getattr(obj, 'campus_id', None):
+                return obj.campus_id in managed_campus_ids
+            elif getattr(obj, 'user_id', None):
+                # 检查用户是否属于管理的校区（校区管理员、学员或教练），成员集合按校区缓存
+                return any(
+                    obj.user_id in campus_cache.get_member_ids(campus_id)
+                    for campus_id in managed_campus_ids
+                )
             return False
         else:
             # 普通用户只能查看自己的日志
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from campus.models import Campus, CampusCoach, CampusStudent
+
+from . import campus_cache
+
+
+@receiver([post_save, post_delete], sender=Campus)
+def invalidate_manager_campus(sender, instance, **kwargs):
+    """校区负责人变化后清除其校区缓存（原负责人的缓存按过期时间失效）"""
+    campus_cache.invalidate(instance.manager_id)
+    campus_cache.invalidate_members(instance.id)
+
+
+@receiver([post_save, post_delete], sender=CampusStudent)
+def invalidate_student_campus(sender, instance, **kwargs):
+    campus_cache.invalidate(instance.student_id)
+    campus_cache.invalidate_members(instance.campus_id)
+
+
+@receiver([post_save, post_delete], sender=CampusCoach)
+def invalidate_coach_campus(sender, instance, **kwargs):
+    campus_cache.invalidate(instance.coach_id)
+    campus_cache.invalidate_members(instance.campus_id)
@@ -0,0 +1,173 @@
+"""
+日志统计
+
+统计全部在数据库中用 values().annotate(Count) 分组聚合，不再逐行遍历日志。
+日期按 UTC 截断（与 LoginLog.login_time 的存储时区一致）。
+
+时间跨度不少于 settings.LOG_STATISTICS['ROLLUP_MIN_DAYS'] 天时，窗口内已由
+rollup_log_statistics 命令汇总过的完整日期读取日汇总表，首尾不完整的日期仍查询原始日志；
+窗口内有任何一天未汇总时整体回退到原始日志。
+"""
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+from .models import LoginLog, LoginLogDailyStat, SystemLog, SystemLogDailyStat
+
+DEFAULTS = {
+    'ROLLUP_MIN_DAYS': 30,
+}
+
+UTC = datetime.timezone.utc
+
+
+def get_setting(name):
+    return getattr(settings, 'LOG_STATISTICS', {}).get(name, DEFAULTS[name])
+
+
+def should_use_rollup(days):
+    return days >= get_setting('ROLLUP_MIN_DAYS')
+
+
+def day_start(date):
+    return datetime.datetime.combine(date, datetime.time.min, tzinfo=UTC)
+
+
+def rollup_window(start, now):
+    """
+    返回 [start, now) 内已全部汇总的完整日期范围 (first, last)，没有或不完整时返回 None
+    """
+    start = start.astimezone(UTC)
+    first = start.date()
+    if start > day_start(first):
+        first += datetime.timedelta(days=1)
+    last = now.astimezone(UTC).date() - datetime.timedelta(days=1)
+    if last < first:
+        return None
+    expected = (last - first).days + 1
+    if LoginLogDailyStat.objects.filter(date__range=(first, last)).count() != expected:
+        return None
+    return first, last
+
+
+def _outside_window(field, start, window):
+    """原始日志中不被日汇总覆盖的部分：窗口之前的不完整日期和窗口之后的日期"""
+    first, last = window
+    return (
+        Q(**{f'{field}__gte': start, f'{field}__lt': day_start(first)})
+        | Q(**{f'{field}__gte': day_start(last + datetime.timedelta(days=1))})
+    )
+
+
+def system_log_counts(queryset, start, now, campus_ids=None, use_rollup=False):
+    """
+    按 (操作类型, 资源类型) 统计 queryset 中 start 之后的日志数量。
+    use_rollup 时 queryset 必须是全部日志（campus_ids 为 None）或按 campus_ids 过滤的日志，
+    与日汇总表的范围一致。
+    """
+    window = rollup_window(start, now) if use_rollup else None
+    counts = defaultdict(int)
+
+    if window:
+        raw = queryset.filter(_outside_window('created_at', start, window))
+        rollups = SystemLogDailyStat.objects.filter(date__range=window)
+        if campus_ids is not None:
+            rollups = rollups.filter(campus_id__in=campus_ids)
+        for row in rollups.values('action_type', 'resource_type').annotate(count=Sum('count')).order_by():
+            counts[(row['action_type'], row['resource_type'])] += row['count']
+    else:
+        raw = queryset.filter(created_at__gte=start)
+
+    for row in raw.values('action_type', 'resource_type').annotate(count=Count('id')).order_by():
+        counts[(row['action_type'], row['resource_type'])] += row['count']
+    return counts
+
+
+def system_log_statistics(counts):
+    """把 (操作类型, 资源类型) 计数转换为按显示名称统计的操作类型、资源类型分布"""
+    action_names = dict(SystemLog.ACTION_TYPE_CHOICES)
+    resource_names = dict(SystemLog.RESOURCE_TYPE_CHOICES)
+    action_stats = defaultdict(int)
+    resource_stats = defaultdict(int)
+    for (action_type, resource_type), count in counts.items():
+        action_stats[action_names.get(action_type, action_type)] += count
+        resource_stats[resource_names.get(resource_type, resource_type)] += count
+    return dict(action_stats), dict(resource_stats)
+
+
+def login_daily_counts(queryset, start, now, use_rollup=False):
+    """
+    按日统计 queryset 中 start 之后的登录成功/失败次数，返回 {'YYYY-MM-DD': {'successful', 'failed'}}。
+    use_rollup 时 queryset 必须是全部登录日志。
+    """
+    window = rollup_window(start, now) if use_rollup else None
+    daily = {}
+
+    def add(date, successful, failed):
+        if not successful and not failed:
+            return
+        stats = daily.setdefault(date.strftime('%Y-%m-%d'), {'successful': 0, 'failed': 0})
+        stats['successful'] += successful
+        stats['failed'] += failed
+
+    if window:
+        raw = queryset.filter(_outside_window('login_time', start, window))
+        for row in LoginLogDailyStat.objects.filter(date__range=window).values('date', 'successful', 'failed'):
+            add(row['date'], row['successful'], row['failed'])
+    else:
+        raw = queryset.filter(login_time__gte=start)
+
+    rows = raw.annotate(day=TruncDate('login_time', tzinfo=UTC)).values('day').annotate(
+        successful=Count('id', filter=Q(is_successful=True)),
+        failed=Count('id', filter=Q(is_successful=False))
+    ).order_by('day')
+    for row in rows:
+        add(row['day'], row['successful'], row['failed'])
+    return dict(sorted(daily.items()))
+
+
+def rollup_days(first, last):
+    """重新汇总 [first, last] 内每天（UTC）的系统日志和登录日志，返回汇总的天数"""
+    start, end = day_start(first), day_start(last + datetime.timedelta(days=1))
+
+    system_rows = SystemLog.objects.filter(created_at__gte=start, created_at__lt=end).annotate(
+        day=TruncDate('created_at', tzinfo=UTC)
+    ).values('day', 'campus_id', 'action_type', 'resource_type').annotate(count=Count('id')).order_by()
+    login_rows = {
+        row['day']: row
+        for row in LoginLog.objects.filter(login_time__gte=start, login_time__lt=end).annotate(
+            day=TruncDate('login_time', tzinfo=UTC)
+        ).values('day').annotate(
+            successful=Count('id', filter=Q(is_successful=True)),
+            failed=Count('id', filter=Q(is_successful=False))
+        ).order_by()
+    }
+
+    days = (last - first).days + 1
+    with transaction.atomic():
+        SystemLogDailyStat.objects.filter(date__range=(first, last)).delete()
+        SystemLogDailyStat.objects.bulk_create([
+            SystemLogDailyStat(
+                date=row['day'],
+                campus_id=row['campus_id'],
+                action_type=row['action_type'],
+                resource_type=row['resource_type'],
+                count=row['count']
+            )
+            for row in system_rows
+        ])
+
+        LoginLogDailyStat.objects.filter(date__range=(first, last)).delete()
+        login_stats = []
+        for offset in range(days):
+            date = first + datetime.timedelta(days=offset)
+            row = login_rows.get(date, {})
+            login_stats.append(LoginLogDailyStat(
+                date=date, successful=row.get('successful', 0), failed=row.get('failed', 0)
+            ))
+        LoginLogDailyStat.objects.bulk_create(login_stats)
+    return days
@@ -1,10 +1,20 @@
-from django.test import TestCase, Client
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
 from campus.models import Campus, CampusStudent
+from . import campus_cache
+from .buffer import log_buffer
 from .models import SystemLog, LoginLog
 from .utils import log_user_action, get_client_ip, get_user_agent
 
@@ -347,6 +357,25 @@ class SystemLogAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 3)  # 所有日志
     
+    def test_cursor_pagination(self):
+        """测试传 cursor 时使用键集分页"""
+        self.client.force_authenticate(user=self.super_admin)
+        url = reverse('logs:systemlog-list')
+        
+        response = self.client.get(url, {'cursor': '', 'page_size': 2, 'count': 'exact'})
+        self.assertEqual(response.data['count'], 3)
+        self.assertTrue(response.data['has_next'])
+        descriptions = [log['description'] for log in response.data['results']]
+        
+        response = self.client.get(url, {'cursor': response.data['next_cursor'], 'page_size': 2})
+        self.assertNotIn('count', response.data)
+        self.assertFalse(response.data['has_next'])
+        descriptions += [log['description'] for log in response.data['results']]
+        self.assertEqual(descriptions, ['学员登录', '校区2管理员更新校区', '校区1管理员创建学员'])
+        
+        response = self.client.get(url, {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
     def test_campus_admin_can_only_view_own_campus_logs(self):
         """测试校区管理员只能查看自己校区的日志"""
         self.client.force_authenticate(user=self.campus_admin1)
@@ -472,6 +501,39 @@ class LoginLogAPITest(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 2)  # 校区管理员和学员的日志
+
+    def add_students(self, count, offset):
+        for index in range(offset, offset + count):
+            student = User.objects.create_user(
+                username=f'member{index}', password='testpass123',
+                phone=f'1370000{index:04d}', user_type='student'
+            )
+            CampusStudent.objects.create(campus=self.campus, student=student)
+
+    def count_list_queries(self):
+        url = reverse('logs:loginlog-list')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+
+    def test_campus_scope_query_count_independent_of_campus_size(self):
+        """校区成员数量增加时，校区管理员查询登录日志的查询次数不变"""
+        self.client.force_authenticate(user=self.campus_admin)
+        self.add_students(2, 0)
+        small = self.count_list_queries()
+        self.add_students(30, 2)
+        self.assertEqual(self.count_list_queries(), small)
+
+    def test_campus_member_ids_cached_and_invalidated(self):
+        cache.clear()
+        self.assertEqual(campus_cache.get_member_ids(self.campus.id), {self.campus_admin.id, self.student.id})
+        with self.assertNumQueries(0):
+            campus_cache.get_member_ids(self.campus.id)
+
+        CampusStudent.objects.filter(student=self.student).get().delete()
+        self.assertEqual(campus_cache.get_member_ids(self.campus.id), {self.campus_admin.id})
+        cache.clear()
     
     def test_login_statistics(self):
         """测试登录统计功能"""
@@ -484,4 +546,123 @@ class LoginLogAPITest(APITestCase):
         self.assertIn('total_logins', response.data)
         self.assertIn('successful_logins', response.data)
         self.assertIn('failed_logins', response.data)
-        self.assertIn('success_rate', response.data)
\ No newline at end of file
+        self.assertIn('success_rate', response.data)
+
+
+@override_settings(SYSTEM_LOG_BUFFER={'BATCH_SIZE': 100, 'FLUSH_INTERVAL': 3600})
+class SystemLogBufferTest(TestCase):
+    """日志缓冲写入与校区缓存测试"""
+
+    def setUp(self):
+        cache.clear()
+        log_buffer.flush()
+        self.campus = Campus.objects.create(
+            name='测试校区', code='TEST004', address='测试地址', phone='13800138030'
+        )
+        self.student = User.objects.create_user(
+            username='buffered', password='testpass123', phone='13800138031', user_type='student'
+        )
+        self.membership = CampusStudent.objects.create(campus=self.campus, student=self.student)
+        self.request = RequestFactory().post('/')
+
+    def tearDown(self):
+        log_buffer.flush()
+        cache.clear()
+
+    def log(self):
+        return log_user_action(
+            user=self.student, action_type='create', resource_type='booking',
+            description='创建预约', request=self.request, buffered=True
+        )
+
+    def test_buffered_logs_written_in_one_batch_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                self.log()
+            self.assertEqual(len(log_buffer), 0)
+        self.assertEqual(len(log_buffer), 3)
+        self.assertFalse(SystemLog.objects.exists())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(log_buffer.flush(), 3)
+        self.assertEqual(SystemLog.objects.filter(campus=self.campus).count(), 3)
+
+    def test_logs_from_another_database_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log()
+        # 模拟测试数据库销毁后在进程退出时写入：连接已指向其他数据库
+        dropped = log_buffer.dropped
+        with mock.patch('logs.buffer._database_name', return_value='other_db'):
+            self.assertEqual(log_buffer.flush(), 0)
+        self.assertEqual(log_buffer.dropped, dropped + 1)
+        self.assertEqual(len(log_buffer), 0)
+        self.assertFalse(SystemLog.objects.exists())
+
+    def test_rolled_back_logs_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            self.log()
+        self.assertEqual(len(log_buffer), 0)
+
+    def test_campus_lookup_cached_per_user(self):
+        SystemLog.build_log(user=self.student)
+        with self.assertNumQueries(0):
+            log = SystemLog.build_log(user=self.student)
+        self.assertEqual(log.campus_id, self.campus.id)
+
+        # 校区关系变化后缓存失效
+        self.membership.is_active = False
+        self.membership.save()
+        self.assertIsNone(SystemLog.build_log(user=self.student).campus_id)
+
+
+class LogStatisticsRollupTest(APITestCase):
+    """日志统计聚合与日汇总测试"""
+
+    def setUp(self):
+        self.campus = Campus.objects.create(
+            name='测试校区', code='TEST006', address='测试地址', phone='13800138040'
+        )
+        self.super_admin = User.objects.create_user(
+            username='super_admin', password='testpass123', phone='13800138041', user_type='super_admin'
+        )
+        self.student = User.objects.create_user(
+            username='student', password='testpass123', phone='13800138042', user_type='student'
+        )
+        now = timezone.now()
+        for days_ago, action_type in [(0, 'create'), (3, 'create'), (10, 'update'), (40, 'delete')]:
+            log = SystemLog.create_log(
+                user=self.student, action_type=action_type, resource_type='booking',
+                description='测试日志', campus=self.campus
+            )
+            SystemLog.objects.filter(id=log.id).update(created_at=now - timedelta(days=days_ago))
+            LoginLog.objects.create(
+                user=self.student, login_time=now - timedelta(days=days_ago),
+                is_successful=action_type != 'update'
+            )
+        self.client.force_authenticate(user=self.super_admin)
+
+    def get_statistics(self, days):
+        system = self.client.get(reverse('logs:systemlog-statistics'), {'days': days}).data
+        login = self.client.get(reverse('logs:loginlog-login-statistics'), {'days': days}).data
+        return system, login
+
+    def test_aggregated_statistics(self):
+        system, login = self.get_statistics(30)
+        self.assertEqual(system['total_count'], 3)
+        self.assertEqual(system['action_statistics'], {'创建': 2, '更新': 1})
+        self.assertEqual(system['resource_statistics'], {'预约': 3})
+        self.assertEqual(login['total_logins'], 3)
+        self.assertEqual(login['failed_logins'], 1)
+        self.assertEqual(sum(day['successful'] for day in login['daily_statistics'].values()), 2)
+
+    def test_rollup_matches_raw_statistics(self):
+        with override_settings(LOG_STATISTICS={'ROLLUP_MIN_DAYS': 1000}):
+            expected = self.get_statistics(60)
+
+        call_command('rollup_log_statistics', days=60, stdout=StringIO())
+        self.assertEqual(self.get_statistics(60), expected)
+
+        # 汇总过的日期不再读取原始日志
+        SystemLog.objects.filter(created_at__lt=timezone.now() - timedelta(days=5)).delete()
+        LoginLog.objects.filter(login_time__lt=timezone.now() - timedelta(days=5)).delete()
+        self.assertEqual(self.get_statistics(60), expected)
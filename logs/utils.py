@@ -24,8 +24,11 @@ def get_user_agent(request):
 
 def log_user_action(user, action_type, resource_type, resource_id=None, 
                    resource_name=None, description='', request=None, 
-                   extra_data=None, campus=None):
-    """记录用户操作日志"""
+                   extra_data=None, campus=None, buffered=False):
+    """
+    记录用户操作日志
+    buffered=True 时通过 logs.buffer 批量异步写入，返回未保存的日志对象
+    """
     ip_address = None
     user_agent = None
     
@@ -33,7 +36,7 @@ def log_user_action(user, action_type, resource_type, resource_id=None,
         ip_address = get_client_ip(request)
         user_agent = get_user_agent(request)
     
-    return SystemLog.create_log(
+    fields = dict(
         user=user,
         action_type=action_type,
         resource_type=resource_type,
@@ -45,6 +48,27 @@ def log_user_action(user, action_type, resource_type, resource_id=None,
         extra_data=extra_data,
         campus=campus
     )
+    if buffered:
+        from .buffer import enqueue_log
+
+        log = SystemLog.build_log(**fields)
+        enqueue_log(log)
+        return log
+    return SystemLog.create_log(**fields)
+
+
+def log_user_actions(user, actions, request=None):
+    """
+    批量记录同一用户的多条操作日志，一次 bulk_create。
+    actions 为 dict 列表，键与 log_user_action 的 action_type、resource_type 等参数相同
+    """
+    ip_address = get_client_ip(request) if request else None
+    user_agent = get_user_agent(request) if request else None
+    logs = [
+        SystemLog.build_log(user=user, ip_address=ip_address, user_agent=user_agent, **action)
+        for action in actions
+    ]
+    return SystemLog.objects.bulk_create(logs)
 
 
 @receiver(user_logged_in)
@@ -5,20 +5,26 @@ from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q
 from django.utils import timezone
 from datetime import timedelta
+from keshe.pagination import CreatedAtCursorPagination
+from search.filters import IndexedSearchFilter
 from .models import SystemLog, LoginLog
 from .serializers import SystemLogSerializer, LoginLogSerializer
 from .permissions import LogViewPermission
+from . import campus_cache, statistics
 
 
 class SystemLogViewSet(viewsets.ReadOnlyModelViewSet):
     """系统日志视图集"""
     serializer_class = SystemLogSerializer
     permission_classes = [permissions.IsAuthenticated, LogViewPermission]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, IndexedSearchFilter, filters.OrderingFilter]
     filterset_fields = ['action_type', 'resource_type', 'user', 'campus']
     search_fields = ['description', 'resource_name', 'user__username', 'user__real_name']
+    search_sources = [('system_log', 'pk'), ('user', 'user')]
     ordering_fields = ['created_at', 'action_type', 'resource_type']
     ordering = ['-created_at']
+    # 传 cursor 时按 (created_at, id) 倒序键集分页（忽略 ordering 参数）
+    pagination_class = CreatedAtCursorPagination
     
     def get_queryset(self):
         """根据用户权限过滤日志"""
@@ -46,22 +52,22 @@ class SystemLogViewSet(viewsets.ReadOnlyModelViewSet):
         
         # 时间范围过滤
         days = int(request.query_params.get('days', 7))
-        start_date = timezone.now() - timedelta(days=days)
-        queryset = queryset.filter(created_at__gte=start_date)
+        now = timezone.now()
+        start_date = now - timedelta(days=days)
         
-        # 统计数据
-        total_count = queryset.count()
-        action_stats = {}
-        resource_stats = {}
+        # 日汇总表按校区汇总，只有超级管理员和校区管理员的查询范围与之一致
+        user = request.user
+        use_rollup = statistics.should_use_rollup(days) and (user.is_super_admin or user.is_campus_admin)
+        campus_ids = None
+        if user.is_campus_admin and not user.is_super_admin:
+            campus_ids = list(user.managed_campus.values_list('id', flat=True))
         
-        for log in queryset:
-            # 操作类型统计
-            action_display = log.get_action_type_display()
-            action_stats[action_display] = action_stats.get(action_display, 0) + 1
-            
-            # 资源类型统计
-            resource_display = log.get_resource_type_display()
-            resource_stats[resource_display] = resource_stats.get(resource_display, 0) + 1
+        # 按 (操作类型, 资源类型) 分组计数
+        counts = statistics.system_log_counts(
+            queryset, start_date, now, campus_ids=campus_ids, use_rollup=use_rollup
+        )
+        total_count = sum(counts.values())
+        action_stats, resource_stats = statistics.system_log_statistics(counts)
         
         return Response({
             'total_count': total_count,
@@ -100,25 +106,8 @@ class LoginLogViewSet(viewsets.ReadOnlyModelViewSet):
             # 超级管理员可以查看所有登录日志
             return queryset
         elif user.is_campus_admin:
-            # 校区管理员只能查看自己管理的校区用户的登录日志
-            managed_campuses = user.managed_campus.all()
-            if managed_campuses.exists():
-                # 获取这些校区的所有用户
-                campus_users = []
-                for campus in managed_campuses:
-                    # 获取校区的学员
-                    students = [cs.student for cs in campus.students.filter(is_active=True)]
-                    # 获取校区的教练
-                    coaches = [cc.coach for cc in campus.coaches.filter(is_active=True)]
-                    # 获取校区管理员
-                    if campus.manager:
-                        campus_users.append(campus.manager)
-                    campus_users.extend(students)
-                    campus_users.extend(coaches)
-                
-                return queryset.filter(user__in=campus_users)
-            else:
-                return queryset.none()
+            # 校区管理员只能查看自己管理的校区用户的登录日志（学员、教练和校区管理员）
+            return queryset.filter(campus_cache.members_filter(user))
         else:
             # 其他用户只能查看自己的登录日志
             return queryset.filter(user=user)
@@ -130,24 +119,16 @@ class LoginLogViewSet(viewsets.ReadOnlyModelViewSet):
         
         # 时间范围过滤
         days = int(request.query_params.get('days', 7))
-        start_date = timezone.now() - timedelta(days=days)
-        queryset = queryset.filter(login_time__gte=start_date)
+        now = timezone.now()
+        start_date = now - timedelta(days=days)
         
-        total_logins = queryset.count()
-        successful_logins = queryset.filter(is_successful=True).count()
-        failed_logins = queryset.filter(is_successful=False).count()
+        # 按日期分组统计成功/失败次数；登录日汇总表不区分校区，只用于超级管理员
+        use_rollup = statistics.should_use_rollup(days) and request.user.is_super_admin
+        daily_stats = statistics.login_daily_counts(queryset, start_date, now, use_rollup=use_rollup)
         
-        # 按日期统计
-        daily_stats = {}
-        for log in queryset:
-            date_key = log.login_time.strftime('%Y-%m-%d')
-            if date_key not in daily_stats:
-                daily_stats[date_key] = {'successful': 0, 'failed': 0}
-            
-            if log.is_successful:
-                daily_stats[date_key]['successful'] += 1
-            else:
-                daily_stats[date_key]['failed'] += 1
+        successful_logins = sum(item['successful'] for item in daily_stats.values())
+        failed_logins = sum(item['failed'] for item in daily_stats.values())
+        total_logins = successful_logins + failed_logins
         
         return Response({
             'total_logins': total_logins,
@@ -0,0 +1,149 @@
+"""
+用户消息计数缓存
+
+每个用户的总数、未读数和各类型消息数分别存为一个缓存键，
+在消息创建、标记已读、删除时通过 cache.incr 增量更新（事务提交后执行）。
+缓存缺失时用一次分组聚合查询重建全部计数。
+计数更新后同时通过 pubsub 向该用户的实时连接推送新消息和未读数。
+
+并发重建与增量更新之间可能产生少量偏差，计数键设置了过期时间，过期后自动按数据库重建。
+多进程部署需配置共享缓存（如 Redis），否则各进程的计数独立维护。
+"""
+import logging
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+from . import pubsub
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+COUNTER_NAMES = ['total', 'unread'] + [message_type for message_type, _ in Notification.MESSAGE_TYPES]
+CACHE_TIMEOUT = 600
+
+COUNTER_CACHE_KEY = 'notifications:counters:{user_id}:{name}'
+
+
+def _key(user_id, name):
+    return COUNTER_CACHE_KEY.format(user_id=user_id, name=name)
+
+
+def get_stats(user_id):
+    """获取用户的消息统计，缓存不完整时重建"""
+    keys = {name: _key(user_id, name) for name in COUNTER_NAMES}
+    cached = cache.get_many(list(keys.values()))
+    if len(cached) == len(keys):
+        return {name: cached[key] for name, key in keys.items()}
+    return rebuild(user_id)
+
+
+def get_unread_count(user_id):
+    value = cache.get(_key(user_id, 'unread'))
+    if value is None:
+        return rebuild(user_id)['unread']
+    return value
+
+
+def rebuild(user_id):
+    """用一次分组聚合查询重建用户的全部计数"""
+    rows = Notification.objects.filter(recipient_id=user_id).values('message_type').annotate(
+        total=Count('id'),
+        unread=Count('id', filter=Q(is_read=False))
+    ).order_by()
+
+    stats = dict.fromkeys(COUNTER_NAMES, 0)
+    for row in rows:
+        stats['total'] += row['total']
+        stats['unread'] += row['unread']
+        if row['message_type'] in stats:
+            stats[row['message_type']] += row['total']
+
+    cache.set_many({_key(user_id, name): value for name, value in stats.items()}, CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate(user_id):
+    cache.delete_many([_key(user_id, name) for name in COUNTER_NAMES])
+
+
+def _adjust(user_id, deltas):
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        try:
+            cache.incr(_key(user_id, name), delta)
+        except ValueError:
+            # 计数不完整，整体失效后由下次读取重建
+            invalidate(user_id)
+            return
+
+
+def _adjust_on_commit(changes, events=()):
+    """
+    changes: {user_id: {counter_name: delta}}，events: [(user_id, event_type, data)]，
+    事务提交后应用计数变化并推送事件
+    """
+    changes = {user_id: dict(deltas) for user_id, deltas in changes.items()}
+    events = list(events)
+
+    def apply():
+        for user_id, deltas in changes.items():
+            _adjust(user_id, deltas)
+        _publish(changes, events)
+
+    transaction.on_commit(apply)
+
+
+def _publish(changes, events):
+    # 推送失败不影响业务，客户端可回退到轮询
+    try:
+        for user_id, event_type, data in events:
+            pubsub.publish(user_id, event_type, data)
+        for user_id, deltas in changes.items():
+            if deltas.get('unread') and pubsub.has_subscribers(user_id):
+                pubsub.publish(user_id, 'unread_count', {'count': get_unread_count(user_id)})
+    except Exception as e:
+        logger.warning(f"Publish notification events failed: {e}")
+
+
+def _summary(notification):
+    return {
+        'id': notification.id,
+        'title': notification.title,
+        'message': notification.message,
+        'message_type': notification.message_type,
+        'data': notification.data,
+        'created_at': notification.created_at.isoformat() if notification.created_at else None,
+    }
+
+
+def notifications_created(notifications):
+    changes = defaultdict(lambda: defaultdict(int))
+    events = []
+    for notification in notifications:
+        events.append((notification.recipient_id, 'notification', _summary(notification)))
+        deltas = changes[notification.recipient_id]
+        deltas['total'] += 1
+        deltas[notification.message_type] += 1
+        if not notification.is_read:
+            deltas['unread'] += 1
+    _adjust_on_commit(changes, events)
+
+
+def notifications_deleted(notifications):
+    changes = defaultdict(lambda: defaultdict(int))
+    for notification in notifications:
+        deltas = changes[notification.recipient_id]
+        deltas['total'] -= 1
+        deltas[notification.message_type] -= 1
+        if not notification.is_read:
+            deltas['unread'] -= 1
+    _adjust_on_commit(changes)
+
+
+def notifications_read(user_id, count):
+    if count:
+        _adjust_on_commit({user_id: {'unread': -count}})
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from notifications.outbox import dispatch_all, requeue_dead
+
+
+class Command(BaseCommand):
+    help = '投递通知发件箱中的待投递通知'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='常驻运行，按间隔持续投递'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='常驻运行时的轮询间隔（秒，默认2秒）'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='每批投递数量（默认使用 NOTIFICATION_OUTBOX 配置）'
+        )
+        parser.add_argument(
+            '--requeue-dead',
+            action='store_true',
+            help='投递前将死信重新放回队列'
+        )
+
+    def handle(self, *args, **options):
+        if options['requeue_dead']:
+            count = requeue_dead()
+            self.stdout.write(f'已将 {count} 条死信重新放回队列')
+
+        if not options['loop']:
+            self.report(dispatch_all(options['batch_size']))
+            return
+
+        self.stdout.write(f'开始投递通知，轮询间隔 {options["interval"]} 秒，按 Ctrl+C 停止')
+        try:
+            while True:
+                close_old_connections()
+                stats = dispatch_all(options['batch_size'])
+                if any(stats.values()):
+                    self.report(stats)
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('已停止投递')
+
+    def report(self, stats):
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'投递完成：成功 {stats["delivered"]} 条，待重试 {stats["retried"]} 条，死信 {stats["dead"]} 条'
+            )
+        )
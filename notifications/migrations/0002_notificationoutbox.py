@@ -0,0 +1,42 @@
+# Generated by Django 4.2.24 on 2026-10-18 09:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200, verbose_name='消息标题')),
+                ('message', models.TextField(verbose_name='消息内容')),
+                ('message_type', models.CharField(choices=[('system', '系统消息'), ('booking', '预约消息'), ('payment', '支付消息'), ('competition', '比赛消息'), ('evaluation', '评价消息')], default='system', max_length=20, verbose_name='消息类型')),
+                ('data', models.JSONField(blank=True, null=True, verbose_name='附加数据')),
+                ('status', models.CharField(choices=[('pending', '待投递'), ('delivered', '已投递'), ('dead', '投递失败')], default='pending', max_length=20, verbose_name='投递状态')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='尝试次数')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='最近错误')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='可投递时间')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='创建时间')),
+                ('delivered_at', models.DateTimeField(blank=True, null=True, verbose_name='投递时间')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox_notifications', to=settings.AUTH_USER_MODEL, verbose_name='接收人')),
+                ('sender', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='发送人')),
+            ],
+            options={
+                'verbose_name': '通知发件箱',
+                'verbose_name_plural': '通知发件箱',
+                'db_table': 'notifications_outbox',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='notificatio_status_9b3b3f_idx')],
+            },
+        ),
+    ]
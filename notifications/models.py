@@ -50,6 +50,8 @@ class Notification(models.Model):
             models.Index(fields=['recipient', 'is_read']),
             models.Index(fields=['message_type']),
             models.Index(fields=['created_at']),
+            # 键集分页
+            models.Index(fields=['recipient', 'created_at', 'id']),
         ]
     
     def __str__(self):
@@ -58,9 +60,16 @@ class Notification(models.Model):
     def mark_as_read(self):
         """标记为已读"""
         if not self.is_read:
+            from . import counters
+            read_at = timezone.now()
+            # 条件更新，并发标记时只计一次
+            updated = Notification.objects.filter(pk=self.pk, is_read=False).update(
+                is_read=True,
+                read_at=read_at
+            )
             self.is_read = True
-            self.read_at = timezone.now()
-            self.save(update_fields=['is_read', 'read_at'])
+            self.read_at = read_at
+            counters.notifications_read(self.recipient_id, updated)
     
     @classmethod
     def create_notification(cls, recipient, title, message, message_type='system', sender=None, data=None):
@@ -74,6 +83,32 @@ class Notification(models.Model):
             data=data
         )
     
+    @classmethod
+    def enqueue_notification(cls, recipient, title, message, message_type='system', sender=None, data=None):
+        """将通知写入发件箱，事务提交后异步投递"""
+        from .outbox import enqueue
+        return enqueue(
+            recipient=recipient,
+            title=title,
+            message=message,
+            message_type=message_type,
+            sender=sender,
+            data=data
+        )
+    
+    @classmethod
+    def enqueue_notifications(cls, recipients, title, message, message_type='system', sender=None, data=None):
+        """批量将同一条通知写入多个接收人的发件箱"""
+        from .outbox import enqueue_many
+        return enqueue_many(
+            recipients=recipients,
+            title=title,
+            message=message,
+            message_type=message_type,
+            sender=sender,
+            data=data
+        )
+    
     @classmethod
     def create_system_notification(cls, recipient, title, message, data=None):
         """创建系统通知"""
@@ -111,19 +146,79 @@ class Notification(models.Model):
     
     @classmethod
     def get_unread_count(cls, user):
-        """获取用户未读消息数量"""
-        return cls.objects.filter(recipient=user, is_read=False).count()
+        """获取用户未读消息数量（读取计数缓存）"""
+        from . import counters
+        return counters.get_unread_count(user.id)
     
     @classmethod
     def get_stats(cls, user):
-        """获取用户消息统计"""
-        queryset = cls.objects.filter(recipient=user)
-        return {
-            'total': queryset.count(),
-            'unread': queryset.filter(is_read=False).count(),
-            'system': queryset.filter(message_type='system').count(),
-            'booking': queryset.filter(message_type='booking').count(),
-            'payment': queryset.filter(message_type='payment').count(),
-            'competition': queryset.filter(message_type='competition').count(),
-            'evaluation': queryset.filter(message_type='evaluation').count(),
-        }
+        """获取用户消息统计（读取计数缓存，缺失时一次分组查询重建）"""
+        from . import counters
+        return counters.get_stats(user.id)
+
+
+class NotificationOutbox(models.Model):
+    """通知发件箱：业务请求只写入发件箱，由后台任务批量投递为 Notification"""
+    STATUS_CHOICES = [
+        ('pending', '待投递'),
+        ('delivered', '已投递'),
+        ('dead', '投递失败'),
+    ]
+    
+    recipient = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='outbox_notifications',
+        verbose_name='接收人'
+    )
+    sender = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='发送人'
+    )
+    title = models.CharField(max_length=200, verbose_name='消息标题')
+    message = models.TextField(verbose_name='消息内容')
+    message_type = models.CharField(
+        max_length=20,
+        choices=Notification.MESSAGE_TYPES,
+        default='system',
+        verbose_name='消息类型'
+    )
+    data = models.JSONField(null=True, blank=True, verbose_name='附加数据')
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name='投递状态'
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name='尝试次数')
+    last_error = models.TextField(blank=True, default='', verbose_name='最近错误')
+    available_at = models.DateTimeField(default=timezone.now, verbose_name='可投递时间')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='创建时间')
+    delivered_at = models.DateTimeField(null=True, blank=True, verbose_name='投递时间')
+    
+    class Meta:
+        db_table = 'notifications_outbox'
+        verbose_name = '通知发件箱'
+        verbose_name_plural = '通知发件箱'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.title} -> {self.recipient_id} ({self.get_status_display()})'
+    
+    def to_notification(self):
+        return Notification(
+            recipient_id=self.recipient_id,
+            sender_id=self.sender_id,
+            title=self.title,
+            message=self.message,
+            message_type=self.message_type,
+            data=self.data,
+            created_at=self.created_at
+        )
@@ -0,0 +1,211 @@
+"""
+通知发件箱
+
+业务代码在事务内调用 enqueue / enqueue_many / enqueue_batch 写入 NotificationOutbox，
+事务提交后由进程内的后台线程批量投递（bulk_create 为 Notification），
+也可以通过 dispatch_notifications 管理命令常驻投递。
+
+投递失败的消息按指数退避重试，超过最大次数后标记为 dead（死信），
+可通过 requeue_dead 重新放回队列。
+
+配置（settings.NOTIFICATION_OUTBOX，均可省略）：
+    AUTO_DISPATCH        事务提交后是否自动在后台线程投递，默认 True
+    BATCH_SIZE           每批投递数量，默认 200
+    MAX_ATTEMPTS         最大尝试次数，默认 5
+    RETRY_DELAY_SECONDS  首次重试延迟（秒），之后按 2 的幂递增，默认 30
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import counters
+from .models import Notification, NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'AUTO_DISPATCH': True,
+    'BATCH_SIZE': 200,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY_SECONDS': 30,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'NOTIFICATION_OUTBOX', {}).get(name, DEFAULTS[name])
+
+
+def _pk(value):
+    return getattr(value, 'pk', value)
+
+
+def enqueue(recipient, title, message, message_type='system', sender=None, data=None):
+    """写入一条待投递通知"""
+    entry = NotificationOutbox.objects.create(
+        recipient_id=_pk(recipient),
+        sender_id=_pk(sender),
+        title=title,
+        message=message,
+        message_type=message_type,
+        data=data
+    )
+    _schedule_dispatch()
+    return entry
+
+
+def enqueue_many(recipients, title, message, message_type='system', sender=None, data=None):
+    """为多个接收人写入同一条通知，recipients 可以是用户对象或用户ID"""
+    entries = NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(
+            recipient_id=_pk(recipient),
+            sender_id=_pk(sender),
+            title=title,
+            message=message,
+            message_type=message_type,
+            data=data
+        )
+        for recipient in recipients
+    ])
+    if entries:
+        _schedule_dispatch()
+    return entries
+
+
+def enqueue_batch(items):
+    """
+    批量写入内容各不相同的通知，一次 bulk_create。
+    items 为 dict 列表，键与 enqueue 的参数相同。
+    """
+    entries = NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(
+            recipient_id=_pk(item['recipient']),
+            sender_id=_pk(item.get('sender')),
+            title=item['title'],
+            message=item['message'],
+            message_type=item.get('message_type', 'system'),
+            data=item.get('data')
+        )
+        for item in items
+    ])
+    if entries:
+        _schedule_dispatch()
+    return entries
+
+
+# ---------- 投递 ----------
+
+def dispatch_pending(batch_size=None):
+    """
+    投递一批到期的待投递通知，返回统计信息 {'delivered': n, 'retried': n, 'dead': n}。
+    支持 SKIP LOCKED 的数据库上多个投递进程可以并行工作；不支持时（如 MySQL 5.7）用普通的
+    SELECT ... FOR UPDATE，其他投递进程等待本批提交后再读取，不会重复投递。
+    SQLite 不支持行锁，由数据库级的写锁保证同一时刻只有一个事务写入。
+    """
+    batch_size = batch_size or get_setting('BATCH_SIZE')
+    stats = {'delivered': 0, 'retried': 0, 'dead': 0}
+    now = timezone.now()
+
+    with transaction.atomic():
+        queryset = NotificationOutbox.objects.filter(
+            status='pending', available_at__lte=now
+        ).order_by('id')
+        queryset = queryset.select_for_update(
+            skip_locked=connection.features.has_select_for_update_skip_locked
+        )
+        entries = list(queryset[:batch_size])
+        if not entries:
+            return stats
+
+        delivered = []
+        try:
+            with transaction.atomic():
+                created = Notification.objects.bulk_create([entry.to_notification() for entry in entries])
+            counters.notifications_created(created)
+            delivered = entries
+        except Exception as e:
+            # 整批失败时逐条投递，找出有问题的消息
+            logger.warning(f"Bulk notification delivery failed, retrying one by one: {e}")
+            for entry in entries:
+                try:
+                    with transaction.atomic():
+                        entry.to_notification().save()
+                    delivered.append(entry)
+                except Exception as entry_error:
+                    stats[_mark_failed(entry, entry_error, now)] += 1
+
+        if delivered:
+            NotificationOutbox.objects.filter(
+                id__in=[entry.id for entry in delivered]
+            ).update(status='delivered', delivered_at=now, attempts=F('attempts') + 1)
+            stats['delivered'] = len(delivered)
+    return stats
+
+
+def _mark_failed(entry, error, now):
+    entry.attempts += 1
+    entry.last_error = str(error)[:2000]
+    if entry.attempts >= get_setting('MAX_ATTEMPTS'):
+        entry.status = 'dead'
+        result = 'dead'
+        logger.error(f"Notification outbox entry {entry.id} moved to dead letter: {error}")
+    else:
+        delay = get_setting('RETRY_DELAY_SECONDS') * (2 ** (entry.attempts - 1))
+        entry.available_at = now + timedelta(seconds=delay)
+        result = 'retried'
+    entry.save(update_fields=['attempts', 'last_error', 'status', 'available_at'])
+    return result
+
+
+def dispatch_all(batch_size=None):
+    """循环投递直到没有到期的待投递通知"""
+    totals = {'delivered': 0, 'retried': 0, 'dead': 0}
+    while True:
+        stats = dispatch_pending(batch_size)
+        for key, value in stats.items():
+            totals[key] += value
+        if not any(stats.values()):
+            return totals
+
+
+def requeue_dead(ids=None):
+    """将死信重新放回待投递队列"""
+    queryset = NotificationOutbox.objects.filter(status='dead')
+    if ids:
+        queryset = queryset.filter(id__in=ids)
+    return queryset.update(status='pending', attempts=0, available_at=timezone.now())
+
+
+# ---------- 进程内后台投递 ----------
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notification-outbox')
+_scheduled = threading.Event()
+
+
+def _schedule_dispatch():
+    """事务提交后触发一次后台投递；已有待执行的投递任务时不重复提交"""
+    if not get_setting('AUTO_DISPATCH'):
+        return
+    transaction.on_commit(_submit)
+
+
+def _submit():
+    if _scheduled.is_set():
+        return
+    _scheduled.set()
+    _executor.submit(_run)
+
+
+def _run():
+    _scheduled.clear()
+    try:
+        dispatch_all()
+    except Exception as e:
+        logger.error(f"Background notification dispatch failed: {e}")
+    finally:
+        connection.close()
@@ -0,0 +1,213 @@
+"""
+通知实时推送的进程内发布/订阅
+
+SSE 连接按用户订阅事件，消息计数变化时（事务提交后）向对应用户发布事件：
+    notification    有新消息，data 为消息摘要
+    unread_count    未读数变化，data 为 {'count': n}
+
+后端可插拔（settings.NOTIFICATION_STREAM['BACKEND']）：
+    notifications.pubsub.InMemoryBackend  默认，只在当前进程内分发，适用于单进程部署
+    notifications.pubsub.RedisBackend     通过 Redis 频道在多个进程之间转发
+
+配置（settings.NOTIFICATION_STREAM，均可省略）：
+    BACKEND            后端类路径
+    OPTIONS            传给后端构造函数的参数（RedisBackend 需要 url）
+    QUEUE_SIZE         每个连接的待发送事件上限，超出时丢弃最旧的事件，默认 100
+    HEARTBEAT_SECONDS  心跳间隔（秒），默认 15
+    MAX_DURATION_SECONDS  单个连接的最长保持时间（秒），到期后由客户端自动重连，默认 300
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'notifications.pubsub.InMemoryBackend',
+    'OPTIONS': {},
+    'QUEUE_SIZE': 100,
+    'HEARTBEAT_SECONDS': 15,
+    'MAX_DURATION_SECONDS': 300,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'NOTIFICATION_STREAM', {}).get(name, DEFAULTS[name])
+
+
+class Subscription:
+    """一个 SSE 连接的订阅，事件可以从任意线程投递到连接所在的事件循环"""
+
+    def __init__(self, backend, user_id, maxsize):
+        self.backend = backend
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def put(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # 事件循环已关闭，连接已经断开
+            self.close()
+
+    def _put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        """等待下一个事件，超时返回 None"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.backend.unsubscribe(self)
+
+
+class BaseBackend:
+    """后端基类：维护本进程内的订阅，子类实现 publish"""
+
+    def __init__(self, **options):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """在事件循环中调用，返回 Subscription"""
+        subscription = Subscription(self, user_id, get_setting('QUEUE_SIZE'))
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+
+    def has_subscribers(self, user_id):
+        """是否可能有连接订阅了该用户，用于跳过无人接收的事件"""
+        return user_id in self._subscribers
+
+    def deliver(self, user_id, event):
+        """投递给本进程内该用户的所有连接"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def publish(self, user_id, event):
+        raise NotImplementedError
+
+
+class InMemoryBackend(BaseBackend):
+    """进程内后端"""
+
+    def publish(self, user_id, event):
+        self.deliver(user_id, event)
+
+
+class RedisBackend(BaseBackend):
+    """
+    Redis 后端：事件发布到 {prefix}:{user_id} 频道，
+    每个进程在第一次有连接订阅时启动一个监听线程，把收到的事件转发给本进程内的连接。
+    """
+
+    def __init__(self, url=None, prefix='notifications:stream', **options):
+        super().__init__(**options)
+        import redis
+
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url or getattr(settings, 'REDIS_URL', None) or 'redis://127.0.0.1:6379/0')
+        self._listener = None
+
+    def subscribe(self, user_id):
+        self._ensure_listener()
+        return super().subscribe(user_id)
+
+    def has_subscribers(self, user_id):
+        # 其他进程上的连接无法从本地得知
+        return True
+
+    def publish(self, user_id, event):
+        try:
+            self.client.publish(f'{self.prefix}:{user_id}', json.dumps(event))
+        except Exception as e:
+            logger.warning(f"Publish notification event failed: {e}")
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(
+                target=self._listen, name='notification-stream-listener', daemon=True
+            )
+            self._listener.start()
+
+    def _listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(f'{self.prefix}:*')
+        try:
+            for message in pubsub.listen():
+                channel = message['channel']
+                if isinstance(channel, bytes):
+                    channel = channel.decode()
+                try:
+                    user_id = int(channel.rsplit(':', 1)[1])
+                    event = json.loads(message['data'])
+                except (ValueError, IndexError):
+                    continue
+                self.deliver(user_id, event)
+        except Exception as e:
+            logger.error(f"Notification stream listener stopped: {e}")
+        finally:
+            pubsub.close()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend_class = import_string(get_setting('BACKEND'))
+                _broker = backend_class(**get_setting('OPTIONS'))
+    return _broker
+
+
+@receiver(setting_changed)
+def _reset_broker(setting, **kwargs):
+    global _broker
+    if setting == 'NOTIFICATION_STREAM':
+        _broker = None
+
+
+def publish(user_id, event_type, data):
+    """向用户发布一个事件；没有连接订阅时直接跳过"""
+    broker = get_broker()
+    if broker.has_subscribers(user_id):
+        broker.publish(user_id, {'event': event_type, 'data': data})
+
+
+def has_subscribers(user_id):
+    return get_broker().has_subscribers(user_id)
+
+
+def format_event(event):
+    """编码为 SSE 文本帧"""
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
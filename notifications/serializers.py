@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import Notification
+from . import counters
 
 
 class NotificationSerializer(serializers.ModelSerializer):
@@ -100,4 +101,6 @@ class BulkNotificationSerializer(serializers.Serializer):
             )
             notifications.append(notification)
         
-        return Notification.objects.bulk_create(notifications)
\ No newline at end of file
+        created = Notification.objects.bulk_create(notifications)
+        counters.notifications_created(created)
+        return created
\ No newline at end of file
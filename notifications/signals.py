@@ -0,0 +1,18 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import counters
+from .models import Notification
+
+
+@receiver(post_save, sender=Notification)
+def update_counters_on_create(sender, instance, created, **kwargs):
+    """新建消息后更新接收人的消息计数"""
+    if created:
+        counters.notifications_created([instance])
+
+
+@receiver(post_delete, sender=Notification)
+def update_counters_on_delete(sender, instance, **kwargs):
+    """删除消息后更新接收人的消息计数"""
+    counters.notifications_deleted([instance])
@@ -1,3 +1,276 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .models import Notification, NotificationOutbox
+from .outbox import dispatch_all, requeue_dead
+from . import counters, pubsub
+
+User = get_user_model()
+
+
+@override_settings(NOTIFICATION_OUTBOX={'AUTO_DISPATCH': False, 'MAX_ATTEMPTS': 2, 'RETRY_DELAY_SECONDS': 0})
+class NotificationOutboxTest(TestCase):
+    """通知发件箱测试"""
+
+    def setUp(self):
+        self.sender = User.objects.create_user(
+            username='coach', password='testpass123', phone='13800138001', user_type='coach'
+        )
+        self.recipients = [
+            User.objects.create_user(
+                username=f'student{index}', password='testpass123',
+                phone=f'1390000000{index}', user_type='student'
+            )
+            for index in range(3)
+        ]
+
+    def test_enqueue_then_dispatch(self):
+        """写入发件箱时不创建通知，投递后批量创建"""
+        Notification.enqueue_notification(
+            recipient=self.recipients[0], sender=self.sender,
+            title='预约已确认', message='您的预约已确认', message_type='booking',
+            data={'booking_id': 1}
+        )
+        Notification.enqueue_notifications(
+            recipients=[user.id for user in self.recipients[1:]],
+            title='系统通知', message='系统维护'
+        )
+        self.assertEqual(Notification.objects.count(), 0)
+
+        stats = dispatch_all()
+        self.assertEqual(stats, {'delivered': 3, 'retried': 0, 'dead': 0})
+        self.assertEqual(Notification.objects.count(), 3)
+        notification = Notification.objects.get(recipient=self.recipients[0])
+        self.assertEqual(notification.sender, self.sender)
+        self.assertEqual(notification.data, {'booking_id': 1})
+        self.assertFalse(NotificationOutbox.objects.filter(status='pending').exists())
+
+        # 已投递的消息不会重复投递
+        self.assertEqual(dispatch_all()['delivered'], 0)
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_failed_delivery_retries_then_dead_letters(self):
+        Notification.enqueue_notification(recipient=self.recipients[0], title='提醒', message='内容')
+
+        with mock.patch.object(Notification, 'save', side_effect=RuntimeError('boom')), \
+                mock.patch.object(Notification.objects, 'bulk_create', side_effect=RuntimeError('boom')):
+            self.assertEqual(dispatch_all(), {'delivered': 0, 'retried': 1, 'dead': 1})
+
+        entry = NotificationOutbox.objects.get()
+        self.assertEqual(entry.status, 'dead')
+        self.assertEqual(entry.attempts, 2)
+        self.assertIn('boom', entry.last_error)
+
+        self.assertEqual(requeue_dead(), 1)
+        self.assertEqual(dispatch_all()['delivered'], 1)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_on_commit_dispatch(self):
+        """开启自动投递时，事务提交后在后台投递"""
+        with override_settings(NOTIFICATION_OUTBOX={'AUTO_DISPATCH': True}), \
+                mock.patch('notifications.outbox._submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.enqueue_notification(recipient=self.recipients[0], title='提醒', message='内容')
+        submit.assert_called_once()
+
+
+class NotificationCounterTest(TestCase):
+    """消息计数缓存测试"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='student', password='testpass123', phone='13800138002', user_type='student'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def create(self, message_type='system', is_read=False):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(
+                recipient=self.user, title='标题', message='内容',
+                message_type=message_type, is_read=is_read
+            )
+
+    def assert_counters_match_database(self):
+        cached = counters.get_stats(self.user.id)
+        self.assertEqual(cached, counters.rebuild(self.user.id))
+        return cached
+
+    def test_rebuild_with_single_query(self):
+        self.create('booking')
+        self.create('payment', is_read=True)
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            stats = Notification.get_stats(self.user)
+        self.assertEqual(stats['total'], 2)
+        self.assertEqual(stats['unread'], 1)
+        self.assertEqual(stats['booking'], 1)
+        self.assertEqual(stats['payment'], 1)
+        self.assertEqual(stats['system'], 0)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(Notification.get_unread_count(self.user), 1)
+
+    def test_counters_follow_writes(self):
+        Notification.get_stats(self.user)
+        first = self.create('booking')
+        self.create('booking')
+        third = self.create('system')
+        with self.assertNumQueries(0):
+            self.assertEqual(Notification.get_stats(self.user)['booking'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.mark_as_read()
+            first.mark_as_read()
+        self.assertEqual(self.assert_counters_match_database()['unread'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/notifications/{third.id}/delete/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.assert_counters_match_database()['total'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/notifications/mark-all-read/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.assert_counters_match_database()['unread'], 0)
+
+        response = self.client.get('/api/notifications/unread-count/')
+        self.assertEqual(response.data['count'], 0)
+
+
+@override_settings(NOTIFICATION_STREAM={'BACKEND': 'notifications.pubsub.InMemoryBackend', 'HEARTBEAT_SECONDS': 1})
+class NotificationCursorPaginationTest(TestCase):
+    """消息列表键集分页测试"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='student', password='testpass123', phone='13800138004', user_type='student'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        # 多条消息的创建时间相同，按 id 区分先后
+        created_at = timezone.now()
+        Notification.objects.bulk_create([
+            Notification(
+                recipient=self.user, title=f'消息{index}', message='内容',
+                created_at=created_at - timedelta(minutes=index // 3)
+            )
+            for index in range(12)
+        ])
+
+    def test_pages_follow_created_at_and_id(self):
+        expected = list(Notification.objects.filter(recipient=self.user).order_by(
+            '-created_at', '-id'
+        ).values_list('id', flat=True))
+        ids = []
+        cursor = ''
+        while cursor is not None:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get('/api/notifications/list/', {'cursor': cursor, 'page_size': 5})
+            self.assertFalse(any('COUNT(' in query['sql'] for query in context.captured_queries))
+            self.assertNotIn('count', response.data)
+            ids += [item['id'] for item in response.data['results']]
+            cursor = response.data['next_cursor']
+        self.assertEqual(ids, expected)
+
+    def test_estimated_count_and_invalid_cursor(self):
+        response = self.client.get('/api/notifications/list/', {'cursor': '', 'count': 'estimate'})
+        self.assertEqual(response.data['count'], 12)
+        self.assertTrue(response.data['count_exact'])
+
+        with mock.patch('keshe.pagination.ESTIMATE_LIMIT', 10):
+            response = self.client.get('/api/notifications/list/', {'cursor': '', 'count': 'estimate'})
+        self.assertEqual(response.data['count'], 10)
+        self.assertFalse(response.data['count_exact'])
+
+        response = self.client.get('/api/notifications/list/', {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['code'], 400)
+
+
+class NotificationStreamTest(TestCase):
+    """实时消息推送测试"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='student', password='testpass123', phone='13800138003', user_type='student'
+        )
+        self.token = Token.objects.create(user=self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_publish_only_reaches_subscribed_user(self):
+        async def scenario():
+            broker = pubsub.get_broker()
+            subscription = broker.subscribe(self.user.id)
+            try:
+                pubsub.publish(self.user.id + 1, 'notification', {'id': 1})
+                pubsub.publish(self.user.id, 'unread_count', {'count': 3})
+                event = await subscription.get(timeout=1)
+                self.assertEqual(event, {'event': 'unread_count', 'data': {'count': 3}})
+                self.assertIsNone(await subscription.get(timeout=0.05))
+            finally:
+                subscription.close()
+            self.assertFalse(broker.has_subscribers(self.user.id))
+
+        asyncio.run(scenario())
+
+    def test_counters_publish_after_commit(self):
+        with mock.patch.object(pubsub, 'has_subscribers', return_value=True), \
+                mock.patch.object(pubsub, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                notification = Notification.objects.create(recipient=self.user, title='标题', message='内容')
+                publish.assert_not_called()
+
+        events = [call.args[:2] for call in publish.call_args_list]
+        self.assertEqual(events, [(self.user.id, 'notification'), (self.user.id, 'unread_count')])
+        self.assertEqual(publish.call_args_list[0].args[2]['id'], notification.id)
+        self.assertEqual(publish.call_args_list[1].args[2], {'count': 1})
+
+    async def test_stream_pushes_events(self):
+        response = await self.async_client.get(
+            '/api/notifications/stream/', headers={'Authorization': f'Token {self.token.key}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = response.streaming_content
+
+        async def next_frame():
+            return (await anext(stream)).decode()
+
+        try:
+            self.assertTrue((await next_frame()).startswith('retry:'))
+            self.assertIn('"count": 0', await next_frame())
+
+            pubsub.publish(self.user.id, 'notification', {'title': '预约已确认'})
+            frame = await next_frame()
+            self.assertTrue(frame.startswith('event: notification'))
+            self.assertIn('预约已确认', frame)
+        finally:
+            await stream.aclose()
+
+    async def test_stream_requires_authentication(self):
+        response = await self.async_client.get('/api/notifications/stream/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream_falls_back_under_wsgi(self):
+        response = self.client.get('/api/notifications/stream/')
+        self.assertEqual(response.status_code, 503)
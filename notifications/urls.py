@@ -8,6 +8,7 @@ urlpatterns = [
     path('list/', views.notification_list, name='api_notification_list'),
     path('stats/', views.notification_stats, name='api_notification_stats'),
     path('unread-count/', views.unread_count, name='api_unread_count'),
+    path('stream/', views.notification_stream, name='api_notification_stream'),
     path('<int:notification_id>/', views.notification_detail, name='api_notification_detail'),
     path('<int:notification_id>/mark-read/', views.mark_as_read, name='api_mark_as_read'),
     path('<int:notification_id>/delete/', views.delete_notification, name='api_delete_notification'),
@@ -1,13 +1,22 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from rest_framework import status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from keshe import pagination
 from .models import Notification
+from . import counters, pubsub
 from .serializers import (
     NotificationSerializer, 
     NotificationCreateSerializer,
@@ -44,6 +53,23 @@ def notification_list(request):
         if date_to:
             notifications = notifications.filter(created_at__lte=date_to)
         
+        # 传 cursor 时按 (created_at, id) 键集分页，不统计总数
+        if pagination.use_cursor(request):
+            try:
+                objects, meta = pagination.paginate(request, notifications)
+            except pagination.InvalidCursor as e:
+                return Response({
+                    'code': 400,
+                    'message': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+            serializer = NotificationSerializer(objects, many=True)
+            return Response({
+                'code': 200,
+                'message': '获取消息列表成功',
+                'results': serializer.data,
+                **meta
+            })
+        
         # 分页
         page = int(request.GET.get('page', 1))
         page_size = int(request.GET.get('page_size', 10))
@@ -162,6 +188,7 @@ def mark_all_as_read(request):
                 is_read=True,
                 read_at=timezone.now()
             )
+            counters.notifications_read(request.user.id, updated_count)
         
         return Response({
             'code': 200,
@@ -322,3 +349,55 @@ def unread_count(request):
             'code': 400,
             'message': f'获取未读消息数量失败: {str(e)}'
         }, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _stream_user(request):
+    """会话或 Token 认证的当前用户，未认证返回 None"""
+    if request.user.is_authenticated:
+        return request.user
+    try:
+        result = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+async def _event_stream(user_id):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + pubsub.get_setting('MAX_DURATION_SECONDS')
+    heartbeat = pubsub.get_setting('HEARTBEAT_SECONDS')
+    # 先订阅再读取未读数，避免错过两者之间发布的事件
+    subscription = pubsub.get_broker().subscribe(user_id)
+    try:
+        yield 'retry: 3000\n\n'
+        count = await sync_to_async(counters.get_unread_count)(user_id)
+        yield pubsub.format_event({'event': 'unread_count', 'data': {'count': count}})
+        while loop.time() < deadline:
+            event = await subscription.get(timeout=heartbeat)
+            yield pubsub.format_event(event) if event else ': heartbeat\n\n'
+    finally:
+        subscription.close()
+
+
+async def notification_stream(request):
+    """
+    实时消息推送（Server-Sent Events），需要以 ASGI 方式部署（keshe.asgi:application）。
+    连接后先推送当前未读数，之后推送 notification / unread_count 事件，空闲时定期发送心跳。
+    unread-count、list 轮询接口保留，作为不支持推送时的回退。
+    """
+    if request.method != 'GET':
+        return JsonResponse({'code': 405, 'message': '不支持的请求方法'}, status=405)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({
+            'code': 503,
+            'message': '当前部署不支持实时推送，请使用轮询接口'
+        }, status=503)
+
+    user = await sync_to_async(_stream_user)(request)
+    if user is None:
+        return JsonResponse({'code': 401, 'message': '身份认证信息未提供'}, status=401)
+
+    response = StreamingHttpResponse(_event_stream(user.id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -81,39 +81,13 @@ class PaymentAdmin(admin.ModelAdmin):
     
     def approve_recharge(self, request, queryset):
         """批准充值"""
-        from django.db import transaction
-        from decimal import Decimal
+        from . import ledger
         
         updated = 0
         for payment in queryset.filter(payment_type='recharge', status='pending'):
-            with transaction.atomic():
-                # 更新支付状态
-                payment.status = 'completed'
-                payment.paid_at = timezone.now()
-                payment.save()
-                
-                # 更新用户账户余额
-                account, created = UserAccount.objects.get_or_create(
-                    user=payment.user,
-                    defaults={'balance': Decimal('0.00')}
-                )
-                
-                # 记录账户交易
-                AccountTransaction.objects.create(
-                    account=account,
-                    transaction_type='recharge',
-                    amount=payment.amount,
-                    balance_before=account.balance,
-                    balance_after=account.balance + payment.amount,
-                    payment=payment,
-                    description=f'管理员审核通过充值: {payment.description}'
-                )
-                
-                # 更新账户余额
-                account.balance += payment.amount
-                account.total_paid += payment.amount
-                account.save()
-                
+            # 更新支付状态和用户账户余额
+            _, created = ledger.approve_recharge(payment)
+            if created:
                 updated += 1
         
         self.message_user(request, f'成功批准 {updated} 个充值订单')
@@ -0,0 +1,256 @@
+"""
+账户记账服务
+
+所有余额变动都应通过本模块完成：
+- 余额通过带条件的 UPDATE（F 表达式）原子修改，不在 Python 中读改写
+- 交易记录与余额修改在同一事务中写入
+- 传入 idempotency_key 时操作幂等，重复请求返回首次的交易记录而不会重复记账
+
+各操作返回 (交易记录, 是否新建)，与 get_or_create 的约定一致。
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import UserAccount, AccountTransaction
+
+
+class LedgerError(Exception):
+    """记账操作失败"""
+
+
+class InsufficientBalance(LedgerError):
+    """可用余额（或冻结金额）不足"""
+
+    def __init__(self, account, amount, available):
+        self.account = account
+        self.amount = amount
+        self.available = available
+        super().__init__(f'账户余额不足。当前可用余额：¥{available:.2f}，需要：¥{amount:.2f}')
+
+
+def _to_amount(amount):
+    try:
+        amount = Decimal(str(amount)).quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError, ValueError):
+        raise LedgerError(f'无效的金额: {amount}')
+    if amount <= 0:
+        raise LedgerError('交易金额必须大于0')
+    return amount
+
+
+def get_account(user):
+    """获取或创建用户账户"""
+    account, _ = UserAccount.objects.get_or_create(
+        user=user,
+        defaults={'balance': Decimal('0.00')}
+    )
+    return account
+
+
+def find_transaction(idempotency_key):
+    """按幂等键查找已记账的交易"""
+    if not idempotency_key:
+        return None
+    return AccountTransaction.objects.filter(idempotency_key=idempotency_key).first()
+
+
+def _apply(user, amount, transaction_type, condition, changes, balance_delta,
+           idempotency_key=None, description='', payment=None):
+    """
+    在事务内执行一次带条件的余额更新并写入交易记录。
+
+    condition: 对 UserAccount 的额外过滤条件（如余额充足），不满足时抛出 InsufficientBalance
+    changes: UPDATE 的字段表达式
+    balance_delta: 本次操作对 balance 的影响，用于计算交易前余额
+    """
+    amount = _to_amount(amount)
+
+    existing = find_transaction(idempotency_key)
+    if existing is not None:
+        return _check_replay(existing, user, amount, transaction_type), False
+
+    account = get_account(user)
+    try:
+        with transaction.atomic():
+            updated = UserAccount.objects.filter(pk=account.pk, **condition(amount)).update(
+                updated_at=timezone.now(), **changes(amount)
+            )
+            if not updated:
+                balance, frozen = UserAccount.objects.filter(pk=account.pk).values_list(
+                    'balance', 'frozen_amount'
+                ).get()
+                available = frozen if transaction_type == 'unfreeze' else balance - frozen
+                raise InsufficientBalance(account, amount, available)
+
+            # UPDATE 已对该行加锁，此处读到的即为本事务修改后的余额
+            balance_after = UserAccount.objects.filter(pk=account.pk).values_list(
+                'balance', flat=True
+            ).get()
+            record = AccountTransaction.objects.create(
+                account=account,
+                transaction_type=transaction_type,
+                amount=amount,
+                balance_before=balance_after - balance_delta(amount),
+                balance_after=balance_after,
+                payment=payment,
+                description=description,
+                idempotency_key=idempotency_key or None,
+            )
+    except IntegrityError:
+        # 并发请求使用了相同的幂等键，本次修改已随保存点回滚
+        existing = find_transaction(idempotency_key)
+        if existing is None:
+            raise LedgerError('重复的交易请求，请稍后重试')
+        return _check_replay(existing, user, amount, transaction_type), False
+    return record, True
+
+
+def _check_replay(record, user, amount, transaction_type):
+    if (record.account.user_id != user.pk or record.amount != amount
+            or record.transaction_type != transaction_type):
+        raise LedgerError('幂等键已被其他交易使用')
+    return record
+
+
+def debit(user, amount, idempotency_key=None, description='', payment=None):
+    """扣款：要求可用余额（余额 - 冻结金额）不少于扣款金额"""
+    return _apply(
+        user, amount, 'payment',
+        condition=lambda amount: {'balance__gte': F('frozen_amount') + amount},
+        changes=lambda amount: {'balance': F('balance') - amount},
+        balance_delta=lambda amount: -amount,
+        idempotency_key=idempotency_key, description=description, payment=payment,
+    )
+
+
+def debit_many(user, entries):
+    """
+    同一用户的多笔扣款（如教练批量确认预约）。entries 为 [(金额, 幂等键, 描述)]。
+
+    锁定账户后按顺序累计，扣到可用余额不足为止；能扣的部分用一次条件 UPDATE 扣除总额，
+    交易记录一次 bulk_create。返回与 entries 一一对应的 (交易记录, 错误) 列表：
+    成功（包括幂等键已记账的重复请求）时错误为 None，余额不足时交易记录为 None、错误为 InsufficientBalance。
+    必须在事务内调用。
+    """
+    entries = [(_to_amount(amount), key, description) for amount, key, description in entries]
+    account = get_account(user)
+    balance, frozen = UserAccount.objects.select_for_update().filter(pk=account.pk).values_list(
+        'balance', 'frozen_amount'
+    ).get()
+
+    # 加锁后再查幂等键：同一账户的其他扣款必须等待本事务提交
+    keys = [key for _, key, _ in entries if key]
+    existing = {
+        record.idempotency_key: record
+        for record in AccountTransaction.objects.filter(idempotency_key__in=keys).select_related('account')
+    }
+
+    results = []
+    records = []
+    total = Decimal('0.00')
+    for amount, key, description in entries:
+        if key in existing:
+            results.append((_check_replay(existing[key], user, amount, 'payment'), None))
+            continue
+        available = balance - total - frozen
+        if available < amount:
+            results.append((None, InsufficientBalance(account, amount, available)))
+            continue
+        record = AccountTransaction(
+            account=account,
+            transaction_type='payment',
+            amount=amount,
+            balance_before=balance - total,
+            balance_after=balance - total - amount,
+            description=description,
+            idempotency_key=key or None,
+        )
+        # 同一批次内重复的幂等键只记账一次
+        if key:
+            existing[key] = record
+        total += amount
+        records.append(record)
+        results.append((record, None))
+
+    if records:
+        UserAccount.objects.filter(pk=account.pk).update(
+            balance=F('balance') - total, updated_at=timezone.now()
+        )
+        AccountTransaction.objects.bulk_create(records)
+    return results
+
+
+def credit(user, amount, idempotency_key=None, description='', payment=None):
+    """充值入账"""
+    return _apply(
+        user, amount, 'recharge',
+        condition=lambda amount: {},
+        changes=lambda amount: {
+            'balance': F('balance') + amount,
+            'total_paid': F('total_paid') + amount,
+        },
+        balance_delta=lambda amount: amount,
+        idempotency_key=idempotency_key, description=description, payment=payment,
+    )
+
+
+def refund(user, amount, idempotency_key=None, description='', payment=None):
+    """退款到账户余额"""
+    return _apply(
+        user, amount, 'refund',
+        condition=lambda amount: {},
+        changes=lambda amount: {
+            'balance': F('balance') + amount,
+            'total_refunded': F('total_refunded') + amount,
+        },
+        balance_delta=lambda amount: amount,
+        idempotency_key=idempotency_key, description=description, payment=payment,
+    )
+
+
+def freeze(user, amount, idempotency_key=None, description=''):
+    """冻结金额：要求可用余额不少于冻结金额，余额本身不变"""
+    return _apply(
+        user, amount, 'freeze',
+        condition=lambda amount: {'balance__gte': F('frozen_amount') + amount},
+        changes=lambda amount: {'frozen_amount': F('frozen_amount') + amount},
+        balance_delta=lambda amount: Decimal('0.00'),
+        idempotency_key=idempotency_key, description=description,
+    )
+
+
+def unfreeze(user, amount, idempotency_key=None, description=''):
+    """解冻金额：要求冻结金额不少于解冻金额"""
+    return _apply(
+        user, amount, 'unfreeze',
+        condition=lambda amount: {'frozen_amount__gte': amount},
+        changes=lambda amount: {'frozen_amount': F('frozen_amount') - amount},
+        balance_delta=lambda amount: Decimal('0.00'),
+        idempotency_key=idempotency_key, description=description,
+    )
+
+
+def approve_recharge(payment, description=None):
+    """
+    审核通过充值订单并入账。
+    订单状态通过条件更新从 pending 改为 completed，并发审核时只有一次生效；
+    返回 (交易记录, 是否新建)，订单已被处理时交易记录为 None。
+    """
+    with transaction.atomic():
+        paid_at = timezone.now()
+        updated = payment.__class__.objects.filter(pk=payment.pk, status='pending').update(
+            status='completed', paid_at=paid_at, updated_at=paid_at
+        )
+        if not updated:
+            return find_transaction(f'recharge:{payment.payment_id}'), False
+        payment.status = 'completed'
+        payment.paid_at = paid_at
+        return credit(
+            payment.user, payment.amount,
+            idempotency_key=f'recharge:{payment.payment_id}',
+            description=description or f'管理员审核通过充值: {payment.description}',
+            payment=payment,
+        )
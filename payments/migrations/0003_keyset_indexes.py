@@ -0,0 +1,25 @@
+# Generated by Django 4.2.24 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_accounttransaction_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='accounttransaction',
+            index=models.Index(fields=['account', 'created_at', 'id'], name='payments_ac_account_857eb3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='accounttransaction',
+            index=models.Index(fields=['created_at', 'id'], name='payments_ac_created_be0f3c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='payments_pa_user_id_fbc711_idx'),
+        ),
+    ]
@@ -140,6 +140,10 @@ class Payment(models.Model):
         verbose_name_plural = '支付记录'
         db_table = 'payments_payment'
         ordering = ['-created_at']
+        indexes = [
+            # 键集分页
+            models.Index(fields=['user', 'created_at', 'id']),
+        ]
     
     def __str__(self):
         return f"{self.payment_id} - {self.user.real_name} - ¥{self.amount}"
@@ -353,6 +357,13 @@ class AccountTransaction(models.Model):
         null=True,
         verbose_name='交易描述'
     )
+    idempotency_key = models.CharField(
+        max_length=100,
+        unique=True,
+        blank=True,
+        null=True,
+        verbose_name='幂等键'
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name='交易时间'
@@ -363,6 +374,11 @@ class AccountTransaction(models.Model):
         verbose_name_plural = '账户交易记录'
         db_table = 'payments_account_transaction'
         ordering = ['-created_at']
+        indexes = [
+            # 键集分页
+            models.Index(fields=['account', 'created_at', 'id']),
+            models.Index(fields=['created_at', 'id']),
+        ]
     
     def __str__(self):
         return f"{self.account.user.real_name} - {self.get_transaction_type_display()} - ¥{self.amount}"
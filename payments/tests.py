@@ -0,0 +1,160 @@
+import threading
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+
+from . import ledger
+from .models import Payment, PaymentMethod, UserAccount, AccountTransaction
+
+User = get_user_model()
+
+
+class LedgerTest(TestCase):
+    """记账服务测试"""
+
+    def setUp(self):
+        self.student = User.objects.create_user(
+            username='student',
+            password='testpass123',
+            phone='13800138002',
+            user_type='student'
+        )
+        self.account = UserAccount.objects.create(user=self.student, balance=Decimal('100.00'))
+
+    def test_debit_and_insufficient_balance(self):
+        record, created = ledger.debit(self.student, '30.00', description='测试扣款')
+        self.assertTrue(created)
+        self.assertEqual(record.balance_before, Decimal('100.00'))
+        self.assertEqual(record.balance_after, Decimal('70.00'))
+
+        with self.assertRaises(ledger.InsufficientBalance) as context:
+            ledger.debit(self.student, '80.00')
+        self.assertEqual(context.exception.available, Decimal('70.00'))
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('70.00'))
+        self.assertEqual(AccountTransaction.objects.filter(account=self.account).count(), 1)
+
+    def test_idempotent_replay(self):
+        first, created = ledger.debit(self.student, '10.00', idempotency_key='booking:1:payment')
+        self.assertTrue(created)
+        second, created = ledger.debit(self.student, '10.00', idempotency_key='booking:1:payment')
+        self.assertFalse(created)
+        self.assertEqual(first.id, second.id)
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('90.00'))
+
+        with self.assertRaises(ledger.LedgerError):
+            ledger.debit(self.student, '20.00', idempotency_key='booking:1:payment')
+
+    def test_debit_many_stops_at_available_balance(self):
+        ledger.debit(self.student, '10.00', idempotency_key='booking:1:payment')
+        with transaction.atomic():
+            results = ledger.debit_many(self.student, [
+                ('10.00', 'booking:1:payment', '已记账'),
+                ('40.00', 'booking:2:payment', '第一笔'),
+                ('60.00', 'booking:3:payment', '余额不足'),
+                ('50.00', 'booking:4:payment', '第二笔'),
+            ])
+
+        self.assertEqual([error is None for _, error in results], [True, True, False, True])
+        self.assertIsInstance(results[2][1], ledger.InsufficientBalance)
+        self.assertEqual(results[2][1].available, Decimal('50.00'))
+        self.assertEqual(results[3][0].balance_before, Decimal('50.00'))
+        self.assertEqual(results[3][0].balance_after, Decimal('0.00'))
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('0.00'))
+        self.assertEqual(AccountTransaction.objects.filter(account=self.account).count(), 3)
+
+    def test_freeze_limits_available_balance(self):
+        ledger.freeze(self.student, '60.00')
+        with self.assertRaises(ledger.InsufficientBalance):
+            ledger.debit(self.student, '50.00')
+
+        ledger.unfreeze(self.student, '60.00')
+        with self.assertRaises(ledger.InsufficientBalance):
+            ledger.unfreeze(self.student, '1.00')
+        ledger.debit(self.student, '50.00')
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('50.00'))
+        self.assertEqual(self.account.frozen_amount, Decimal('0.00'))
+
+    def test_refund_updates_total_refunded(self):
+        record, _ = ledger.refund(self.student, '25.00')
+        self.assertEqual(record.transaction_type, 'refund')
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('125.00'))
+        self.assertEqual(self.account.total_refunded, Decimal('25.00'))
+
+    def test_recharge_approved_once(self):
+        method = PaymentMethod.objects.create(name='现金', method_type='cash')
+        payment = Payment.objects.create(
+            user=self.student,
+            payment_type='recharge',
+            amount=Decimal('50.00'),
+            payment_method=method
+        )
+
+        _, created = ledger.approve_recharge(payment)
+        self.assertTrue(created)
+        _, created = ledger.approve_recharge(Payment.objects.get(pk=payment.pk))
+        self.assertFalse(created)
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('150.00'))
+        self.assertEqual(self.account.total_paid, Decimal('50.00'))
+
+
+class LedgerConcurrencyTest(TransactionTestCase):
+    """并发扣款测试：100 个并发扣款不会丢失更新，也不会透支"""
+
+    WRITERS = 100
+
+    def setUp(self):
+        self.student = User.objects.create_user(
+            username='student',
+            password='testpass123',
+            phone='13800138002',
+            user_type='student'
+        )
+        # 余额只够其中 60 次扣款
+        self.account = UserAccount.objects.create(user=self.student, balance=Decimal('60.00'))
+
+    def debit(self, index, barrier, results):
+        try:
+            barrier.wait()
+            ledger.debit(self.student, '1.00', idempotency_key=f'concurrency:{index}')
+            results[index] = 'debited'
+        except Exception as e:
+            results[index] = type(e).__name__
+        finally:
+            connection.close()
+
+    def test_no_lost_updates(self):
+        barrier = threading.Barrier(self.WRITERS)
+        results = [None] * self.WRITERS
+        threads = [
+            threading.Thread(target=self.debit, args=(index, barrier, results))
+            for index in range(self.WRITERS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        debited = results.count('debited')
+        self.assertGreater(debited, 0)
+        self.assertLessEqual(debited, 60)
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('60.00') - debited)
+        records = AccountTransaction.objects.filter(account=self.account)
+        self.assertEqual(records.count(), debited)
+        # 每条交易记录的前后余额连续，且与最终余额一致
+        balances = sorted(records.values_list('balance_after', flat=True), reverse=True)
+        self.assertEqual(list(balances), [Decimal('59.00') - i for i in range(debited)])
@@ -12,7 +12,9 @@ from django.utils import timezone
 from decimal import Decimal
 from django.db import transaction
 from django.core.paginator import Paginator
+from keshe import pagination
 from .models import Payment, PaymentMethod, UserAccount, AccountTransaction, Refund, Invoice
+from . import ledger
 from .serializers import PaymentSerializer, PaymentMethodSerializer, UserAccountSerializer, AccountTransactionSerializer, RefundSerializer, InvoiceSerializer
 from courses.models import CourseEnrollment
 from accounts.models import User
@@ -99,6 +101,25 @@ def payment_list(request):
         if payment_status:
             payments = payments.filter(status=payment_status)
         
+        # 传 cursor 时按 (created_at, id) 键集分页，不统计总数
+        if pagination.use_cursor(request):
+            try:
+                objects, meta = pagination.paginate(request, payments)
+            except pagination.InvalidCursor as e:
+                return Response({
+                    'code': 400,
+                    'message': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+            serializer = PaymentSerializer(objects, many=True)
+            return Response({
+                'code': 200,
+                'message': '获取支付列表成功',
+                'data': {
+                    'results': serializer.data,
+                    **meta
+                }
+            })
+        
         # 分页
         page = int(request.GET.get('page', 1))
         page_size = int(request.GET.get('page_size', 10))
@@ -420,6 +441,25 @@ def account_transactions(request):
         if transaction_type:
             transactions = transactions.filter(transaction_type=transaction_type)
         
+        # 传 cursor 时按 (created_at, id) 键集分页，不统计总数
+        if pagination.use_cursor(request):
+            try:
+                objects, meta = pagination.paginate(request, transactions)
+            except pagination.InvalidCursor as e:
+                return Response({
+                    'code': 400,
+                    'message': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+            serializer = AccountTransactionSerializer(objects, many=True)
+            return Response({
+                'code': 200,
+                'message': '获取交易记录成功',
+                'data': {
+                    'results': serializer.data,
+                    **meta
+                }
+            })
+        
         # 分页
         page = int(request.GET.get('page', 1))
         page_size = int(request.GET.get('page_size', 10))
@@ -609,6 +649,18 @@ def admin_offline_payment(request):
                 'message': '现金支付方式未配置或已禁用'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        # 客户端可通过 Idempotency-Key 请求头避免重试导致重复录入
+        client_key = request.headers.get('Idempotency-Key')
+        idempotency_key = f'offline:{request.user.id}:{client_key}' if client_key else None
+        existing = ledger.find_transaction(idempotency_key)
+        if existing is not None and existing.payment is not None:
+            serializer = PaymentSerializer(existing.payment)
+            return Response({
+                'code': 200,
+                'message': '线下支付录入成功',
+                'data': serializer.data
+            })
+        
         with transaction.atomic():
             # 创建支付记录
             payment = Payment.objects.create(
@@ -645,27 +697,17 @@ def admin_offline_payment(request):
                 }
             )
             
-            # 更新学员账户余额
-            account, created = UserAccount.objects.get_or_create(
-                user=student,
-                defaults={'balance': Decimal('0.00')}
-            )
-            
-            # 记录账户交易
-            AccountTransaction.objects.create(
-                account=account,
-                transaction_type='recharge',
-                amount=amount,
-                balance_before=account.balance,
-                balance_after=account.balance + amount,
-                payment=payment,
-                description=f'管理员线下充值录入: {description}'
+            # 更新学员账户余额并记录账户交易
+            record, created = ledger.credit(
+                student, amount,
+                idempotency_key=idempotency_key or f'recharge:{payment.payment_id}',
+                description=f'管理员线下充值录入: {description}',
+                payment=payment
             )
-            
-            # 更新账户余额
-            account.balance += amount
-            account.total_paid += amount
-            account.save()
+            if not created:
+                # 并发的重复请求已经入账，撤销本次创建的支付记录
+                transaction.set_rollback(True)
+                payment = record.payment
         
         # 标记请求，避免中间件重复记录
         request._skip_logging = True
@@ -709,32 +751,13 @@ def admin_recharge_approve(request, payment_id):
         
         with transaction.atomic():
             if approve:
-                # 审核通过
-                payment.status = 'completed'
-                payment.paid_at = timezone.now()
-                payment.save()
-                
-                # 更新用户账户余额
-                account, created = UserAccount.objects.get_or_create(
-                    user=payment.user,
-                    defaults={'balance': Decimal('0.00')}
-                )
-                
-                # 记录账户交易
-                AccountTransaction.objects.create(
-                    account=account,
-                    transaction_type='recharge',
-                    amount=payment.amount,
-                    balance_before=account.balance,
-                    balance_after=account.balance + payment.amount,
-                    payment=payment,
-                    description=f'管理员审核通过充值: {payment.description}'
-                )
-                
-                # 更新账户余额
-                account.balance += payment.amount
-                account.total_paid += payment.amount
-                account.save()
+                # 审核通过并更新用户账户余额
+                _, created = ledger.approve_recharge(payment)
+                if not created:
+                    return Response({
+                        'code': 400,
+                        'message': '充值订单状态不允许审核'
+                    }, status=status.HTTP_400_BAD_REQUEST)
                 
                 message = '充值订单审核通过，用户余额已更新'
             else:
@@ -804,6 +827,16 @@ def admin_pending_recharges(request):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
+def _student_data(student):
+    return {
+        'id': student.id,
+        'username': student.username,
+        'real_name': student.real_name,
+        'phone': student.phone,
+        'email': student.email
+    }
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def admin_students_list(request):
@@ -819,15 +852,38 @@ def admin_students_list(request):
         # 获取学员列表
         students = User.objects.filter(user_type='student', is_active=True)
         
-        # 搜索功能
+        # 搜索功能（先用全文索引缩小候选范围）
         search = request.GET.get('search', '').strip()
         if search:
             from django.db.models import Q
-            students = students.filter(
-                Q(username__icontains=search) | 
+            from search import index as search_index
+            students = students.filter(search_index.search_filter(
+                search,
+                [('user', 'pk')],
+                Q(username__icontains=search) |
                 Q(real_name__icontains=search) |
                 Q(phone__icontains=search)
-            )
+            ))
+        
+        # 传 cursor 时按 (real_name, id) 键集分页，不统计总数
+        if pagination.use_cursor(request):
+            try:
+                students_page, meta = pagination.paginate(
+                    request, students, default_page_size=20, field='real_name', descending=False
+                )
+            except pagination.InvalidCursor as e:
+                return Response({
+                    'code': 400,
+                    'message': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+            return Response({
+                'code': 200,
+                'message': '获取学员列表成功',
+                'data': {
+                    'students': [_student_data(student) for student in students_page],
+                    **meta
+                }
+            })
         
         students = students.order_by('real_name')
         
@@ -838,15 +894,7 @@ def admin_students_list(request):
         students_page = paginator.get_page(page)
         
         # 构造返回数据
-        students_data = []
-        for student in students_page:
-            students_data.append({
-                'id': student.id,
-                'username': student.username,
-                'real_name': student.real_name,
-                'phone': student.phone,
-                'email': student.email
-            })
+        students_data = [_student_data(student) for student in students_page]
         
         return Response({
             'code': 200,
@@ -927,32 +975,10 @@ def approve_payment(request, payment_id):
         
         with transaction.atomic():
             if action == 'approve':
-                # 审核通过
-                payment.status = 'completed'
-                payment.paid_at = timezone.now()
-                payment.save()
-                
-                # 更新用户账户余额
-                account, created = UserAccount.objects.get_or_create(
-                    user=payment.user,
-                    defaults={'balance': Decimal('0.00')}
-                )
-                
-                # 记录账户交易
-                AccountTransaction.objects.create(
-                    account=account,
-                    transaction_type='recharge',
-                    amount=payment.amount,
-                    balance_before=account.balance,
-                    balance_after=account.balance + payment.amount,
-                    payment=payment,
-                    description=f'管理员审核通过充值: {payment.description}'
-                )
-                
-                # 更新账户余额
-                account.balance += payment.amount
-                account.total_paid += payment.amount
-                account.save()
+                # 审核通过并更新用户账户余额
+                record, created = ledger.approve_recharge(payment)
+                if not created:
+                    return JsonResponse({'success': False, 'message': '支付订单状态不允许审核'})
                 
                 # 记录操作日志
                 log_user_action(
@@ -967,7 +993,7 @@ def approve_payment(request, payment_id):
                         'payment_id': payment.payment_id,
                         'amount': float(payment.amount),
                         'user_id': payment.user.id,
-                        'balance_after': float(account.balance)
+                        'balance_after': float(record.balance_after)
                     }
                 )
                 
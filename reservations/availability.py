@@ -0,0 +1,185 @@
+"""
+多时段球台/教练可用性矩阵
+
+一次查询取出时间范围内的校区预约（以及指定教练在所有校区的预约），
+单次遍历标记到按时间段划分的位图上，供课表页面一次性渲染整天或整周的空闲情况。
+
+时间段编号：第 d 天第 i 个时间段的全局编号为 d * slots_per_day + i。
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .occupancy import ACTIVE_BOOKING_STATUSES
+
+MAX_GRID_DAYS = 14
+ALLOWED_SLOT_MINUTES = (10, 15, 20, 30, 60, 90, 120)
+DEFAULT_DAY_START = time(0, 0)
+DEFAULT_DAY_END = time(23, 59, 59, 999999)
+
+
+def parse_operating_hours(value):
+    """解析校区营业时间（如 '09:00-21:00'），解析失败时返回全天"""
+    try:
+        start_str, end_str = value.split('-')
+        day_start = datetime.strptime(start_str.strip(), '%H:%M').time()
+        day_end = datetime.strptime(end_str.strip(), '%H:%M').time()
+    except (AttributeError, ValueError):
+        return DEFAULT_DAY_START, DEFAULT_DAY_END
+    if day_end <= day_start:
+        return DEFAULT_DAY_START, DEFAULT_DAY_END
+    return day_start, day_end
+
+
+def bitmap_to_ranges(bitmap):
+    """将位图转换为 [起始编号, 结束编号) 区间列表"""
+    ranges = []
+    position = 0
+    while bitmap:
+        if bitmap & 1:
+            start = position
+            while bitmap & 1:
+                bitmap >>= 1
+                position += 1
+            ranges.append([start, position])
+        else:
+            # 跳过连续的 0
+            skip = (bitmap & -bitmap).bit_length() - 1
+            bitmap >>= skip
+            position += skip
+    return ranges
+
+
+def encode_bitmap(bitmap, encoding):
+    if encoding == 'bitmap':
+        return format(bitmap, 'x')
+    return bitmap_to_ranges(bitmap)
+
+
+class AvailabilityGrid:
+    """时间段占用位图"""
+
+    def __init__(self, date_from, date_to, slot_minutes, day_start, day_end):
+        self.slot = timedelta(minutes=slot_minutes)
+        self.slot_minutes = slot_minutes
+        self.day_start = day_start
+        self.day_end = day_end
+        self.days = []
+        current = date_from
+        while current <= date_to:
+            self.days.append(current)
+            current += timedelta(days=1)
+
+        # 每天的时间窗口（带时区）
+        self.windows = []
+        for day in self.days:
+            window_start = timezone.make_aware(datetime.combine(day, day_start))
+            window_end = timezone.make_aware(datetime.combine(day, day_end))
+            self.windows.append((window_start, window_end))
+
+        first_start, first_end = self.windows[0]
+        self.slots_per_day = -(-(first_end - first_start) // self.slot)
+        self.total_slots = self.slots_per_day * len(self.days)
+
+    @property
+    def range_start(self):
+        return self.windows[0][0]
+
+    @property
+    def range_end(self):
+        return self.windows[-1][1]
+
+    def mask_for(self, start, end):
+        """返回与 [start, end) 重叠的时间段位掩码"""
+        mask = 0
+        for day_index, (window_start, window_end) in enumerate(self.windows):
+            if start >= window_end or end <= window_start:
+                continue
+            first = (max(start, window_start) - window_start) // self.slot
+            last = -(-(min(end, window_end) - window_start) // self.slot)
+            last = min(last, self.slots_per_day)
+            offset = day_index * self.slots_per_day
+            mask |= ((1 << (last - first)) - 1) << (offset + first)
+        return mask
+
+    def describe(self):
+        return {
+            'days': [day.isoformat() for day in self.days],
+            'slot_minutes': self.slot_minutes,
+            'slots_per_day': self.slots_per_day,
+            'total_slots': self.total_slots,
+            'day_start': self.day_start.strftime('%H:%M'),
+            'day_end': self.day_end.strftime('%H:%M') if self.day_end != DEFAULT_DAY_END else '24:00',
+        }
+
+
+def build_availability_grid(campus, date_from, date_to, slot_minutes,
+                            coach_id=None, encoding='ranges', day_start=None, day_end=None):
+    """
+    构建校区球台（及可选教练）在日期范围内的占用矩阵。
+
+    返回的每个球台/教练带有 busy 字段（占用时间段），
+    bookable 为至少有一张空闲球台且教练空闲的时间段。
+    """
+    from .models import Table, Booking
+
+    if day_start is None or day_end is None:
+        default_start, default_end = parse_operating_hours(campus.operating_hours)
+        day_start = day_start or default_start
+        day_end = day_end or default_end
+
+    grid = AvailabilityGrid(date_from, date_to, slot_minutes, day_start, day_end)
+
+    tables = list(
+        Table.objects.filter(campus=campus, is_active=True, status='available')
+        .values('id', 'number', 'name')
+    )
+    table_busy = {table['id']: 0 for table in tables}
+    coach_busy = 0
+
+    overlap = Q(start_time__lt=grid.range_end, end_time__gt=grid.range_start)
+    scope = Q(table__campus=campus)
+    if coach_id:
+        scope |= Q(relation__coach_id=coach_id)
+
+    bookings = Booking.objects.filter(
+        overlap, scope, status__in=ACTIVE_BOOKING_STATUSES
+    ).values_list('table_id', 'relation__coach_id', 'start_time', 'end_time')
+
+    # 单次遍历标记占用
+    for table_id, booking_coach_id, start, end in bookings:
+        mask = grid.mask_for(start, end)
+        if table_id in table_busy:
+            table_busy[table_id] |= mask
+        if coach_id and booking_coach_id == coach_id:
+            coach_busy |= mask
+
+    full_mask = (1 << grid.total_slots) - 1
+    # 所有球台都被占用的时间段
+    all_tables_busy = full_mask
+    for busy in table_busy.values():
+        all_tables_busy &= busy
+    bookable = full_mask & ~all_tables_busy & ~coach_busy
+
+    result = {
+        'campus_id': campus.id,
+        'encoding': encoding,
+        **grid.describe(),
+        'tables': [
+            {
+                'id': table['id'],
+                'number': table['number'],
+                'name': table['name'],
+                'busy': encode_bitmap(table_busy[table['id']], encoding),
+            }
+            for table in sorted(tables, key=lambda item: item['number'])
+        ],
+        'bookable': encode_bitmap(bookable, encoding),
+    }
+    if coach_id:
+        result['coach'] = {
+            'id': coach_id,
+            'busy': encode_bitmap(coach_busy, encoding),
+        }
+    return result
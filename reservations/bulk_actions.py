@@ -0,0 +1,221 @@
+"""
+教练批量确认/拒绝预约
+
+一个事务内处理多条预约：一次锁定全部预约，按学员分组扣费（每个学员一次账户更新，
+交易记录批量写入），预约状态一次 UPDATE，通知和操作日志各一次 bulk_create。
+单条预约失败（不存在、不属于该教练、状态不对、余额不足）不影响其他预约，
+按请求顺序返回每条预约的处理结果。拒绝的预约与逐条拒绝一样计入教练的月取消次数。
+
+批量 UPDATE 不触发信号，事务提交后手动刷新球台占用索引和课表缓存。
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from logs.utils import log_user_actions
+from notifications import outbox
+from payments import ledger
+from payments.models import UserAccount
+
+from . import cancel_quota, schedule_cache
+from .models import Booking, CoachStudentRelation
+from .occupancy import occupancy_index
+
+MAX_BULK_BOOKINGS = 100
+
+
+def _name(user):
+    return user.real_name or user.username
+
+
+def _lock_pending(coach, booking_ids, verb):
+    """
+    锁定预约并检查归属和状态，返回 (可处理的预约列表, 失败原因 {预约ID: 原因})。
+    预约的 relation 已预先加载（含学员）。
+    """
+    bookings = {
+        booking.id: booking
+        for booking in Booking.objects.select_for_update().filter(id__in=booking_ids).order_by('id')
+    }
+    relations = CoachStudentRelation.objects.select_related('student').in_bulk(
+        {booking.relation_id for booking in bookings.values()}
+    )
+
+    valid, errors = [], {}
+    for booking_id in booking_ids:
+        booking = bookings.get(booking_id)
+        if booking is None:
+            errors[booking_id] = '预约不存在'
+            continue
+        booking.relation = relations[booking.relation_id]
+        if booking.relation.coach_id != coach.id:
+            errors[booking_id] = f'您只能{verb}自己的预约'
+        elif booking.status != 'pending':
+            errors[booking_id] = f'预约状态不允许{verb}，当前状态：{booking.get_status_display()}'
+        else:
+            valid.append(booking)
+    return valid, errors
+
+
+def _results(booking_ids, errors, extra=None):
+    results = []
+    for booking_id in booking_ids:
+        if booking_id in errors:
+            results.append({'booking_id': booking_id, 'success': False, 'error': errors[booking_id]})
+        else:
+            results.append({'booking_id': booking_id, 'success': True, **(extra or {}).get(booking_id, {})})
+    return results
+
+
+def _invalidate_on_commit(coach, bookings, campus_ids=()):
+    user_ids = {coach.id} | {booking.relation.student_id for booking in bookings}
+    transaction.on_commit(lambda: schedule_cache.invalidate(*user_ids))
+    for campus_id in set(campus_ids):
+        transaction.on_commit(lambda campus_id=campus_id: occupancy_index.invalidate(campus_id))
+
+
+def confirm_bookings(coach, booking_ids, request=None):
+    """批量确认预约并扣除学员费用，必须在事务内调用"""
+    booking_ids = list(dict.fromkeys(booking_ids))
+    valid, errors = _lock_pending(coach, booking_ids, '确认')
+
+    students_with_account = set(UserAccount.objects.filter(
+        user_id__in={booking.relation.student_id for booking in valid}
+    ).values_list('user_id', flat=True))
+    by_student = defaultdict(list)
+    for booking in valid:
+        if booking.relation.student_id in students_with_account:
+            by_student[booking.relation.student_id].append(booking)
+        else:
+            errors[booking.id] = '学员账户不存在'
+
+    # 每个学员一次扣费，按上课时间先后扣到余额不足为止
+    confirmed, balances = [], {}
+    coach_name = _name(coach)
+    for student_bookings in by_student.values():
+        student_bookings.sort(key=lambda booking: booking.start_time)
+        results = ledger.debit_many(student_bookings[0].relation.student, [
+            (
+                booking.total_fee,
+                f'booking:{booking.id}:payment',
+                f'预约课程费用 - 教练：{coach.real_name}，时间：{booking.start_time.strftime("%Y-%m-%d %H:%M")}'
+            )
+            for booking in student_bookings
+        ])
+        for booking, (record, error) in zip(student_bookings, results):
+            if error is not None:
+                errors[booking.id] = (
+                    f'学员账户余额不足。当前余额：¥{error.available:.2f}，需要：¥{booking.total_fee:.2f}'
+                )
+                continue
+            confirmed.append(booking)
+            balances[booking.id] = record.balance_after
+
+    if confirmed:
+        Booking.objects.filter(id__in=[booking.id for booking in confirmed]).update(
+            status='confirmed', payment_status='paid', updated_at=timezone.now()
+        )
+        outbox.enqueue_batch([
+            {
+                'recipient': booking.relation.student,
+                'sender': coach,
+                'title': '预约已确认',
+                'message': f'您的预约已被教练 {coach_name} 确认，费用 ¥{booking.total_fee:.2f} 已扣除。',
+                'message_type': 'booking',
+                'data': {
+                    'booking_id': booking.id,
+                    'coach_id': coach.id,
+                    'coach_name': coach_name,
+                    'amount': float(booking.total_fee),
+                    'start_time': booking.start_time.isoformat(),
+                    'end_time': booking.end_time.isoformat(),
+                    'action': 'booking_confirmed'
+                }
+            }
+            for booking in confirmed
+        ])
+        log_user_actions(coach, [
+            {
+                'action_type': 'confirm',
+                'resource_type': 'booking',
+                'resource_id': booking.id,
+                'resource_name': f'预约 {booking.id}',
+                'description': f'确认了与学员 {booking.relation.student.real_name} 的预约，扣除费用 ¥{booking.total_fee}',
+                'extra_data': {
+                    'student_id': booking.relation.student_id,
+                    'student_name': booking.relation.student.real_name,
+                    'amount': float(booking.total_fee),
+                    'student_balance_after': float(balances[booking.id]),
+                    'start_time': booking.start_time.isoformat(),
+                    'end_time': booking.end_time.isoformat(),
+                    'bulk': True
+                }
+            }
+            for booking in confirmed
+        ], request=request)
+        # 待确认与已确认都占用球台，占用索引不受影响，只刷新课表缓存
+        _invalidate_on_commit(coach, confirmed)
+
+    return _results(booking_ids, errors, {
+        booking_id: {'student_balance': float(balance)} for booking_id, balance in balances.items()
+    })
+
+
+def reject_bookings(coach, booking_ids, reason, request=None):
+    """批量拒绝预约，必须在事务内调用"""
+    booking_ids = list(dict.fromkeys(booking_ids))
+    rejected, errors = _lock_pending(coach, booking_ids, '拒绝')
+
+    if rejected:
+        now = timezone.now()
+        Booking.objects.filter(id__in=[booking.id for booking in rejected]).update(
+            status='cancelled', cancelled_at=now, cancelled_by=coach, cancel_reason=reason, updated_at=now
+        )
+        cancel_quota.counter.move_many(
+            [cancel_quota.counter.remembered(booking) for booking in rejected], (coach.id, cancel_quota.month_of(now))
+        )
+        coach_name = _name(coach)
+        outbox.enqueue_batch([
+            {
+                'recipient': booking.relation.student,
+                'sender': coach,
+                'title': '预约被拒绝',
+                'message': f'很抱歉，教练 {coach_name} 拒绝了您的预约申请。原因：{reason}',
+                'message_type': 'booking',
+                'data': {
+                    'booking_id': booking.id,
+                    'coach_id': coach.id,
+                    'coach_name': coach_name,
+                    'reason': reason,
+                    'start_time': booking.start_time.isoformat(),
+                    'end_time': booking.end_time.isoformat(),
+                    'action': 'booking_rejected'
+                }
+            }
+            for booking in rejected
+        ])
+        log_user_actions(coach, [
+            {
+                'action_type': 'reject',
+                'resource_type': 'booking',
+                'resource_id': booking.id,
+                'resource_name': f'预约 {booking.id}',
+                'description': f'拒绝了学员 {booking.relation.student.real_name} 的预约申请',
+                'extra_data': {
+                    'student_id': booking.relation.student_id,
+                    'student_name': booking.relation.student.real_name,
+                    'reason': reason,
+                    'start_time': booking.start_time.isoformat(),
+                    'end_time': booking.end_time.isoformat(),
+                    'bulk': True
+                }
+            }
+            for booking in rejected
+        ], request=request)
+        campus_ids = Booking.objects.filter(
+            id__in=[booking.id for booking in rejected]
+        ).values_list('table__campus_id', flat=True).distinct()
+        _invalidate_on_commit(coach, rejected, campus_ids)
+
+    return _results(booking_ids, errors)
@@ -0,0 +1,117 @@
+"""
+每月取消次数配额
+
+每个用户每月最多取消 MAX_MONTHLY_CANCELS 次预约（按预约的 cancelled_by 统计）。
+次数保存在 CancellationCounter 中，不再每次检查时扫描本月的已取消预约：
+Booking 保存/删除时由信号（keshe.signal_counters）比较 (cancelled_by, cancelled_at 所在月份)
+的新旧值，在同一事务中增减计数；批量 UPDATE 的调用方需要自行调用 counter.move_many。
+
+月份按 UTC 计算，与原来以 timezone.now() 取月初的统计口径一致。
+"""
+from datetime import timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from keshe.signal_counters import UNKNOWN, SignalCounter
+
+MAX_MONTHLY_CANCELS = 3
+# 批量判断接口一次最多查询的预约数
+MAX_EVALUATE_BOOKINGS = 200
+
+
+def month_of(value):
+    """时间所在月份的第一天（UTC）"""
+    return value.astimezone(dt_timezone.utc).date().replace(day=1)
+
+
+def current_month():
+    return month_of(timezone.now())
+
+
+class CancelQuotaCounter(SignalCounter):
+    """预约按 (cancelled_by, cancelled_at 所在月份) 计入 CancellationCounter"""
+    name = 'cancel_quota'
+    fields = ('cancelled_by', 'cancelled_by_id', 'cancelled_at')
+
+    def key_of(self, booking):
+        """预约计入的 (用户ID, 月份)，未取消时为 None；只读取已加载的字段，不触发查询"""
+        values = booking.__dict__
+        if 'cancelled_by_id' not in values or 'cancelled_at' not in values:
+            return UNKNOWN
+        if values['cancelled_by_id'] is None or values['cancelled_at'] is None:
+            return None
+        return values['cancelled_by_id'], month_of(values['cancelled_at'])
+
+    def stored_key(self, booking):
+        """数据库中该预约当前计入的 (用户ID, 月份)"""
+        from .models import Booking
+
+        row = Booking.objects.filter(pk=booking.pk).values_list('cancelled_by_id', 'cancelled_at').first()
+        if row is None or row[0] is None or row[1] is None:
+            return None
+        return row[0], month_of(row[1])
+
+    def adjust(self, key, delta):
+        """增减用户某月的取消次数，应与对应的预约修改在同一事务中调用"""
+        from .models import CancellationCounter
+
+        if not delta:
+            return
+        user_id, month = key
+        counters = CancellationCounter.objects.filter(user_id=user_id, month=month)
+        if delta < 0:
+            counters.filter(count__gte=-delta).update(count=F('count') + delta)
+            return
+        if counters.update(count=F('count') + delta):
+            return
+        try:
+            with transaction.atomic():
+                CancellationCounter.objects.create(user_id=user_id, month=month, count=delta)
+        except IntegrityError:
+            # 并发请求已创建该月的计数
+            counters.update(count=F('count') + delta)
+
+
+counter = CancelQuotaCounter()
+
+
+def monthly_count(user):
+    from .models import CancellationCounter
+
+    return CancellationCounter.objects.filter(
+        user=user, month=current_month()
+    ).values_list('count', flat=True).first() or 0
+
+
+def monthly_count_subquery(user):
+    """本月取消次数的子查询表达式，用于附加在其他查询上"""
+    from .models import CancellationCounter
+
+    return Coalesce(
+        Subquery(CancellationCounter.objects.filter(
+            user=user, month=current_month()
+        ).values('count')[:1]),
+        0
+    )
+
+
+def evaluate(user, booking_ids):
+    """
+    一次查询判断用户能否取消（申请取消）一批预约，返回 (本月取消次数, {预约ID: (能否取消, 原因)})。
+    不存在或与用户无关的预约不出现在结果中。
+    """
+    from .models import Booking
+
+    bookings = list(
+        Booking.objects.filter(Q(relation__coach=user) | Q(relation__student=user), id__in=booking_ids)
+        .select_related('relation', 'cancellation')
+        .annotate(monthly_cancel_count=monthly_count_subquery(user))
+    )
+    count = bookings[0].monthly_cancel_count if bookings else monthly_count(user)
+    return count, {
+        booking.id: booking.can_be_cancelled_by(user, monthly_cancel_count=count)
+        for booking in bookings
+    }
@@ -0,0 +1,53 @@
+"""
+预约冲突检查
+
+在事务内先对涉及的球台和教练加行锁，再检查时间重叠，
+保证并发创建预约时同一球台、同一教练不会被重复预约。
+加锁顺序固定为：球台（按 id 升序）-> 教练（按 id 升序），避免死锁。
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+
+from .occupancy import ACTIVE_BOOKING_STATUSES
+
+User = get_user_model()
+
+
+def lock_booking_resources(table_ids=(), coach_ids=()):
+    """对球台和教练行加锁，必须在事务内调用"""
+    from .models import Table
+
+    if not transaction.get_connection().in_atomic_block:
+        raise RuntimeError('lock_booking_resources 必须在事务内调用')
+
+    table_ids = sorted(set(table_ids))
+    coach_ids = sorted(set(coach_ids))
+    if table_ids:
+        list(Table.objects.select_for_update().filter(id__in=table_ids).order_by('id').values_list('id'))
+    if coach_ids:
+        list(User.objects.select_for_update().filter(id__in=coach_ids).order_by('id').values_list('id'))
+
+
+def find_conflict(table_id, coach_id, start_time, end_time, exclude_id=None):
+    """
+    查找与 [start_time, end_time) 重叠的同球台或同教练的有效预约。
+    返回 (冲突类型, 预约) ，无冲突时返回 (None, None)；冲突类型为 'table' 或 'coach'。
+    """
+    from .models import Booking
+
+    queryset = Booking.objects.filter(
+        Q(table_id=table_id) | Q(relation__coach_id=coach_id),
+        status__in=ACTIVE_BOOKING_STATUSES,
+        start_time__lt=end_time,
+        end_time__gt=start_time
+    )
+    if exclude_id is not None:
+        queryset = queryset.exclude(id=exclude_id)
+
+    conflict = queryset.select_related('relation').order_by('start_time').first()
+    if conflict is None:
+        return None, None
+    if conflict.table_id == table_id:
+        return 'table', conflict
+    return 'coach', conflict
@@ -0,0 +1,143 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import User
+from campus.models import Campus
+from reservations import schedule_cache
+from reservations.models import Booking, BookingCancellation, CoachStudentRelation, Table
+from reservations.occupancy import occupancy_index
+from reservations.serializers import BookingListSerializer, BookingSerializer
+
+BENCHMARK_PREFIX = 'bench_booking_'
+BENCHMARK_CAMPUS_CODE = 'BENCH_BOOKING'
+
+
+class Command(BaseCommand):
+    help = '生成测试预约，比较 BookingSerializer 与扁平只读序列化（shape=flat）的耗时（结束后删除测试数据）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bookings',
+            type=int,
+            nargs='+',
+            default=[1000, 10000],
+            help='序列化的预约数，可指定多个（默认1000 10000）'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='每种方式重复次数（默认3）'
+        )
+
+    def handle(self, *args, **options):
+        counts = sorted(options['bookings'])
+        if counts[0] < 1 or options['repeat'] < 1:
+            raise CommandError('--bookings、--repeat 必须大于0')
+        if Campus.objects.filter(code=BENCHMARK_CAMPUS_CODE).exists():
+            raise CommandError('存在上次未删除的测试数据，请先删除编号为 BENCH_BOOKING 的校区')
+
+        try:
+            self.create_data(counts[-1])
+            queryset = Booking.objects.filter(table__campus=self.campus).select_related(
+                'relation__coach', 'relation__student', 'table__campus', 'cancellation__requested_by'
+            )
+            for count in counts:
+                self.stdout.write(f'{count} 条预约：')
+                self.measure('BookingSerializer', lambda: self.nested(queryset[:count]), options['repeat'])
+                self.measure('扁平只读序列化', lambda: self.flat(queryset[:count]), options['repeat'])
+        finally:
+            self.cleanup()
+
+    def create_data(self, count):
+        rng = random.Random(42)
+        self.campus = Campus.objects.create(
+            name='预约序列化测试校区', code=BENCHMARK_CAMPUS_CODE, address='测试地址', phone='13800000000'
+        )
+        tables = [Table(campus=self.campus, number=f'B{number}') for number in range(20)]
+        Table.objects.bulk_create(tables)
+        tables = list(Table.objects.filter(campus=self.campus))
+
+        users = [
+            User(
+                username=f'{BENCHMARK_PREFIX}{user_type}{number}', password='!',
+                real_name=f'测试{number}', phone=f'{"1700000" if user_type == "coach" else "1710000"}{number:04d}',
+                user_type=user_type
+            )
+            for user_type in ('coach', 'student')
+            for number in range(50)
+        ]
+        User.objects.bulk_create(users)
+        coaches = list(User.objects.filter(username__startswith=f'{BENCHMARK_PREFIX}coach'))
+        students = list(User.objects.filter(username__startswith=f'{BENCHMARK_PREFIX}student'))
+        CoachStudentRelation.objects.bulk_create([
+            CoachStudentRelation(coach=coach, student=student, status='approved', applied_by='student')
+            for coach, student in zip(coaches, students)
+        ])
+        relations = list(CoachStudentRelation.objects.filter(coach__in=coaches).select_related('student'))
+
+        start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        bookings = []
+        for number in range(count):
+            begin = start + timedelta(hours=number)
+            bookings.append(Booking(
+                relation=rng.choice(relations), table=rng.choice(tables),
+                start_time=begin, end_time=begin + timedelta(hours=1),
+                duration_hours=Decimal('1.0'), total_fee=Decimal('150.00'),
+                status=rng.choice(['pending', 'confirmed', 'completed']),
+            ))
+        Booking.objects.bulk_create(bookings, batch_size=1000)
+
+        # 约十分之一的预约有待处理的取消申请
+        bookings = Booking.objects.filter(table__campus=self.campus).select_related('relation__student')
+        BookingCancellation.objects.bulk_create([
+            BookingCancellation(booking=booking, requested_by=booking.relation.student, reason='临时有事')
+            for booking in bookings if rng.random() < 0.1
+        ], batch_size=1000)
+
+        # 批量写入不触发信号
+        occupancy_index.invalidate(self.campus.id)
+        schedule_cache.invalidate(*[user.id for user in coaches + students])
+
+    def nested(self, queryset):
+        started = time.perf_counter()
+        bookings = list(queryset)
+        fetched = time.perf_counter()
+        BookingSerializer(bookings, many=True).data
+        return fetched - started, time.perf_counter() - fetched
+
+    def flat(self, queryset):
+        started = time.perf_counter()
+        rows = list(BookingListSerializer.project(queryset))
+        fetched = time.perf_counter()
+        BookingListSerializer(rows).data
+        return fetched - started, time.perf_counter() - fetched
+
+    def measure(self, label, func, repeat):
+        query_total = serialize_total = 0
+        with CaptureQueriesContext(connection) as context:
+            for _ in range(repeat):
+                query_seconds, serialize_seconds = func()
+                query_total += query_seconds
+                serialize_total += serialize_seconds
+        self.stdout.write(
+            f'  {label}：查询 {query_total / repeat * 1000:.1f} ms，'
+            f'序列化 {serialize_total / repeat * 1000:.1f} ms，'
+            f'每次 {len(context.captured_queries) // repeat} 条SQL'
+        )
+
+    def cleanup(self):
+        campus = Campus.objects.filter(code=BENCHMARK_CAMPUS_CODE).first()
+        if campus:
+            campus_id = campus.id
+            # 删除校区时级联删除球台、预约和取消申请
+            campus.delete()
+            occupancy_index.invalidate(campus_id)
+        User.objects.filter(username__startswith=BENCHMARK_PREFIX).delete()
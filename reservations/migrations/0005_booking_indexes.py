@@ -0,0 +1,25 @@
+# Generated by Django 4.2.24 on 2026-10-18 09:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0004_booking_payment_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['table', 'start_time', 'end_time'], name='reservation_table_i_dd7c16_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['relation', 'start_time'], name='reservation_relatio_1b7863_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'start_time'], name='reservation_status_5dfd88_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.24 on 2026-10-18 09:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reservations', '0005_booking_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reminder_type', models.CharField(choices=[('24h', '提前24小时'), ('1h', '提前1小时'), ('10min', '提前10分钟')], max_length=10, verbose_name='提醒类型')),
+                ('run_token', models.CharField(max_length=32, verbose_name='发送批次')),
+                ('sent_at', models.DateTimeField(auto_now_add=True, verbose_name='发送时间')),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='reservations.booking', verbose_name='预约')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='class_reminders', to=settings.AUTH_USER_MODEL, verbose_name='接收人')),
+            ],
+            options={
+                'verbose_name': '上课提醒记录',
+                'verbose_name_plural': '上课提醒记录',
+                'db_table': 'reservations_class_reminder',
+                'indexes': [models.Index(fields=['run_token'], name='reservation_run_tok_97d740_idx')],
+                'unique_together': {('booking', 'recipient', 'reminder_type')},
+            },
+        ),
+    ]
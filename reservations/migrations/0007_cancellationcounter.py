@@ -0,0 +1,51 @@
+# Generated by Django 4.2.24 on 2026-10-18 11:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from datetime import timezone as dt_timezone
+
+
+def backfill_cancellation_counters(apps, schema_editor):
+    """按已取消预约的 cancelled_by、cancelled_at（UTC 月份）统计历史取消次数"""
+    from django.db.models import Count
+    from django.db.models.functions import TruncMonth
+
+    Booking = apps.get_model('reservations', 'Booking')
+    CancellationCounter = apps.get_model('reservations', 'CancellationCounter')
+    rows = Booking.objects.filter(
+        cancelled_by__isnull=False, cancelled_at__isnull=False
+    ).annotate(
+        month=TruncMonth('cancelled_at', tzinfo=dt_timezone.utc)
+    ).values('cancelled_by', 'month').annotate(count=Count('id')).order_by()
+    CancellationCounter.objects.bulk_create([
+        CancellationCounter(user_id=row['cancelled_by'], month=row['month'].date(), count=row['count'])
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reservations', '0006_classreminder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CancellationCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='月份')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='取消次数')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cancellation_counters', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '月取消次数',
+                'verbose_name_plural': '月取消次数',
+                'db_table': 'reservations_cancellation_counter',
+                'unique_together': {('user', 'month')},
+            },
+        ),
+        migrations.RunPython(backfill_cancellation_counters, migrations.RunPython.noop),
+    ]
@@ -242,6 +242,11 @@ class Booking(models.Model):
         verbose_name_plural = '预约'
         db_table = 'reservations_booking'
         ordering = ['-start_time']
+        indexes = [
+            models.Index(fields=['table', 'start_time', 'end_time']),
+            models.Index(fields=['relation', 'start_time']),
+            models.Index(fields=['status', 'start_time']),
+        ]
     
     def __str__(self):
         return f"{self.relation} - {self.start_time.strftime('%Y-%m-%d %H:%M')}"
@@ -256,8 +261,8 @@ class Booking(models.Model):
         """获取学员"""
         return self.relation.student
     
-    def can_cancel(self, user):
-        """检查是否可以取消预约"""
+    def can_cancel(self, user, monthly_cancel_count=None):
+        """检查是否可以取消预约；monthly_cancel_count 为已查出的本月取消次数（批量检查时传入）"""
         if self.status not in ['pending', 'confirmed']:
             return False, '预约状态不允许取消'
         
@@ -267,21 +272,17 @@ class Booking(models.Model):
         if time_diff.total_seconds() < 24 * 3600:
             return False, '距离上课时间不足24小时，无法取消'
         
-        # 检查用户权限
-        if user not in [self.coach, self.student]:
+        # 检查用户权限（只比较ID，不加载教练和学员）
+        if user.pk not in (self.relation.coach_id, self.relation.student_id):
             return False, '只有教练或学员可以取消预约'
         
         # 检查本月取消次数
-        from django.db.models import Q
-        current_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        cancel_count = Booking.objects.filter(
-            Q(relation__coach=user) | Q(relation__student=user),
-            cancelled_at__gte=current_month,
-            cancelled_by=user
-        ).count()
+        from . import cancel_quota
+        if monthly_cancel_count is None:
+            monthly_cancel_count = cancel_quota.monthly_count(user)
         
-        if cancel_count >= 3:
-            return False, '本月取消次数已达上限(3次)'
+        if monthly_cancel_count >= cancel_quota.MAX_MONTHLY_CANCELS:
+            return False, f'本月取消次数已达上限({cancel_quota.MAX_MONTHLY_CANCELS}次)'
         
         return True, '可以取消'
     
@@ -295,10 +296,10 @@ class Booking(models.Model):
             return self.cancellation.status
         return None
     
-    def can_be_cancelled_by(self, user):
+    def can_be_cancelled_by(self, user, monthly_cancel_count=None):
         """检查指定用户是否可以取消此预约（考虑取消申请流程）"""
         # 基本的取消检查
-        can_cancel, message = self.can_cancel(user)
+        can_cancel, message = self.can_cancel(user, monthly_cancel_count)
         if not can_cancel:
             return False, message
         
@@ -368,3 +369,76 @@ class BookingCancellation(models.Model):
     
     def __str__(self):
         return f"预约{self.booking.id} - 取消申请"
+
+
+class ClassReminder(models.Model):
+    """上课提醒发送记录，用于保证同一预约、同一接收人、同一类型的提醒只发送一次"""
+    REMINDER_TYPE_CHOICES = [
+        ('24h', '提前24小时'),
+        ('1h', '提前1小时'),
+        ('10min', '提前10分钟'),
+    ]
+    
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name='reminders',
+        verbose_name='预约'
+    )
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='class_reminders',
+        verbose_name='接收人'
+    )
+    reminder_type = models.CharField(
+        max_length=10,
+        choices=REMINDER_TYPE_CHOICES,
+        verbose_name='提醒类型'
+    )
+    run_token = models.CharField(
+        max_length=32,
+        verbose_name='发送批次'
+    )
+    sent_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='发送时间'
+    )
+    
+    class Meta:
+        verbose_name = '上课提醒记录'
+        verbose_name_plural = '上课提醒记录'
+        db_table = 'reservations_class_reminder'
+        unique_together = ['booking', 'recipient', 'reminder_type']
+        indexes = [
+            models.Index(fields=['run_token']),
+        ]
+    
+    def __str__(self):
+        return f"预约{self.booking_id} - {self.get_reminder_type_display()} - {self.recipient_id}"
+
+
+class CancellationCounter(models.Model):
+    """用户每月取消预约次数（按 cancelled_by 统计），由 reservations.cancel_quota 维护"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='cancellation_counters',
+        verbose_name='用户'
+    )
+    month = models.DateField(
+        verbose_name='月份'
+    )
+    count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='取消次数'
+    )
+    
+    class Meta:
+        verbose_name = '月取消次数'
+        verbose_name_plural = '月取消次数'
+        db_table = 'reservations_cancellation_counter'
+        unique_together = ['user', 'month']
+    
+    def __str__(self):
+        return f"{self.user} - {self.month:%Y-%m}: {self.count}"
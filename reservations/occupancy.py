@@ -0,0 +1,356 @@
+"""
+球台占用内存索引
+
+按校区维护有效预约（待确认/已确认）的时间区间，供 available_tables 等高频接口
+在不访问数据库的情况下判断球台是否空闲。
+
+- 索引按校区懒加载：首次查询某校区时走数据库，随后构建该校区的索引
+- 通过 Booking / Table 的信号在事务提交后增量更新
+- 多进程部署时借助 Django 缓存中的版本号发现其他进程的写入，版本不一致即视为冷索引
+  （缓存必须在进程间共享，见 keshe.cache_versions.check_shared_cache）
+- check_consistency 用于比对索引与数据库中的数据
+"""
+import bisect
+import logging
+import threading
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+# 占用球台的预约状态
+ACTIVE_BOOKING_STATUSES = ('pending', 'confirmed')
+
+# 索引只收录结束时间晚于 (构建时间 - 回溯窗口) 的预约，更早的查询回退到数据库
+INDEX_LOOKBACK = timedelta(days=1)
+
+VERSION_CACHE_KEY = 'reservations:occupancy:campus:{campus_id}:version'
+
+
+def _version_key(campus_id):
+    return VERSION_CACHE_KEY.format(campus_id=campus_id)
+
+
+def _aware(value):
+    """统一转换为带时区的时间，与数据库查询时的时区处理保持一致"""
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if timezone.is_naive(value):
+        return timezone.make_aware(value)
+    return value
+
+
+class CampusOccupancy:
+    """单个校区的占用数据"""
+
+    def __init__(self, campus_id, horizon, version):
+        self.campus_id = campus_id
+        self.horizon = horizon
+        self.version = version
+        # table_id -> 序列化后的球台数据
+        self.tables = {}
+        # table_id -> 按开始时间排序的 (start, end, booking_id) 列表
+        self.intervals = {}
+        # booking_id -> (table_id, start, end)
+        self.bookings = {}
+        # 已收录预约的最大时长，用于限定向前扫描的范围
+        self.max_duration = timedelta(0)
+
+    def set_table(self, table_id, data):
+        self.tables[table_id] = data
+        self.intervals.setdefault(table_id, [])
+
+    def remove_table(self, table_id):
+        self.tables.pop(table_id, None)
+        for _, _, booking_id in self.intervals.pop(table_id, []):
+            self.bookings.pop(booking_id, None)
+
+    def add_booking(self, booking_id, table_id, start, end):
+        self.remove_booking(booking_id)
+        if table_id not in self.tables or end <= self.horizon:
+            return
+        bisect.insort(self.intervals.setdefault(table_id, []), (start, end, booking_id))
+        self.bookings[booking_id] = (table_id, start, end)
+        if end - start > self.max_duration:
+            self.max_duration = end - start
+
+    def remove_booking(self, booking_id):
+        entry = self.bookings.pop(booking_id, None)
+        if entry is None:
+            return
+        table_id, start, end = entry
+        intervals = self.intervals.get(table_id, [])
+        position = bisect.bisect_left(intervals, (start, end, booking_id))
+        if position < len(intervals) and intervals[position][2] == booking_id:
+            del intervals[position]
+
+    def is_occupied(self, table_id, start, end):
+        """判断球台在 [start, end) 内是否有重叠预约"""
+        intervals = self.intervals.get(table_id)
+        if not intervals:
+            return False
+        # 开始时间早于 end 的区间才可能重叠，从后往前扫描
+        position = bisect.bisect_left(intervals, (end,))
+        earliest_start = start - self.max_duration
+        for index in range(position - 1, -1, -1):
+            booking_start, booking_end, _ = intervals[index]
+            if booking_start < earliest_start:
+                break
+            if booking_end > start:
+                return True
+        return False
+
+    def available_tables(self, start, end):
+        """返回空闲且可用的球台数据，按球台编号排序"""
+        result = [
+            data for table_id, data in self.tables.items()
+            if data.get('is_active') and data.get('status') == 'available'
+            and not self.is_occupied(table_id, start, end)
+        ]
+        result.sort(key=lambda data: data['number'])
+        return result
+
+    def occupied_table_ids(self, start, end):
+        return {
+            table_id for table_id in self.tables
+            if self.is_occupied(table_id, start, end)
+        }
+
+
+class OccupancyIndex:
+    """进程内的校区球台占用索引"""
+
+    def __init__(self):
+        self._campuses = {}
+        # table_id -> campus_id，用于在信号中定位校区而无需查询数据库
+        self._table_campus = {}
+        self._lock = threading.RLock()
+
+    # ---------- 构建与失效 ----------
+
+    def build(self, campus_id):
+        """从数据库构建指定校区的索引"""
+        from .models import Booking, Table
+        from .serializers import TableSerializer
+
+        campus_id = int(campus_id)
+        version = cache.get(_version_key(campus_id), 0)
+        horizon = timezone.now() - INDEX_LOOKBACK
+        occupancy = CampusOccupancy(campus_id, horizon, version)
+
+        for table in Table.objects.filter(campus_id=campus_id):
+            occupancy.set_table(table.id, TableSerializer(table).data)
+
+        bookings = Booking.objects.filter(
+            table__campus_id=campus_id,
+            status__in=ACTIVE_BOOKING_STATUSES,
+            end_time__gt=horizon
+        ).values_list('id', 'table_id', 'start_time', 'end_time')
+        for booking_id, table_id, start, end in bookings:
+            occupancy.add_booking(booking_id, table_id, start, end)
+
+        with self._lock:
+            self._drop(campus_id)
+            self._campuses[campus_id] = occupancy
+            for table_id in occupancy.tables:
+                self._table_campus[table_id] = campus_id
+        logger.debug(f"Built occupancy index for campus {campus_id}: "
+                     f"{len(occupancy.tables)} tables, {len(occupancy.bookings)} bookings")
+        return occupancy
+
+    def invalidate(self, campus_id=None):
+        """使指定校区（或全部校区）的索引失效，并通知其他进程"""
+        with self._lock:
+            if campus_id is None:
+                campus_ids = list(self._campuses)
+                self._campuses.clear()
+                self._table_campus.clear()
+            else:
+                campus_ids = [int(campus_id)]
+                self._drop(int(campus_id))
+        for cid in campus_ids:
+            self._bump_version(cid)
+
+    def clear(self):
+        """清空本进程的索引（不通知其他进程）"""
+        with self._lock:
+            self._campuses.clear()
+            self._table_campus.clear()
+
+    def is_warm(self, campus_id):
+        return self._get_current(campus_id) is not None
+
+    def _drop(self, campus_id):
+        occupancy = self._campuses.pop(campus_id, None)
+        if occupancy is not None:
+            for table_id in occupancy.tables:
+                self._table_campus.pop(table_id, None)
+
+    def _get_current(self, campus_id):
+        """获取校区索引，若其他进程已修改数据则视为冷索引"""
+        try:
+            campus_id = int(campus_id)
+        except (TypeError, ValueError):
+            return None
+        occupancy = self._campuses.get(campus_id)
+        if occupancy is None:
+            return None
+        if cache.get(_version_key(campus_id), 0) != occupancy.version:
+            with self._lock:
+                if self._campuses.get(campus_id) is occupancy:
+                    self._drop(campus_id)
+            return None
+        return occupancy
+
+    def _bump_version(self, campus_id):
+        key = _version_key(campus_id)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # 键不存在时初始化；并发初始化的情况下由 add 保证只有一个成功
+            if cache.add(key, 1, timeout=None):
+                return 1
+            return cache.incr(key)
+
+    def _apply_local_change(self, campus_id, change):
+        """在本进程索引上应用修改并同步版本号"""
+        new_version = self._bump_version(campus_id)
+        with self._lock:
+            occupancy = self._campuses.get(campus_id)
+            if occupancy is None:
+                return
+            if new_version != occupancy.version + 1:
+                # 期间还有其他进程写入，本地数据已不可信
+                self._drop(campus_id)
+                return
+            change(occupancy)
+            occupancy.version = new_version
+
+    # ---------- 查询 ----------
+
+    def available_tables(self, campus_id, start_time, end_time):
+        """
+        返回空闲球台的序列化数据列表。
+        索引未构建、已过期或查询时间早于索引覆盖范围时返回 None，由调用方回退到数据库查询。
+        """
+        occupancy = self._get_current(campus_id)
+        if occupancy is None:
+            return None
+        start_time = _aware(start_time)
+        end_time = _aware(end_time)
+        if start_time < occupancy.horizon:
+            return None
+        return occupancy.available_tables(start_time, end_time)
+
+    def occupied_table_ids(self, campus_id, start_time, end_time):
+        occupancy = self._get_current(campus_id)
+        if occupancy is None:
+            return None
+        start_time = _aware(start_time)
+        end_time = _aware(end_time)
+        if start_time < occupancy.horizon:
+            return None
+        return occupancy.occupied_table_ids(start_time, end_time)
+
+    # ---------- 信号回调 ----------
+
+    def campus_of_table(self, table_id):
+        return self._table_campus.get(table_id)
+
+    def booking_saved(self, booking_id, table_id, campus_id, start_time, end_time, status):
+        previous = self._campus_of_booking(booking_id)
+        if previous is not None and previous != campus_id:
+            self._apply_local_change(previous, lambda occupancy: occupancy.remove_booking(booking_id))
+
+        def change(occupancy):
+            if status in ACTIVE_BOOKING_STATUSES:
+                occupancy.add_booking(booking_id, table_id, _aware(start_time), _aware(end_time))
+            else:
+                occupancy.remove_booking(booking_id)
+        self._apply_local_change(campus_id, change)
+
+    def booking_deleted(self, booking_id, campus_id):
+        self._apply_local_change(campus_id, lambda occupancy: occupancy.remove_booking(booking_id))
+
+    def table_saved(self, table_id, campus_id, data):
+        previous = self._table_campus.get(table_id)
+        if previous is not None and previous != campus_id:
+            self.table_deleted(table_id)
+
+        def change(occupancy):
+            occupancy.set_table(table_id, data)
+            self._table_campus[table_id] = campus_id
+        self._apply_local_change(campus_id, change)
+
+    def table_deleted(self, table_id, campus_id=None):
+        campus_id = campus_id or self._table_campus.get(table_id)
+        if campus_id is None:
+            return
+
+        def change(occupancy):
+            occupancy.remove_table(table_id)
+            self._table_campus.pop(table_id, None)
+        self._apply_local_change(campus_id, change)
+
+    def _campus_of_booking(self, booking_id):
+        for campus_id, occupancy in list(self._campuses.items()):
+            if booking_id in occupancy.bookings:
+                return campus_id
+        return None
+
+    # ---------- 一致性检查 ----------
+
+    def check_consistency(self, campus_id):
+        """
+        比对索引与数据库，返回差异列表；索引未构建时返回 None。
+        每条差异为 dict：{'type': ..., 'booking_id'/'table_id': ..., 'index': ..., 'database': ...}
+        """
+        from .models import Booking, Table
+
+        occupancy = self._get_current(campus_id)
+        if occupancy is None:
+            return None
+
+        mismatches = []
+        db_tables = {
+            table_id: (status, is_active)
+            for table_id, status, is_active in Table.objects.filter(
+                campus_id=occupancy.campus_id
+            ).values_list('id', 'status', 'is_active')
+        }
+        for table_id in set(db_tables) | set(occupancy.tables):
+            index_data = occupancy.tables.get(table_id)
+            index_entry = (index_data['status'], index_data['is_active']) if index_data else None
+            if index_entry != db_tables.get(table_id):
+                mismatches.append({
+                    'type': 'table',
+                    'table_id': table_id,
+                    'index': index_entry,
+                    'database': db_tables.get(table_id),
+                })
+
+        db_bookings = {
+            booking_id: (table_id, start, end)
+            for booking_id, table_id, start, end in Booking.objects.filter(
+                table__campus_id=occupancy.campus_id,
+                status__in=ACTIVE_BOOKING_STATUSES,
+                end_time__gt=occupancy.horizon
+            ).values_list('id', 'table_id', 'start_time', 'end_time')
+        }
+        for booking_id in set(db_bookings) | set(occupancy.bookings):
+            index_entry = occupancy.bookings.get(booking_id)
+            db_entry = db_bookings.get(booking_id)
+            if index_entry != db_entry:
+                mismatches.append({
+                    'type': 'booking',
+                    'booking_id': booking_id,
+                    'index': index_entry,
+                    'database': db_entry,
+                })
+        return mismatches
+
+
+occupancy_index = OccupancyIndex()
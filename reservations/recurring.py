@@ -0,0 +1,182 @@
+"""
+周期性预约
+
+学员按学期预约每周固定时段时，按规则展开全部课次，在一个事务里：
+对球台和教练加锁后一次查询检查全部课次的冲突、按总费用检查一次余额、
+bulk_create 写入全部预约，并只给教练发送一条汇总通知。
+
+规则有两种写法：
+    简单规则：start_date、weekday（0=周一）、count
+    RRULE：如 FREQ=WEEKLY;BYDAY=MO,WE;COUNT=16 或 FREQ=WEEKLY;INTERVAL=2;UNTIL=20270115，
+           支持 FREQ（DAILY/WEEKLY）、INTERVAL、BYDAY、COUNT、UNTIL，COUNT 与 UNTIL 至少指定一个
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import schedule_cache
+from .conflicts import lock_booking_resources
+from .occupancy import ACTIVE_BOOKING_STATUSES, occupancy_index
+
+MAX_OCCURRENCES = 52
+WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+
+class RecurrenceError(ValueError):
+    pass
+
+
+def parse_rrule(spec):
+    """解析 RRULE 字符串，返回 occurrence_dates 的关键字参数"""
+    parts = {}
+    for item in spec.strip().upper().split(';'):
+        if not item:
+            continue
+        name, _, value = item.partition('=')
+        if not value:
+            raise RecurrenceError(f'无效的规则项: {item}')
+        parts[name] = value
+
+    unknown = set(parts) - {'FREQ', 'INTERVAL', 'BYDAY', 'COUNT', 'UNTIL'}
+    if unknown:
+        raise RecurrenceError(f'不支持的规则项: {", ".join(sorted(unknown))}')
+    if parts.get('FREQ') not in ('DAILY', 'WEEKLY'):
+        raise RecurrenceError('FREQ 仅支持 DAILY 或 WEEKLY')
+
+    try:
+        options = {
+            'freq': parts['FREQ'],
+            'interval': int(parts.get('INTERVAL', 1)),
+            'count': int(parts['COUNT']) if 'COUNT' in parts else None,
+            'until': datetime.strptime(parts['UNTIL'][:8], '%Y%m%d').date() if 'UNTIL' in parts else None,
+        }
+    except ValueError:
+        raise RecurrenceError('INTERVAL、COUNT 必须为整数，UNTIL 格式为 YYYYMMDD')
+    if 'BYDAY' in parts:
+        try:
+            options['weekdays'] = [WEEKDAYS.index(day) for day in parts['BYDAY'].split(',')]
+        except ValueError:
+            raise RecurrenceError('BYDAY 仅支持 MO,TU,WE,TH,FR,SA,SU')
+    return options
+
+
+def occurrence_dates(start_date, freq='WEEKLY', interval=1, weekdays=None, count=None, until=None):
+    """
+    从 start_date 起按规则展开上课日期。WEEKLY 未指定 weekdays 时为 start_date 所在的星期几；
+    课次超过 MAX_OCCURRENCES 时抛出 RecurrenceError。
+    """
+    if count is None and until is None:
+        raise RecurrenceError('必须指定课次数或结束日期')
+    if interval < 1 or (count is not None and count < 1):
+        raise RecurrenceError('间隔和课次数必须大于0')
+    if count is not None and count > MAX_OCCURRENCES:
+        raise RecurrenceError(f'课次数不能超过{MAX_OCCURRENCES}')
+
+    if freq == 'DAILY':
+        step, weekdays = timedelta(days=interval), None
+    else:
+        step = timedelta(weeks=interval)
+        weekdays = sorted(set(weekdays)) if weekdays else [start_date.weekday()]
+
+    dates = []
+    period_start = start_date - timedelta(days=start_date.weekday()) if weekdays else start_date
+    while True:
+        if weekdays:
+            candidates = [period_start + timedelta(days=day) for day in weekdays]
+        else:
+            candidates = [period_start]
+        for date in candidates:
+            if date < start_date:
+                continue
+            if (until is not None and date > until) or (count is not None and len(dates) >= count):
+                return dates
+            if len(dates) >= MAX_OCCURRENCES:
+                raise RecurrenceError(f'课次数不能超过{MAX_OCCURRENCES}')
+            dates.append(date)
+        period_start += step
+
+
+def build_slots(dates, start_time, end_time):
+    """上课日期 + 每天的起止时间 -> [(开始时间, 结束时间)]"""
+    if end_time <= start_time:
+        raise RecurrenceError('开始时间必须早于结束时间')
+    return [
+        (
+            timezone.make_aware(datetime.combine(date, start_time)),
+            timezone.make_aware(datetime.combine(date, end_time)),
+        )
+        for date in dates
+    ]
+
+
+def find_conflicts(table_id, coach_id, slots):
+    """
+    一次查询取出覆盖全部课次时间范围内同球台或同教练的有效预约，逐个课次检查重叠。
+    返回冲突列表 [{'start_time', 'end_time', 'type', 'booking_id'}]，type 为 'table' 或 'coach'。
+    """
+    from .models import Booking
+
+    if not slots:
+        return []
+    existing = list(Booking.objects.filter(
+        Q(table_id=table_id) | Q(relation__coach_id=coach_id),
+        status__in=ACTIVE_BOOKING_STATUSES,
+        start_time__lt=max(end for _, end in slots),
+        end_time__gt=min(start for start, _ in slots)
+    ).order_by('start_time').values_list('id', 'table_id', 'start_time', 'end_time'))
+
+    conflicts = []
+    for start, end in slots:
+        for booking_id, booking_table_id, booking_start, booking_end in existing:
+            if booking_start >= end:
+                break
+            if booking_end > start:
+                conflicts.append({
+                    'start_time': start,
+                    'end_time': end,
+                    'type': 'table' if booking_table_id == table_id else 'coach',
+                    'booking_id': booking_id,
+                })
+                break
+    return conflicts
+
+
+def create_recurring_bookings(relation, table, slots, fee_per_lesson, notes=None):
+    """
+    在一个事务内创建全部课次的预约，返回 (预约列表, 冲突列表)。
+    有任何冲突时不创建预约；必须在事务内调用，以便与余额检查在同一事务。
+    """
+    from .models import Booking
+
+    lock_booking_resources(table_ids=[table.id], coach_ids=[relation.coach_id])
+    conflicts = find_conflicts(table.id, relation.coach_id, slots)
+    if conflicts:
+        return [], conflicts
+
+    Booking.objects.bulk_create([
+        Booking(
+            relation=relation,
+            table=table,
+            start_time=start,
+            end_time=end,
+            duration_hours=(Decimal((end - start).total_seconds()) / 3600).quantize(Decimal('0.1')),
+            total_fee=fee_per_lesson,
+            notes=notes,
+        )
+        for start, end in slots
+    ])
+    # MySQL 的 bulk_create 不回填主键，重新查询刚创建的预约
+    bookings = list(Booking.objects.filter(
+        relation=relation, table=table, status='pending',
+        start_time__in=[start for start, _ in slots]
+    ).order_by('start_time'))
+
+    # bulk_create 不触发信号，提交后手动刷新球台占用索引和课表缓存
+    campus_id = table.campus_id
+    coach_id, student_id = relation.coach_id, relation.student_id
+    transaction.on_commit(lambda: occupancy_index.invalidate(campus_id))
+    transaction.on_commit(lambda: schedule_cache.invalidate(coach_id, student_id))
+    return bookings, conflicts
@@ -0,0 +1,120 @@
+"""
+上课提醒
+
+每次运行用一次查询取出未来 24 小时内开始的已确认预约，按距开课时间落入的区间
+确定提醒类型（24h / 1h / 10min），再：
+1. 以本次运行的批次号 bulk_create(ignore_conflicts=True) 写入 ClassReminder 发送记录，
+   (booking, recipient, reminder_type) 唯一约束保证同一提醒只记录一次；
+2. 按批次号取回本次真正写入的记录，只为这些记录批量写入通知发件箱。
+多个调度进程同时运行时也不会重复提醒。
+"""
+import logging
+import uuid
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from notifications.outbox import enqueue_batch
+
+from .models import Booking, ClassReminder
+
+logger = logging.getLogger(__name__)
+
+# (提醒类型, 提前量, 文案)，按提前量从大到小排列
+REMINDER_OFFSETS = [
+    ('24h', timedelta(hours=24), '24小时内'),
+    ('1h', timedelta(hours=1), '一小时内'),
+    ('10min', timedelta(minutes=10), '10分钟内'),
+]
+
+
+def reminder_type_for(remaining):
+    """
+    根据距开课的剩余时间确定提醒类型：
+    剩余时间落在 (下一档提前量, 本档提前量] 内时发送本档提醒，已开课返回 None。
+    """
+    if remaining <= timedelta(0):
+        return None
+    matched = None
+    for reminder_type, offset, _ in REMINDER_OFFSETS:
+        if remaining <= offset:
+            matched = reminder_type
+    return matched
+
+
+def _display_name(user):
+    return user.real_name or user.username
+
+
+def _build_notifications(booking, reminder_type):
+    label = dict((item[0], item[2]) for item in REMINDER_OFFSETS)[reminder_type]
+    coach = booking.relation.coach
+    student = booking.relation.student
+    start = timezone.localtime(booking.start_time).strftime('%Y-%m-%d %H:%M')
+    base_data = {
+        'booking_id': booking.id,
+        'type': 'class_reminder',
+        'reminder_type': reminder_type,
+        'table_name': booking.table.name,
+        'start_time': booking.start_time.isoformat(),
+    }
+    return {
+        student.id: {
+            'recipient': student.id,
+            'title': '上课提醒',
+            'message': f"您预约的课程将在{label}开始。教练：{_display_name(coach)}，球台：{booking.table.name}，时间：{start}",
+            'message_type': 'booking',
+            'data': {**base_data, 'coach_name': _display_name(coach)},
+        },
+        coach.id: {
+            'recipient': coach.id,
+            'title': '上课提醒',
+            'message': f"您的课程将在{label}开始。学员：{_display_name(student)}，球台：{booking.table.name}，时间：{start}",
+            'message_type': 'booking',
+            'data': {**base_data, 'student_name': _display_name(student)},
+        },
+    }
+
+
+def send_due_reminders(now=None):
+    """发送到期的上课提醒，返回本次新发送的提醒数量"""
+    now = now or timezone.now()
+    max_offset = REMINDER_OFFSETS[0][1]
+
+    bookings = list(Booking.objects.filter(
+        status='confirmed',
+        start_time__gt=now,
+        start_time__lte=now + max_offset
+    ).select_related('relation__coach', 'relation__student', 'table'))
+    if not bookings:
+        return 0
+
+    run_token = uuid.uuid4().hex
+    candidates = []
+    payloads = {}
+    for booking in bookings:
+        reminder_type = reminder_type_for(booking.start_time - now)
+        if reminder_type is None:
+            continue
+        notifications = _build_notifications(booking, reminder_type)
+        for recipient_id, payload in notifications.items():
+            candidates.append(ClassReminder(
+                booking_id=booking.id,
+                recipient_id=recipient_id,
+                reminder_type=reminder_type,
+                run_token=run_token
+            ))
+            payloads[(booking.id, recipient_id, reminder_type)] = payload
+
+    with transaction.atomic():
+        ClassReminder.objects.bulk_create(candidates, ignore_conflicts=True)
+        claimed = ClassReminder.objects.filter(run_token=run_token).values_list(
+            'booking_id', 'recipient_id', 'reminder_type'
+        )
+        items = [payloads[key] for key in claimed]
+        enqueue_batch(items)
+
+    if items:
+        logger.info(f"Queued {len(items)} class reminders (run {run_token})")
+    return len(items)
@@ -0,0 +1,123 @@
+"""
+课表缓存
+
+get_my_schedule 按周缓存每个用户（教练/学员）的课表：每周一个缓存项，内容是该周预约
+按开始时间倒序排列的 (开始时间戳, 序列化后的 JSON 片段) 列表。查询任意日期范围时
+取范围内各周的缓存项，按开始时间过滤后直接拼接 JSON，已缓存的周不再查询和序列化；
+未缓存的周合并为一次查询。
+
+缓存键带用户的版本号：预约或取消申请变化时（事务提交后）递增教练和学员的版本号，
+旧版本的缓存项随过期时间淘汰。用户姓名、球台编号等关联数据的变化不触发失效，
+最多延迟 CACHE_TIMEOUT 秒。
+
+命中/未命中按周计数，保存在缓存中，可通过 schedule_cache_stats 接口查看。
+"""
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from keshe import cache_versions
+
+CACHE_TIMEOUT = 300
+# 超过该周数的日期范围不使用缓存
+MAX_WEEKS = 26
+
+VERSION_CACHE_KEY = 'reservations:schedule:{user_id}:version'
+WEEK_CACHE_KEY = 'reservations:schedule:{user_id}:{version}:{week}'
+HITS_CACHE_KEY = 'reservations:schedule:hits'
+MISSES_CACHE_KEY = 'reservations:schedule:misses'
+
+
+def week_start(value):
+    """时间所在周的周一（本地时区）"""
+    date = timezone.localtime(value).date()
+    return date - timedelta(days=date.weekday())
+
+
+def _week_range(week):
+    start = timezone.make_aware(datetime.combine(week, datetime.min.time()))
+    return start, start + timedelta(days=7)
+
+
+def get_version(user_id):
+    return cache_versions.get_version(VERSION_CACHE_KEY.format(user_id=user_id))
+
+
+def invalidate(*user_ids):
+    """使用户的全部周缓存失效"""
+    cache_versions.bump(*(VERSION_CACHE_KEY.format(user_id=user_id) for user_id in set(user_ids) if user_id))
+
+
+def _count(key, delta):
+    if not delta:
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key, delta)
+
+
+def get_stats():
+    hits = cache.get(HITS_CACHE_KEY, 0)
+    misses = cache.get(MISSES_CACHE_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_CACHE_KEY, MISSES_CACHE_KEY])
+
+
+def _build_weeks(queryset, weeks, serializer_class, context):
+    """查询并序列化若干周的预约，返回 {周一: [(开始时间戳, JSON 片段)]}"""
+    range_start, _ = _week_range(min(weeks))
+    _, range_end = _week_range(max(weeks))
+    bookings = queryset.filter(start_time__gte=range_start, start_time__lt=range_end).order_by('-start_time', '-id')
+
+    renderer = JSONRenderer()
+    entries = {week: [] for week in weeks}
+    for booking, data in zip(bookings, serializer_class(bookings, many=True, context=context).data):
+        week = week_start(booking.start_time)
+        if week in entries:
+            entries[week].append((booking.start_time.timestamp(), renderer.render(data).decode()))
+    return entries
+
+
+def schedule_fragments(user_id, queryset, start, end, serializer_class, context=None):
+    """
+    返回 [start, end] 内预约的 JSON 片段列表（按开始时间倒序），
+    日期范围超过 MAX_WEEKS 周时返回 None，由调用方直接查询。
+    """
+    first, last = week_start(start), week_start(end)
+    if (last - first).days // 7 + 1 > MAX_WEEKS:
+        return None
+    weeks = [last - timedelta(weeks=offset) for offset in range((last - first).days // 7 + 1)]
+
+    version = get_version(user_id)
+    keys = {week: WEEK_CACHE_KEY.format(user_id=user_id, version=version, week=week.isoformat()) for week in weeks}
+    cached = cache.get_many(list(keys.values()))
+    entries = {week: cached[keys[week]] for week in weeks if keys[week] in cached}
+
+    missing = [week for week in weeks if week not in entries]
+    _count(HITS_CACHE_KEY, len(entries))
+    _count(MISSES_CACHE_KEY, len(missing))
+    if missing:
+        built = _build_weeks(queryset, missing, serializer_class, context)
+        # 查询范围可能覆盖了已缓存的周，只写入未命中的周
+        cache.set_many({keys[week]: built[week] for week in missing}, CACHE_TIMEOUT)
+        entries.update(built)
+
+    start_ts, end_ts = start.timestamp(), end.timestamp()
+    return [
+        fragment
+        for week in weeks
+        for timestamp, fragment in entries[week]
+        if start_ts <= timestamp <= end_ts
+    ]
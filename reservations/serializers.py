@@ -1,7 +1,13 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
 from .models import CoachStudentRelation, Table, Booking
 from .coach_change_models import CoachChangeRequest
+from .conflicts import lock_booking_resources, find_conflict
+from . import recurring
 from accounts.serializers import UserSerializer
 
 User = get_user_model()
@@ -68,7 +74,7 @@ class CoachStudentRelationSerializer(serializers.ModelSerializer):
         # 发送通知给教练
         from notifications.models import Notification
         try:
-            Notification.create_notification(
+            Notification.enqueue_notification(
                 recipient=coach,
                 sender=student,
                 title="新的学员申请",
@@ -165,14 +171,30 @@ class BookingSerializer(serializers.ModelSerializer):
             validated_data['relation_id'] = validated_data.pop('relation_id')
         if 'table_id' in validated_data:
             validated_data['table_id'] = validated_data.pop('table_id')
-        
-        # 创建预约
-        booking = super().create(validated_data)
+
+        with transaction.atomic():
+            # 锁定球台和教练后检查时间冲突，防止并发重复预约
+            table_id = validated_data.get('table_id')
+            coach_id = CoachStudentRelation.objects.filter(
+                id=validated_data.get('relation_id')
+            ).values_list('coach_id', flat=True).first()
+            lock_booking_resources(table_ids=[table_id], coach_ids=[coach_id] if coach_id else [])
+
+            conflict_type, _ = find_conflict(
+                table_id, coach_id, validated_data['start_time'], validated_data['end_time']
+            )
+            if conflict_type == 'table':
+                raise serializers.ValidationError('该球台在所选时间段已被预约')
+            if conflict_type == 'coach':
+                raise serializers.ValidationError('教练在所选时间段已有其他预约')
+
+            # 创建预约
+            booking = super().create(validated_data)
         
         # 发送通知给教练
         from notifications.models import Notification
         try:
-            Notification.create_notification(
+            Notification.enqueue_notification(
                 recipient=booking.relation.coach,
                 sender=booking.relation.student,
                 title="新的预约申请",
@@ -208,6 +230,152 @@ class BookingSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
+class BookingListSerializer:
+    """
+    预约列表的只读序列化（扁平结构）
+
+    用 .values() 一次查询取出需要的列，逐行组装扁平的字典，不实例化模型、
+    不经过 SerializerMethodField，教练/学员/球台信息各只输出一次。
+    列表接口传 shape=flat 时使用，响应中附带 shape 和 version，
+    字段有不兼容的调整时递增 VERSION。
+    """
+    SHAPE = 'flat'
+    VERSION = 1
+
+    # 输出字段 -> 查询路径
+    FIELDS = {
+        'id': 'id',
+        'status': 'status',
+        'payment_status': 'payment_status',
+        'start_time': 'start_time',
+        'end_time': 'end_time',
+        'duration_hours': 'duration_hours',
+        'total_fee': 'total_fee',
+        'notes': 'notes',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+        'relation_id': 'relation_id',
+        'coach_id': 'relation__coach_id',
+        'coach_name': 'relation__coach__real_name',
+        'coach_username': 'relation__coach__username',
+        'student_id': 'relation__student_id',
+        'student_name': 'relation__student__real_name',
+        'student_username': 'relation__student__username',
+        'table_id': 'table_id',
+        'table_number': 'table__number',
+        'campus_id': 'table__campus_id',
+        'campus_name': 'table__campus__name',
+        'cancellation_id': 'cancellation__id',
+        'cancellation_status': 'cancellation__status',
+        'cancellation_reason': 'cancellation__reason',
+        'cancellation_requested_by_id': 'cancellation__requested_by_id',
+        'cancellation_requested_by_name': 'cancellation__requested_by__real_name',
+        'cancellation_requested_by_username': 'cancellation__requested_by__username',
+        'cancellation_requested_at': 'cancellation__created_at',
+    }
+    DATETIME_FIELDS = ('start_time', 'end_time', 'created_at', 'updated_at')
+    DECIMAL_FIELDS = ('duration_hours', 'total_fee')
+    CANCELLATION_FIELDS = (
+        'cancellation_id', 'cancellation_reason', 'cancellation_requested_by_id',
+        'cancellation_requested_at'
+    )
+
+    def __init__(self, rows):
+        # rows 为 project() 返回的查询集（或其分页切片）
+        self.rows = rows
+
+    @classmethod
+    def project(cls, queryset):
+        """预约查询集 -> 只包含输出列的 values 查询集"""
+        return queryset.values(*cls.FIELDS.values())
+
+    @staticmethod
+    def format_datetime(value, tz):
+        """与 DRF DateTimeField 输出一致；时区由调用方取一次，避免每个字段都查询当前时区"""
+        if value is None:
+            return None
+        value = value.astimezone(tz).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    @classmethod
+    def to_representation(cls, row, tz=None):
+        tz = tz or timezone.get_current_timezone()
+        data = {key: row[path] for key, path in cls.FIELDS.items()}
+        for key in cls.DATETIME_FIELDS:
+            data[key] = cls.format_datetime(data[key], tz)
+        for key in cls.DECIMAL_FIELDS:
+            data[key] = str(data[key])
+
+        # 与 BookingSerializer 一致，只输出待处理的取消申请
+        pending = data.pop('cancellation_status') == 'pending'
+        data['has_pending_cancellation'] = pending
+        requested_by_name = data.pop('cancellation_requested_by_name')
+        requested_by_username = data.pop('cancellation_requested_by_username')
+        if pending:
+            data['cancellation_requested_by_name'] = requested_by_name or requested_by_username
+            data['cancellation_requested_at'] = cls.format_datetime(data['cancellation_requested_at'], tz)
+        else:
+            data['cancellation_requested_by_name'] = None
+            for key in cls.CANCELLATION_FIELDS:
+                data[key] = None
+        return data
+
+    @property
+    def data(self):
+        tz = timezone.get_current_timezone()
+        return [self.to_representation(row, tz) for row in self.rows]
+
+
+class RecurringBookingSerializer(serializers.Serializer):
+    """周期性预约请求：rrule 与 weekday/count 二选一，total_fee 为每节课的费用"""
+    relation_id = serializers.IntegerField()
+    table_id = serializers.IntegerField()
+    start_date = serializers.DateField()
+    start_time = serializers.TimeField()
+    end_time = serializers.TimeField()
+    total_fee = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    weekday = serializers.IntegerField(required=False, min_value=0, max_value=6)
+    count = serializers.IntegerField(required=False, min_value=1)
+    rrule = serializers.CharField(required=False)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+    def validate(self, data):
+        request = self.context['request']
+        try:
+            data['relation'] = CoachStudentRelation.objects.select_related('coach', 'student').get(
+                id=data['relation_id'], student=request.user, status='approved'
+            )
+        except CoachStudentRelation.DoesNotExist:
+            raise serializers.ValidationError('师生关系不存在或未通过审核')
+        try:
+            data['table'] = Table.objects.get(id=data['table_id'])
+        except Table.DoesNotExist:
+            raise serializers.ValidationError('球台不存在')
+
+        try:
+            if data.get('rrule'):
+                options = recurring.parse_rrule(data['rrule'])
+            elif 'count' in data:
+                options = {
+                    'weekdays': [data['weekday']] if 'weekday' in data else None,
+                    'count': data['count'],
+                }
+            else:
+                raise recurring.RecurrenceError('请指定 rrule，或 weekday 和 count')
+            dates = recurring.occurrence_dates(data['start_date'], **options)
+            data['slots'] = recurring.build_slots(dates, data['start_time'], data['end_time'])
+        except recurring.RecurrenceError as e:
+            raise serializers.ValidationError(str(e))
+
+        if not data['slots']:
+            raise serializers.ValidationError('规则没有展开出任何课次')
+        if data['slots'][0][0] <= timezone.now():
+            raise serializers.ValidationError('第一节课的开始时间必须晚于当前时间')
+        return data
+
+
 class CoachChangeRequestSerializer(serializers.ModelSerializer):
     """教练更换请求序列化器"""
     
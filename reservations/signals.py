@@ -0,0 +1,104 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Booking, BookingCancellation, CoachStudentRelation, Table
+from .occupancy import occupancy_index
+from . import cancel_quota, schedule_cache
+from .serializers import TableSerializer
+
+
+def _campus_of_table(table_id):
+    """优先从索引中获取球台所属校区，避免额外查询"""
+    campus_id = occupancy_index.campus_of_table(table_id)
+    if campus_id is None:
+        campus_id = Table.objects.filter(id=table_id).values_list('campus_id', flat=True).first()
+    return campus_id
+
+
+@receiver(post_save, sender=Booking)
+def update_occupancy_on_booking_save(sender, instance, **kwargs):
+    """预约保存后（事务提交时）更新球台占用索引"""
+    campus_id = _campus_of_table(instance.table_id)
+    if campus_id is None:
+        return
+    booking_id = instance.id
+    table_id = instance.table_id
+    start_time = instance.start_time
+    end_time = instance.end_time
+    booking_status = instance.status
+    transaction.on_commit(lambda: occupancy_index.booking_saved(
+        booking_id, table_id, campus_id, start_time, end_time, booking_status
+    ))
+
+
+@receiver(post_delete, sender=Booking)
+def update_occupancy_on_booking_delete(sender, instance, **kwargs):
+    """预约删除后更新球台占用索引"""
+    campus_id = _campus_of_table(instance.table_id)
+    if campus_id is None:
+        return
+    booking_id = instance.id
+    transaction.on_commit(lambda: occupancy_index.booking_deleted(booking_id, campus_id))
+
+
+@receiver(post_save, sender=Table)
+def update_occupancy_on_table_save(sender, instance, **kwargs):
+    """球台信息变更后同步到索引"""
+    table_id = instance.id
+    campus_id = instance.campus_id
+    data = TableSerializer(instance).data
+    transaction.on_commit(lambda: occupancy_index.table_saved(table_id, campus_id, data))
+
+
+@receiver(post_delete, sender=Table)
+def update_occupancy_on_table_delete(sender, instance, **kwargs):
+    """球台删除后从索引中移除"""
+    table_id = instance.id
+    campus_id = instance.campus_id
+    transaction.on_commit(lambda: occupancy_index.table_deleted(table_id, campus_id))
+
+
+def _invalidate_schedule(relation_id):
+    """预约或取消申请变化后（事务提交时）使教练和学员的课表缓存失效"""
+    user_ids = CoachStudentRelation.objects.filter(id=relation_id).values_list('coach_id', 'student_id').first()
+    if user_ids:
+        transaction.on_commit(lambda: schedule_cache.invalidate(*user_ids))
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_schedule_on_booking_change(sender, instance, **kwargs):
+    _invalidate_schedule(instance.relation_id)
+
+
+@receiver(post_save, sender=BookingCancellation)
+@receiver(post_delete, sender=BookingCancellation)
+def invalidate_schedule_on_cancellation_change(sender, instance, **kwargs):
+    relation_id = Booking.objects.filter(id=instance.booking_id).values_list('relation_id', flat=True).first()
+    _invalidate_schedule(relation_id)
+
+
+@receiver(post_init, sender=Booking)
+def remember_cancellation_key(sender, instance, **kwargs):
+    """记录加载时的取消人和取消月份，保存时据此增减月取消次数"""
+    cancel_quota.counter.remember(instance)
+
+
+@receiver(pre_save, sender=Booking)
+def load_cancellation_key(sender, instance, raw=False, **kwargs):
+    # 取消字段被延迟加载时，保存前从数据库读取原值
+    if not raw and instance.pk:
+        cancel_quota.counter.load(instance)
+
+
+@receiver(post_save, sender=Booking)
+def update_cancellation_counter_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """取消人或取消时间变化时，在同一事务中更新月取消次数"""
+    if not raw:
+        cancel_quota.counter.saved(instance, created, update_fields)
+
+
+@receiver(post_delete, sender=Booking)
+def update_cancellation_counter_on_delete(sender, instance, **kwargs):
+    cancel_quota.counter.deleted(instance)
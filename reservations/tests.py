@@ -1,3 +1,907 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import datetime, time, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from accounts.models import Coach
+from campus.models import Campus
+from keshe.cache_versions import check_shared_cache
+from notifications.models import Notification, NotificationOutbox
+from payments.models import UserAccount
+from .models import CoachStudentRelation, Table, Booking, BookingCancellation, ClassReminder
+from . import cancel_quota, recurring, schedule_cache
+from .occupancy import occupancy_index
+from .reminders import reminder_type_for, send_due_reminders
+from .serializers import BookingListSerializer, BookingSerializer
+
+User = get_user_model()
+
+
+class ReservationTestMixin:
+    """预约相关测试的公共数据"""
+
+    def create_base_data(self):
+        self.campus = Campus.objects.create(
+            name='测试校区',
+            code='TEST001',
+            address='测试地址',
+            phone='13800138000'
+        )
+        self.coach = User.objects.create_user(
+            username='coach',
+            password='testpass123',
+            real_name='测试教练',
+            phone='13800138001',
+            user_type='coach'
+        )
+        self.student = User.objects.create_user(
+            username='student',
+            password='testpass123',
+            real_name='测试学员',
+            phone='13800138002',
+            user_type='student'
+        )
+        self.relation = CoachStudentRelation.objects.create(
+            coach=self.coach,
+            student=self.student,
+            status='approved',
+            applied_by='student'
+        )
+        self.table1 = Table.objects.create(campus=self.campus, number='1')
+        self.table2 = Table.objects.create(campus=self.campus, number='2')
+
+        # 使用明天的整点时间，避免落在索引覆盖范围之外
+        tomorrow = timezone.localtime() + timedelta(days=1)
+        self.slot_start = tomorrow.replace(hour=10, minute=0, second=0, microsecond=0)
+        self.slot_end = self.slot_start + timedelta(hours=1)
+
+    def create_booking(self, table, start, end, booking_status='pending'):
+        return Booking.objects.create(
+            relation=self.relation,
+            table=table,
+            start_time=start,
+            end_time=end,
+            duration_hours=Decimal('1.0'),
+            total_fee=Decimal('100.00'),
+            status=booking_status
+        )
+
+
+class OccupancyIndexTest(ReservationTestMixin, TestCase):
+    """球台占用索引测试"""
+
+    def setUp(self):
+        occupancy_index.clear()
+        self.create_base_data()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student)
+
+    def tearDown(self):
+        occupancy_index.clear()
+
+    def get_available(self, start, end):
+        return self.client.get('/api/reservations/tables/available/', {
+            'start_time': timezone.localtime(start).strftime('%Y-%m-%d+%H:%M:%S'),
+            'end_time': timezone.localtime(end).strftime('%Y-%m-%d+%H:%M:%S'),
+            'campus_id': self.campus.id,
+        })
+
+    def test_cold_index_falls_back_and_builds(self):
+        """冷索引时走数据库查询，并在之后由索引直接返回"""
+        self.create_booking(self.table1, self.slot_start, self.slot_end)
+        self.assertFalse(occupancy_index.is_warm(self.campus.id))
+
+        response = self.get_available(self.slot_start, self.slot_end)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([table['id'] for table in response.data], [self.table2.id])
+        self.assertTrue(occupancy_index.is_warm(self.campus.id))
+
+        with self.assertNumQueries(0):
+            response = self.get_available(self.slot_start, self.slot_end)
+        self.assertEqual([table['id'] for table in response.data], [self.table2.id])
+
+    def test_index_follows_booking_changes(self):
+        """预约的创建和取消通过信号同步到索引"""
+        occupancy_index.build(self.campus.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = self.create_booking(
+                self.table2,
+                self.slot_start + timedelta(minutes=30),
+                self.slot_end + timedelta(minutes=30)
+            )
+        available = occupancy_index.available_tables(self.campus.id, self.slot_start, self.slot_end)
+        self.assertEqual([table['id'] for table in available], [self.table1.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.status = 'cancelled'
+            booking.save()
+        available = occupancy_index.available_tables(self.campus.id, self.slot_start, self.slot_end)
+        self.assertEqual([table['id'] for table in available], [self.table1.id, self.table2.id])
+        self.assertEqual(occupancy_index.check_consistency(self.campus.id), [])
+
+    def test_adjacent_booking_does_not_block(self):
+        """首尾相接的时间段不算冲突"""
+        occupancy_index.build(self.campus.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_booking(self.table1, self.slot_end, self.slot_end + timedelta(hours=1))
+
+        occupied = occupancy_index.occupied_table_ids(self.campus.id, self.slot_start, self.slot_end)
+        self.assertEqual(occupied, set())
+
+    def test_consistency_check_detects_drift(self):
+        """绕过信号的写入会被一致性检查发现"""
+        booking = self.create_booking(self.table1, self.slot_start, self.slot_end)
+        occupancy_index.build(self.campus.id)
+        self.assertEqual(occupancy_index.check_consistency(self.campus.id), [])
+
+        Booking.objects.filter(id=booking.id).update(status='cancelled')
+        mismatches = occupancy_index.check_consistency(self.campus.id)
+        self.assertEqual(len(mismatches), 1)
+        self.assertEqual(mismatches[0]['booking_id'], booking.id)
+
+    def test_table_status_change_updates_index(self):
+        """球台停用后不再出现在可用列表中"""
+        occupancy_index.build(self.campus.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.table1.status = 'maintenance'
+            self.table1.save()
+
+        available = occupancy_index.available_tables(self.campus.id, self.slot_start, self.slot_end)
+        self.assertEqual([table['id'] for table in available], [self.table2.id])
+
+    def test_process_local_cache_warns_outside_debug(self):
+        """非调试模式下使用进程内缓存时，系统检查给出警告"""
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis = {'default': {'BACKEND': 'django_redis.cache.RedisCache'}}
+        with override_settings(DEBUG=False, CACHES=locmem):
+            self.assertEqual([message.id for message in check_shared_cache()], ['keshe.W001'])
+        with override_settings(DEBUG=True, CACHES=locmem):
+            self.assertEqual(check_shared_cache(), [])
+        with override_settings(DEBUG=False, CACHES=redis):
+            self.assertEqual(check_shared_cache(), [])
+
+
+class AvailabilityGridTest(ReservationTestMixin, TestCase):
+    """多时段可用性矩阵测试"""
+
+    def setUp(self):
+        self.create_base_data()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student)
+        self.date = timezone.localtime(self.slot_start).date().isoformat()
+
+    def get_grid(self, **params):
+        query = {
+            'campus_id': self.campus.id,
+            'date_from': self.date,
+            'slot_minutes': 60,
+            'day_start': '09:00',
+            'day_end': '13:00',
+        }
+        query.update(params)
+        return self.client.get('/api/reservations/tables/availability-grid/', query)
+
+    def test_table_busy_ranges(self):
+        """每张球台返回占用的时间段区间，全部占满的时间段不可预约"""
+        self.create_booking(self.table1, self.slot_start, self.slot_end)
+        self.create_booking(self.table2, self.slot_start, self.slot_end + timedelta(minutes=30))
+
+        response = self.get_grid()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['slots_per_day'], 4)
+        busy = {table['id']: table['busy'] for table in response.data['tables']}
+        # 10:00-11:00 为第 1 个时间段；10:00-11:30 覆盖第 1、2 个时间段
+        self.assertEqual(busy[self.table1.id], [[1, 2]])
+        self.assertEqual(busy[self.table2.id], [[1, 3]])
+        self.assertEqual(response.data['bookable'], [[0, 1], [2, 4]])
+
+    def test_coach_busy_blocks_bookable(self):
+        """教练在其他校区的预约也会占用教练时间"""
+        other_campus = Campus.objects.create(
+            name='其他校区', code='TEST002', address='其他地址', phone='13800138009'
+        )
+        other_table = Table.objects.create(campus=other_campus, number='1')
+        self.create_booking(other_table, self.slot_start, self.slot_end)
+
+        response = self.get_grid(coach_id=self.coach.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['coach']['busy'], [[1, 2]])
+        for table in response.data['tables']:
+            self.assertEqual(table['busy'], [])
+        self.assertEqual(response.data['bookable'], [[0, 1], [2, 4]])
+
+    def test_bitmap_encoding_and_cancelled_bookings(self):
+        """位图编码返回十六进制字符串，已取消的预约不占用"""
+        self.create_booking(self.table1, self.slot_start, self.slot_end)
+        self.create_booking(self.table2, self.slot_start, self.slot_end, booking_status='cancelled')
+
+        response = self.get_grid(encoding='bitmap', date_to=self.date)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        busy = {table['id']: table['busy'] for table in response.data['tables']}
+        self.assertEqual(busy[self.table1.id], '2')
+        self.assertEqual(busy[self.table2.id], '0')
+        self.assertEqual(response.data['bookable'], 'f')
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.get_grid(slot_minutes=7).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.get_grid(encoding='json').status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/reservations/tables/availability-grid/', {
+            'campus_id': self.campus.id,
+            'date_from': '2025-01-01',
+            'date_to': '2025-02-01',
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.get_grid(campus_id='abc').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BookingConflictTest(ReservationTestMixin, TestCase):
+    """预约冲突检查测试"""
+
+    def setUp(self):
+        self.create_base_data()
+        UserAccount.objects.create(user=self.student, balance=Decimal('1000.00'))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student)
+
+    def post_booking(self, table, start, end):
+        return self.client.post('/api/reservations/bookings/', {
+            'relation_id': self.relation.id,
+            'table_id': table.id,
+            'start_time': start.isoformat(),
+            'end_time': end.isoformat(),
+            'duration_hours': '1.0',
+            'total_fee': '100.00',
+        }, format='json')
+
+    def test_same_table_overlap_rejected(self):
+        other_relation = CoachStudentRelation.objects.create(
+            coach=User.objects.create_user(
+                username='coach2', password='testpass123', phone='13800138003', user_type='coach'
+            ),
+            student=self.student,
+            status='approved',
+            applied_by='student'
+        )
+        Booking.objects.create(
+            relation=other_relation, table=self.table1,
+            start_time=self.slot_start, end_time=self.slot_end,
+            duration_hours=Decimal('1.0'), total_fee=Decimal('100.00')
+        )
+        response = self.post_booking(self.table1, self.slot_start + timedelta(minutes=30),
+                                     self.slot_end + timedelta(minutes=30))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('球台', response.data['error'])
+
+    def test_same_coach_overlap_rejected(self):
+        self.create_booking(self.table1, self.slot_start, self.slot_end, booking_status='confirmed')
+        response = self.post_booking(self.table2, self.slot_start, self.slot_end)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('教练', response.data['error'])
+
+    def test_adjacent_and_cancelled_bookings_allowed(self):
+        self.create_booking(self.table1, self.slot_start, self.slot_end, booking_status='cancelled')
+        self.create_booking(self.table1, self.slot_end, self.slot_end + timedelta(hours=1))
+        response = self.post_booking(self.table1, self.slot_start, self.slot_end)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+class BookingPaymentTest(ReservationTestMixin, TestCase):
+    """确认预约扣费测试"""
+
+    def setUp(self):
+        self.create_base_data()
+        self.account = UserAccount.objects.create(user=self.student, balance=Decimal('150.00'))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.coach)
+
+    def test_confirm_debits_once(self):
+        booking = self.create_booking(self.table1, self.slot_start, self.slot_end)
+        response = self.client.post(f'/api/reservations/bookings/{booking.id}/confirm/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['student_balance'], 50.0)
+        # 通知只写入发件箱，由后台投递
+        self.assertEqual(NotificationOutbox.objects.filter(recipient=self.student).count(), 1)
+        self.assertFalse(Notification.objects.filter(recipient=self.student).exists())
+
+        response = self.client.post(f'/api/reservations/bookings/{booking.id}/confirm/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('50.00'))
+
+    def test_confirm_rejected_when_balance_insufficient(self):
+        self.create_booking(self.table1, self.slot_start, self.slot_end, booking_status='confirmed')
+        booking = self.create_booking(self.table2, self.slot_end, self.slot_end + timedelta(hours=1))
+        booking.total_fee = Decimal('200.00')
+        booking.save()
+
+        response = self.client.post(f'/api/reservations/bookings/{booking.id}/confirm/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'pending')
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('150.00'))
+
+@override_settings(NOTIFICATION_OUTBOX={'AUTO_DISPATCH': False})
+class BookingConcurrencyTest(ReservationTestMixin, TransactionTestCase):
+    """并发创建预约压力测试：50 个并发写入不会产生重复预约"""
+
+    WRITERS = 50
+
+    def setUp(self):
+        occupancy_index.clear()
+        self.create_base_data()
+        self.coach2 = User.objects.create_user(
+            username='coach2', password='testpass123', phone='13800138003', user_type='coach'
+        )
+        self.relations = [self.relation]
+        for index in range(1, self.WRITERS):
+            student = User.objects.create_user(
+                username=f'student{index}', password='testpass123',
+                phone=f'139{index:08d}', user_type='student'
+            )
+            self.relations.append(CoachStudentRelation.objects.create(
+                coach=self.coach if index % 2 == 0 else self.coach2,
+                student=student,
+                status='approved',
+                applied_by='student'
+            ))
+
+    def tearDown(self):
+        occupancy_index.clear()
+
+    def write_booking(self, index, barrier, results):
+        relation = self.relations[index]
+        table = self.table1 if index % 3 else self.table2
+        # 时间错开 0/30 分钟，使部分预约与其他预约部分重叠
+        start = self.slot_start + timedelta(minutes=30 * (index % 2))
+        try:
+            barrier.wait()
+            serializer = BookingSerializer(data={
+                'relation_id': relation.id,
+                'table_id': table.id,
+                'start_time': start,
+                'end_time': start + timedelta(hours=1),
+                'duration_hours': '1.0',
+                'total_fee': '100.00',
+            })
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            results[index] = 'created'
+        except Exception as e:
+            results[index] = type(e).__name__
+        finally:
+            connection.close()
+
+    def test_parallel_writers_do_not_double_book(self):
+        barrier = threading.Barrier(self.WRITERS)
+        results = [None] * self.WRITERS
+        threads = [
+            threading.Thread(target=self.write_booking, args=(index, barrier, results))
+            for index in range(self.WRITERS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertIn('created', results)
+        bookings = list(Booking.objects.filter(
+            status__in=['pending', 'confirmed']
+        ).values('id', 'table_id', 'relation__coach_id', 'start_time', 'end_time'))
+        self.assertEqual(len(bookings), results.count('created'))
+        for index, first in enumerate(bookings):
+            for second in bookings[index + 1:]:
+                overlap = first['start_time'] < second['end_time'] and second['start_time'] < first['end_time']
+                if not overlap:
+                    continue
+                self.assertNotEqual(first['table_id'], second['table_id'])
+                self.assertNotEqual(first['relation__coach_id'], second['relation__coach_id'])
+
+
+@override_settings(NOTIFICATION_OUTBOX={'AUTO_DISPATCH': False})
+class ClassReminderTest(ReservationTestMixin, TestCase):
+    """上课提醒测试"""
+
+    def setUp(self):
+        self.create_base_data()
+        self.now = timezone.now()
+
+    def booking_starting_in(self, delta, table=None, booking_status='confirmed'):
+        start = self.now + delta
+        return self.create_booking(table or self.table1, start, start + timedelta(hours=1), booking_status)
+
+    def test_reminder_types_by_offset(self):
+        self.assertIsNone(reminder_type_for(timedelta(0)))
+        self.assertEqual(reminder_type_for(timedelta(minutes=5)), '10min')
+        self.assertEqual(reminder_type_for(timedelta(minutes=30)), '1h')
+        self.assertEqual(reminder_type_for(timedelta(hours=5)), '24h')
+        self.assertIsNone(reminder_type_for(timedelta(hours=25)))
+
+    def test_reminders_sent_once_per_offset(self):
+        booking = self.booking_starting_in(timedelta(hours=5))
+        self.booking_starting_in(timedelta(hours=30), table=self.table2)
+        self.booking_starting_in(timedelta(minutes=5), table=self.table2, booking_status='pending')
+
+        self.assertEqual(send_due_reminders(self.now), 2)
+        self.assertEqual(send_due_reminders(self.now), 0)
+        recipients = set(NotificationOutbox.objects.values_list('recipient_id', flat=True))
+        self.assertEqual(recipients, {self.student.id, self.coach.id})
+
+        # 临近开课时发送下一档提醒
+        self.assertEqual(send_due_reminders(booking.start_time - timedelta(minutes=50)), 2)
+        self.assertEqual(send_due_reminders(booking.start_time - timedelta(minutes=5)), 2)
+        self.assertEqual(
+            sorted(ClassReminder.objects.filter(recipient=self.student).values_list('reminder_type', flat=True)),
+            ['10min', '1h', '24h']
+        )
+        self.assertEqual(NotificationOutbox.objects.count(), 6)
+
+    def test_existing_marker_suppresses_reminder(self):
+        """其他调度进程已记录的提醒不会重复发送"""
+        booking = self.booking_starting_in(timedelta(minutes=30))
+        ClassReminder.objects.create(
+            booking=booking, recipient=self.student, reminder_type='1h', run_token='other'
+        )
+        self.assertEqual(send_due_reminders(self.now), 1)
+        self.assertEqual(NotificationOutbox.objects.get().recipient, self.coach)
+
+
+class CoachDirectoryTest(ReservationTestMixin, TestCase):
+    """教练目录测试"""
+
+    def setUp(self):
+        self.create_base_data()
+        Coach.objects.create(user=self.coach, coach_level='senior', hourly_rate=Decimal('200.00'))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student)
+
+    def add_coaches(self, count):
+        for index in range(count):
+            coach = User.objects.create_user(
+                username=f'directory_coach{index}', password='testpass123',
+                phone=f'1360000{index:04d}', user_type='coach'
+            )
+            if index % 2:
+                Coach.objects.create(user=coach)
+
+    def get(self, params=None, **headers):
+        return self.client.get('/api/reservations/coaches/', params or {}, **headers)
+
+    def test_single_query_regardless_of_coach_count(self):
+        with CaptureQueriesContext(connection) as small:
+            self.get()
+        self.add_coaches(10)
+        with CaptureQueriesContext(connection) as large:
+            response = self.get()
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+        self.assertEqual(len(response.data), 11)
+        entry = response.data[0]
+        self.assertEqual(entry['id'], self.coach.id)
+        self.assertEqual(entry['level'], 'senior')
+        self.assertEqual(entry['hourly_rate'], 200.0)
+        self.assertEqual(entry['current_students'], 1)
+        self.assertIsNone(response.data[1]['level'])
+
+    def test_pagination(self):
+        self.add_coaches(4)
+        response = self.get({'page': 2, 'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_conditional_get(self):
+        response = self.get()
+        etag = response['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        CoachStudentRelation.objects.filter(id=self.relation.id).update(status='terminated')
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ScheduleCacheTest(ReservationTestMixin, TestCase):
+    """课表缓存测试"""
+
+    def setUp(self):
+        cache.clear()
+        self.create_base_data()
+        self.create_booking(self.table1, self.slot_start, self.slot_end)
+        self.create_booking(self.table2, self.slot_start + timedelta(days=8), self.slot_end + timedelta(days=8))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student)
+
+    def tearDown(self):
+        cache.clear()
+
+    def get_schedule(self, days=14):
+        return self.client.get('/api/reservations/bookings/my_schedule/', {
+            'date_from': timezone.localdate().isoformat(),
+            'date_to': (timezone.localdate() + timedelta(days=days)).isoformat(),
+        })
+
+    def test_cached_response_matches_serializer(self):
+        response = self.get_schedule()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        bookings = Booking.objects.filter(relation=self.relation).order_by('-start_time')
+        expected = json.loads(JSONRenderer().render({'bookings': BookingSerializer(bookings, many=True).data}))
+        self.assertEqual(json.loads(response.content), expected)
+
+        # 第二次请求全部命中缓存，不查询数据库
+        with self.assertNumQueries(0):
+            cached = self.get_schedule()
+        self.assertEqual(json.loads(cached.content), expected)
+        self.assertGreater(schedule_cache.get_stats()['hits'], 0)
+
+    def test_date_range_is_filtered(self):
+        response = self.get_schedule(days=3)
+        self.assertEqual(len(json.loads(response.content)['bookings']), 1)
+        response = self.get_schedule(days=14)
+        self.assertEqual(len(json.loads(response.content)['bookings']), 2)
+
+    def test_partial_range_caches_whole_week(self):
+        monday = schedule_cache.week_start(self.slot_start) + timedelta(weeks=3)
+        for day in (1, 4):
+            start = timezone.make_aware(datetime.combine(monday + timedelta(days=day), time(10)))
+            self.create_booking(self.table1, start, start + timedelta(hours=1))
+
+        def get_range(days):
+            return json.loads(self.client.get('/api/reservations/bookings/my_schedule/', {
+                'date_from': monday.isoformat(),
+                'date_to': (monday + timedelta(days=days)).isoformat(),
+            }).content)['bookings']
+
+        # 先查询周一至周二，再查询整周，第二次命中的周缓存必须包含周五的预约
+        self.assertEqual(len(get_range(1)), 1)
+        self.assertEqual(len(get_range(6)), 2)
+
+    def test_booking_changes_invalidate(self):
+        self.get_schedule()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_booking(self.table2, self.slot_start + timedelta(days=1), self.slot_end + timedelta(days=1))
+        self.assertEqual(len(json.loads(self.get_schedule().content)['bookings']), 3)
+
+        booking = Booking.objects.filter(relation=self.relation).order_by('start_time').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            BookingCancellation.objects.create(booking=booking, requested_by=self.student, reason='有事')
+        entry = next(
+            item for item in json.loads(self.get_schedule().content)['bookings'] if item['id'] == booking.id
+        )
+        self.assertTrue(entry['has_pending_cancellation'])
+
+        # 教练的缓存同样失效
+        self.client.force_authenticate(user=self.coach)
+        self.assertEqual(len(json.loads(self.get_schedule().content)['bookings']), 3)
+
+    def test_stats_requires_admin(self):
+        response = self.client.get('/api/reservations/bookings/my_schedule/cache-stats/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.get_schedule()
+        self.get_schedule()
+        admin = User.objects.create_user(
+            username='admin', password='testpass123', phone='13800138009', user_type='super_admin'
+        )
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/reservations/bookings/my_schedule/cache-stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['hits'], response.data['misses'])
+        self.assertEqual(response.data['hit_rate'], 0.5)
+
+
+class BookingListSerializerTest(ReservationTestMixin, TestCase):
+    """扁平只读预约列表测试"""
+
+    def setUp(self):
+        cache.clear()
+        self.create_base_data()
+        self.booking = self.create_booking(self.table1, self.slot_start, self.slot_end)
+        self.create_booking(self.table2, self.slot_start + timedelta(days=1), self.slot_end + timedelta(days=1))
+        BookingCancellation.objects.create(booking=self.booking, requested_by=self.student, reason='有事')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_matches_booking_serializer(self):
+        response = self.client.get('/api/reservations/bookings/', {'shape': 'flat'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['shape'], response.data['version']), ('flat', 1))
+        self.assertEqual(response.data['count'], 2)
+
+        nested = self.client.get('/api/reservations/bookings/').data['results']
+        for flat, expected in zip(response.data['results'], nested):
+            for key in ('id', 'start_time', 'end_time', 'duration_hours', 'total_fee', 'status',
+                        'created_at', 'coach_id', 'coach_name', 'student_id', 'student_name',
+                        'table_number', 'has_pending_cancellation'):
+                self.assertEqual(flat[key], expected[key], key)
+            self.assertEqual(flat['campus_name'], expected['table']['campus']['name'])
+            info = expected['cancellation_info']
+            self.assertEqual(flat['cancellation_id'], info and info['id'])
+            self.assertEqual(flat['cancellation_requested_by_name'], info and info['requested_by_name'])
+
+    def test_single_query(self):
+        self.create_booking(self.table1, self.slot_start + timedelta(days=2), self.slot_end + timedelta(days=2))
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/reservations/bookings/my_schedule/', {'shape': 'flat'})
+        self.assertEqual(len(response.data['bookings']), 3)
+        self.assertEqual(response.data['version'], BookingListSerializer.VERSION)
+
+
+@override_settings(NOTIFICATION_OUTBOX={'AUTO_DISPATCH': False})
+class RecurringBookingTest(ReservationTestMixin, TestCase):
+    """周期性预约测试"""
+
+    def setUp(self):
+        occupancy_index.clear()
+        cache.clear()
+        self.create_base_data()
+        self.account = UserAccount.objects.create(user=self.student, balance=Decimal('1000.00'))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student)
+        self.start_date = timezone.localdate() + timedelta(days=1)
+
+    def tearDown(self):
+        occupancy_index.clear()
+        cache.clear()
+
+    def post(self, **overrides):
+        data = {
+            'relation_id': self.relation.id,
+            'table_id': self.table1.id,
+            'start_date': self.start_date.isoformat(),
+            'start_time': '10:00',
+            'end_time': '11:30',
+            'total_fee': '100.00',
+            'weekday': self.start_date.weekday(),
+            'count': 8,
+        }
+        data.update(overrides)
+        return self.client.post('/api/reservations/bookings/recurring/', data, format='json')
+
+    def test_occurrence_dates(self):
+        monday = self.start_date - timedelta(days=self.start_date.weekday())
+        dates = recurring.occurrence_dates(monday, **recurring.parse_rrule('FREQ=WEEKLY;BYDAY=MO,WE;COUNT=4'))
+        self.assertEqual(dates, [monday + timedelta(days=offset) for offset in (0, 2, 7, 9)])
+
+        dates = recurring.occurrence_dates(
+            monday, **recurring.parse_rrule(f'FREQ=WEEKLY;INTERVAL=2;UNTIL={(monday + timedelta(days=30)):%Y%m%d}')
+        )
+        self.assertEqual(dates, [monday, monday + timedelta(days=14), monday + timedelta(days=28)])
+
+        with self.assertRaises(recurring.RecurrenceError):
+            recurring.parse_rrule('FREQ=MONTHLY;COUNT=3')
+        with self.assertRaises(recurring.RecurrenceError):
+            recurring.occurrence_dates(monday, count=recurring.MAX_OCCURRENCES + 1)
+
+    def test_creates_all_occurrences_with_one_notification(self):
+        occupancy_index.build(self.campus.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['count'], 8)
+        self.assertEqual(response.data['total_fee'], '800.00')
+
+        bookings = list(Booking.objects.filter(relation=self.relation).order_by('start_time'))
+        self.assertEqual(len(bookings), 8)
+        self.assertEqual({timezone.localtime(b.start_time).weekday() for b in bookings}, {self.start_date.weekday()})
+        self.assertEqual(bookings[0].duration_hours, Decimal('1.5'))
+        self.assertEqual([b['id'] for b in response.data['bookings']], [b.id for b in bookings])
+
+        outbox = NotificationOutbox.objects.get()
+        self.assertEqual(outbox.recipient, self.coach)
+        self.assertEqual(outbox.data['booking_ids'], [b.id for b in bookings])
+
+        # 批量写入后占用索引失效，重新加载后能看到新预约
+        self.assertFalse(occupancy_index.is_warm(self.campus.id))
+        occupancy_index.build(self.campus.id)
+        occupied = occupancy_index.occupied_table_ids(self.campus.id, bookings[0].start_time, bookings[0].end_time)
+        self.assertEqual(occupied, {self.table1.id})
+
+    def test_conflict_creates_nothing(self):
+        start = timezone.make_aware(datetime.combine(self.start_date + timedelta(weeks=3), time(11, 0)))
+        self.create_booking(self.table2, start, start + timedelta(hours=1))
+
+        response = self.post()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.data['conflicts']), 1)
+        self.assertEqual(response.data['conflicts'][0]['type'], 'coach')
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_combined_balance_check(self):
+        self.account.balance = Decimal('700.00')
+        self.account.save()
+        response = self.post()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('余额不足', response.data['error'])
+        self.assertFalse(Booking.objects.exists())
+
+        self.assertEqual(self.post(count=7).status_code, status.HTTP_201_CREATED)
+
+
+@override_settings(NOTIFICATION_OUTBOX={'AUTO_DISPATCH': False})
+class BulkBookingActionTest(ReservationTestMixin, TestCase):
+    """教练批量确认/拒绝预约测试"""
+
+    def setUp(self):
+        cache.clear()
+        self.create_base_data()
+        self.account = UserAccount.objects.create(user=self.student, balance=Decimal('250.00'))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.coach)
+
+    def tearDown(self):
+        cache.clear()
+
+    def create_bookings(self, count, offset=0):
+        return [
+            self.create_booking(
+                self.table1, self.slot_start + timedelta(days=offset + day), self.slot_end + timedelta(days=offset + day)
+            )
+            for day in range(count)
+        ]
+
+    def test_confirm_with_partial_failures(self):
+        bookings = self.create_bookings(3)
+        other_coach = User.objects.create_user(
+            username='other_coach', password='testpass123', phone='13800138010', user_type='coach'
+        )
+        other = CoachStudentRelation.objects.create(
+            coach=other_coach, student=self.student, status='approved', applied_by='student'
+        )
+        foreign = Booking.objects.create(
+            relation=other, table=self.table2, start_time=self.slot_start, end_time=self.slot_end,
+            duration_hours=Decimal('1.0'), total_fee=Decimal('100.00')
+        )
+
+        booking_ids = [booking.id for booking in bookings] + [foreign.id, 999999]
+        response = self.client.post(
+            '/api/reservations/bookings/bulk_confirm/', {'booking_ids': booking_ids}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['succeeded'], response.data['failed']), (2, 3))
+        results = response.data['results']
+        self.assertEqual([result['booking_id'] for result in results], booking_ids)
+        self.assertEqual([result['success'] for result in results], [True, True, False, False, False])
+        self.assertEqual([results[0]['student_balance'], results[1]['student_balance']], [150.0, 50.0])
+        self.assertIn('余额不足', results[2]['error'])
+        self.assertEqual(results[4]['error'], '预约不存在')
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('50.00'))
+        statuses = dict(Booking.objects.values_list('id', 'status'))
+        self.assertEqual([statuses[booking.id] for booking in bookings], ['confirmed', 'confirmed', 'pending'])
+        self.assertEqual(NotificationOutbox.objects.filter(recipient=self.student).count(), 2)
+
+        # 与逐条确认共用幂等键，重复确认不会再次扣费
+        response = self.client.post(f'/api/reservations/bookings/{bookings[0].id}/confirm/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count_independent_of_batch_size(self):
+        self.account.balance = Decimal('10000.00')
+        self.account.save()
+
+        def confirm(count, offset):
+            booking_ids = [booking.id for booking in self.create_bookings(count, offset)]
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(
+                    '/api/reservations/bookings/bulk_confirm/', {'booking_ids': booking_ids}, format='json'
+                )
+            self.assertEqual(response.data['succeeded'], count)
+            return len(context.captured_queries)
+
+        # 第一次请求会加载教练所属校区等缓存
+        confirm(1, 20)
+        self.assertEqual(confirm(2, 0), confirm(6, 10))
+
+    def test_reject_invalidates_schedule(self):
+        bookings = self.create_bookings(2)
+        version = schedule_cache.get_version(self.student.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/reservations/bookings/bulk_reject/', {
+                'booking_ids': [booking.id for booking in bookings], 'reason': '时间冲突'
+            }, format='json')
+        self.assertEqual(response.data['succeeded'], 2)
+        self.assertEqual(
+            set(Booking.objects.values_list('status', 'cancel_reason')), {('cancelled', '时间冲突')}
+        )
+        self.assertEqual(NotificationOutbox.objects.count(), 2)
+        self.assertNotEqual(schedule_cache.get_version(self.student.id), version)
+
+    def test_requires_coach(self):
+        self.client.force_authenticate(user=self.student)
+        response = self.client.post('/api/reservations/bookings/bulk_confirm/', {'booking_ids': [1]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CancellationQuotaTest(ReservationTestMixin, TestCase):
+    """月取消次数计数测试"""
+
+    def setUp(self):
+        self.create_base_data()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student)
+
+    def future_bookings(self, count):
+        start = self.slot_start + timedelta(days=2)
+        return [
+            self.create_booking(self.table1, start + timedelta(days=day), start + timedelta(days=day, hours=1))
+            for day in range(count)
+        ]
+
+    def cancel(self, booking, user):
+        booking.status = 'cancelled'
+        booking.cancelled_by = user
+        booking.cancelled_at = timezone.now()
+        booking.save()
+
+    def test_counter_follows_booking_changes(self):
+        bookings = self.future_bookings(2)
+        self.cancel(bookings[0], self.student)
+        self.cancel(bookings[1], self.student)
+        self.assertEqual(cancel_quota.monthly_count(self.student), 2)
+
+        # 重新保存不会重复计数；改为其他取消人时计数转移
+        Booking.objects.get(id=bookings[0].id).save()
+        booking = Booking.objects.only('id', 'notes').get(id=bookings[1].id)
+        booking.cancelled_by = self.coach
+        booking.save()
+        self.assertEqual(cancel_quota.monthly_count(self.student), 1)
+        self.assertEqual(cancel_quota.monthly_count(self.coach), 1)
+
+        Booking.objects.get(id=bookings[0].id).delete()
+        self.assertEqual(cancel_quota.monthly_count(self.student), 0)
+
+    def test_limit_and_batch_evaluation(self):
+        bookings = self.future_bookings(5)
+        for booking in bookings[:3]:
+            self.cancel(booking, self.student)
+        can_cancel, message = bookings[3].can_cancel(self.student)
+        self.assertFalse(can_cancel)
+        self.assertIn('3次', message)
+
+        ids = [booking.id for booking in bookings]
+        with self.assertNumQueries(1):
+            count, results = cancel_quota.evaluate(self.student, ids)
+        self.assertEqual(count, 3)
+        self.assertEqual(results[bookings[0].id], (False, '预约状态不允许取消'))
+        self.assertFalse(results[bookings[4].id][0])
+
+        response = self.client.get('/api/reservations/bookings/can_cancel/', {
+            'booking_ids': ','.join(str(booking_id) for booking_id in ids + [999999])
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['remaining_cancels'], 0)
+        self.assertEqual(response.data['results'][-1], {
+            'booking_id': 999999, 'can_cancel': False, 'reason': '预约不存在'
+        })
+        self.assertEqual(self.client.get('/api/reservations/bookings/cancel_stats/').data['monthly_cancel_count'], 3)
+
+    def test_batch_evaluation_allows_within_quota(self):
+        booking = self.future_bookings(1)[0]
+        response = self.client.get('/api/reservations/bookings/can_cancel/', {'booking_ids': str(booking.id)})
+        self.assertEqual(response.data['results'], [
+            {'booking_id': booking.id, 'can_cancel': True, 'reason': '可以申请取消'}
+        ])
+
+    def test_bulk_reject_counts_for_coach(self):
+        bookings = self.future_bookings(2)
+        self.client.force_authenticate(user=self.coach)
+        self.client.post('/api/reservations/bookings/bulk_reject/', {
+            'booking_ids': [booking.id for booking in bookings]
+        }, format='json')
+        self.assertEqual(cancel_quota.monthly_count(self.coach), 2)
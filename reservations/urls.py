@@ -13,16 +13,23 @@ urlpatterns = [
     # 球台管理
     path('tables/', views.TableListView.as_view(), name='table-list'),
     path('tables/available/', views.available_tables, name='available-tables'),
+    path('tables/availability-grid/', views.availability_grid, name='availability-grid'),
+    path('tables/occupancy-check/', views.occupancy_index_check, name='occupancy-index-check'),
     
     # 预约管理
     path('bookings/', views.BookingListCreateView.as_view(), name='booking-list'),
     path('bookings/my_schedule/', views.BookingListCreateView.as_view(), name='my-schedule'),
+    path('bookings/bulk_confirm/', views.bulk_confirm_bookings, name='booking-bulk-confirm'),
+    path('bookings/bulk_reject/', views.bulk_reject_bookings, name='booking-bulk-reject'),
+    path('bookings/recurring/', views.create_recurring_bookings, name='booking-recurring'),
+    path('bookings/my_schedule/cache-stats/', views.schedule_cache_stats, name='schedule-cache-stats'),
     path('bookings/<int:pk>/', views.BookingDetailView.as_view(), name='booking-detail'),
     path('bookings/<int:pk>/cancel/', views.BookingDetailView.as_view(), name='booking-cancel'),
     path('bookings/<int:booking_id>/confirm/', views.confirm_booking, name='booking-confirm'),
     path('bookings/<int:booking_id>/reject/', views.reject_booking, name='booking-reject'),
     path('bookings/<int:booking_id>/complete/', views.complete_booking, name='booking-complete'),
     path('bookings/cancel_stats/', views.cancel_stats, name='cancel-stats'),
+    path('bookings/can_cancel/', views.batch_can_cancel, name='booking-can-cancel'),
     path('cancellations/<int:cancellation_id>/approve/', views.approve_cancellation, name='approve-cancellation'),
     path('cancellations/pending/', views.pending_cancellations, name='pending-cancellations'),
     
@@ -1,24 +1,37 @@
+import hashlib
+import json
+
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ValidationError
 from django.shortcuts import get_object_or_404
 from logs.utils import log_user_action
 from django.db import transaction, models
 from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
 from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
 from django.views.decorators.csrf import csrf_exempt
 from datetime import datetime, timedelta
 from django.utils import timezone
 from .models import CoachStudentRelation, Table, Booking, CoachChangeRequest
+from .occupancy import occupancy_index
+from . import bulk_actions, cancel_quota, recurring, schedule_cache
 from .serializers import (
     CoachStudentRelationSerializer, 
     TableSerializer, 
     BookingSerializer, 
+    BookingListSerializer,
+    RecurringBookingSerializer,
     CoachChangeRequestSerializer,
     CoachChangeApprovalSerializer
 )
-from payments.models import UserAccount, AccountTransaction
+from payments.models import UserAccount
+from payments import ledger
 from notifications.models import Notification
 
 User = get_user_model()
@@ -93,7 +106,7 @@ def approve_relation(request, relation_id):
     # 发送通知给学员
     from notifications.models import Notification
     try:
-        Notification.create_notification(
+        Notification.enqueue_notification(
             recipient=relation.student,
             sender=relation.coach,
             title=notification_title,
@@ -162,6 +175,11 @@ def available_tables(request):
                 'error': '开始时间必须早于结束时间'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        # 优先使用内存中的球台占用索引
+        indexed_tables = occupancy_index.available_tables(campus_id, start_time, end_time)
+        if indexed_tables is not None:
+            return Response(indexed_tables, status=status.HTTP_200_OK)
+
         # 获取指定校区的所有可用球台
         all_tables = Table.objects.filter(
             campus_id=campus_id,
@@ -182,8 +200,13 @@ def available_tables(request):
         
         # 序列化数据
         serializer = TableSerializer(available_tables_queryset, many=True)
-        
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = serializer.data
+
+        # 索引未构建时顺带构建该校区的索引，后续请求无需访问数据库
+        if not occupancy_index.is_warm(campus_id):
+            occupancy_index.build(campus_id)
+
+        return Response(data, status=status.HTTP_200_OK)
         
     except Exception as e:
         return Response({
@@ -191,6 +214,133 @@ def available_tables(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def availability_grid(request):
+    """获取校区球台（及教练）在一段日期内的可用性矩阵"""
+    from campus.models import Campus
+    from .availability import build_availability_grid, MAX_GRID_DAYS, ALLOWED_SLOT_MINUTES
+
+    campus_id = request.GET.get('campus_id')
+    date_from_str = request.GET.get('date_from')
+    date_to_str = request.GET.get('date_to') or date_from_str
+    coach_id = request.GET.get('coach_id')
+    encoding = request.GET.get('encoding', 'ranges')
+
+    if not all([campus_id, date_from_str]):
+        return Response({
+            'error': '缺少必需参数: campus_id, date_from'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date()
+        date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date()
+    except ValueError:
+        return Response({
+            'error': '日期格式错误，请使用 YYYY-MM-DD 格式'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if date_to < date_from:
+        return Response({
+            'error': '结束日期不能早于开始日期'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if (date_to - date_from).days + 1 > MAX_GRID_DAYS:
+        return Response({
+            'error': f'日期范围不能超过{MAX_GRID_DAYS}天'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        campus_id = int(campus_id)
+        slot_minutes = int(request.GET.get('slot_minutes', 60))
+        coach_id = int(coach_id) if coach_id else None
+    except ValueError:
+        return Response({
+            'error': 'campus_id、slot_minutes 和 coach_id 必须为整数'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if slot_minutes not in ALLOWED_SLOT_MINUTES:
+        return Response({
+            'error': f'slot_minutes 仅支持: {", ".join(str(m) for m in ALLOWED_SLOT_MINUTES)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if encoding not in ('ranges', 'bitmap'):
+        return Response({
+            'error': 'encoding 仅支持 ranges 或 bitmap'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    day_start = day_end = None
+    if request.GET.get('day_start') and request.GET.get('day_end'):
+        try:
+            day_start = datetime.strptime(request.GET['day_start'], '%H:%M').time()
+            day_end = datetime.strptime(request.GET['day_end'], '%H:%M').time()
+        except ValueError:
+            return Response({
+                'error': '时间格式错误，请使用 HH:MM 格式'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if day_end <= day_start:
+            return Response({
+                'error': '开始时间必须早于结束时间'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    campus = get_object_or_404(Campus, id=campus_id)
+
+    grid = build_availability_grid(
+        campus, date_from, date_to, slot_minutes,
+        coach_id=coach_id, encoding=encoding,
+        day_start=day_start, day_end=day_end
+    )
+    return Response(grid, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def schedule_cache_stats(request):
+    """课表缓存命中率（管理员排查用），传 reset=true 时清零计数"""
+    if not (request.user.is_superuser or request.user.user_type == 'super_admin'):
+        return Response({'error': '权限不足'}, status=status.HTTP_403_FORBIDDEN)
+
+    stats = schedule_cache.get_stats()
+    if request.GET.get('reset') == 'true':
+        schedule_cache.reset_stats()
+    return Response(stats)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def occupancy_index_check(request):
+    """比对球台占用索引与数据库（管理员排查用）"""
+    if not (request.user.is_superuser or request.user.user_type == 'super_admin'):
+        return Response({'error': '权限不足'}, status=status.HTTP_403_FORBIDDEN)
+
+    campus_id = request.GET.get('campus_id')
+    if not campus_id:
+        return Response({'error': '缺少必需参数: campus_id'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        campus_id = int(campus_id)
+    except ValueError:
+        return Response({'error': 'campus_id 必须为整数'}, status=status.HTTP_400_BAD_REQUEST)
+
+    mismatches = occupancy_index.check_consistency(campus_id)
+    if mismatches is None:
+        return Response({
+            'campus_id': campus_id,
+            'warm': False,
+            'consistent': None,
+            'mismatches': []
+        })
+
+    return Response({
+        'campus_id': campus_id,
+        'warm': True,
+        'consistent': not mismatches,
+        'mismatches': [
+            {key: str(value) if value is not None else None for key, value in item.items()}
+            for item in mismatches
+        ]
+    })
+
+
 class BookingListCreateView(generics.ListCreateAPIView):
     """预约列表和创建视图"""
     serializer_class = BookingSerializer
@@ -200,11 +350,11 @@ class BookingListCreateView(generics.ListCreateAPIView):
         user = self.request.user
         if user.user_type == 'coach':
             return Booking.objects.filter(relation__coach=user).select_related(
-                'relation__coach', 'relation__student', 'table__campus', 'cancellation'
+                'relation__coach', 'relation__student', 'table__campus', 'cancellation__requested_by'
             )
         elif user.user_type == 'student':
             return Booking.objects.filter(relation__student=user).select_related(
-                'relation__coach', 'relation__student', 'table__campus', 'cancellation'
+                'relation__coach', 'relation__student', 'table__campus', 'cancellation__requested_by'
             )
         else:
             return Booking.objects.none()
@@ -249,6 +399,11 @@ class BookingListCreateView(generics.ListCreateAPIView):
                     'booking': serializer.data
                 }, status=status.HTTP_201_CREATED)
                 
+        except ValidationError as e:
+            detail = e.detail[0] if isinstance(e.detail, list) and e.detail else e.detail
+            return Response({
+                'error': f'创建预约失败: {detail}'
+            }, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({
                 'error': f'创建预约失败: {str(e)}'
@@ -261,6 +416,25 @@ class BookingListCreateView(generics.ListCreateAPIView):
             return self.get_my_schedule(request)
         return super().get(request, *args, **kwargs)
     
+    def use_flat_shape(self):
+        """请求是否使用扁平的只读列表结构（shape=flat）"""
+        return self.request.GET.get('shape') == BookingListSerializer.SHAPE
+    
+    def flat_response(self, data):
+        return {'shape': BookingListSerializer.SHAPE, 'version': BookingListSerializer.VERSION, **data}
+    
+    def list(self, request, *args, **kwargs):
+        if not self.use_flat_shape():
+            return super().list(request, *args, **kwargs)
+        
+        rows = BookingListSerializer.project(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(self.flat_response({'results': BookingListSerializer(rows).data}))
+        response = self.get_paginated_response(BookingListSerializer(page).data)
+        response.data = self.flat_response(response.data)
+        return response
+    
     def get_my_schedule(self, request):
         """获取我的课表"""
         from datetime import datetime, time
@@ -270,7 +444,8 @@ class BookingListCreateView(generics.ListCreateAPIView):
         date_from = request.GET.get('date_from')
         date_to = request.GET.get('date_to')
         
-        queryset = self.get_queryset()
+        # 周缓存按整周填充，使用未按日期过滤的查询集
+        base_queryset = queryset = self.get_queryset()
         
         # 应用日期过滤 - 使用时间范围而不是日期过滤
         if date_from:
@@ -295,19 +470,114 @@ class BookingListCreateView(generics.ListCreateAPIView):
             except ValueError:
                 return Response({'error': '日期格式错误'}, status=400)
         
+        if self.use_flat_shape():
+            rows = BookingListSerializer.project(queryset)
+            return Response(self.flat_response({'bookings': BookingListSerializer(rows).data}))
+        
+        # 教练/学员查询指定日期范围时从按周缓存的 JSON 片段拼接，不再逐条序列化
+        if date_from and date_to and request.user.user_type in ('coach', 'student'):
+            fragments = schedule_cache.schedule_fragments(
+                request.user.id, base_queryset, start_datetime, end_datetime,
+                self.get_serializer_class(), self.get_serializer_context()
+            )
+            if fragments is not None:
+                return HttpResponse(
+                    '{"bookings":[' + ','.join(fragments) + ']}',
+                    content_type='application/json'
+                )
+        
         # 序列化数据
         serializer = self.get_serializer(queryset, many=True)
         return Response({'bookings': serializer.data})
 
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def create_recurring_bookings(request):
+    """学员按规则一次创建整学期的周期性预约，任一课次冲突或余额不足时全部不创建"""
+    if request.user.user_type != 'student':
+        return Response({'error': '只有学员可以创建预约'}, status=status.HTTP_403_FORBIDDEN)
+
+    serializer = RecurringBookingSerializer(data=request.data, context={'request': request})
+    if not serializer.is_valid():
+        field, messages = next(iter(serializer.errors.items()))
+        detail = messages[0] if field == 'non_field_errors' else f'{field}: {messages[0]}'
+        return Response({'error': f'创建预约失败: {detail}'}, status=status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data
+    relation, table, slots = data['relation'], data['table'], data['slots']
+    total_fee = data['total_fee'] * len(slots)
+
+    with transaction.atomic():
+        # 按全部课次的总费用检查一次余额（费用在教练确认每节课时扣除）
+        student_account, _ = UserAccount.objects.get_or_create(
+            user=request.user,
+            defaults={'balance': 0.00}
+        )
+        if student_account.balance < total_fee:
+            return Response({
+                'error': f'账户余额不足。当前余额：¥{student_account.balance:.2f}，'
+                         f'{len(slots)}节课共需：¥{total_fee:.2f}，请先充值'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        bookings, conflicts = recurring.create_recurring_bookings(
+            relation, table, slots, data['total_fee'], data.get('notes')
+        )
+        if conflicts:
+            return Response({
+                'error': f'有{len(conflicts)}节课与已有预约冲突，未创建任何预约',
+                'conflicts': [
+                    {
+                        'start_time': conflict['start_time'].isoformat(),
+                        'end_time': conflict['end_time'].isoformat(),
+                        'type': conflict['type'],
+                    }
+                    for conflict in conflicts
+                ]
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        student, coach = relation.student, relation.coach
+        first, last = bookings[0], bookings[-1]
+        Notification.enqueue_notification(
+            recipient=coach,
+            sender=student,
+            title="新的周期预约申请",
+            message=f"学员 {student.real_name or student.username} 申请预约 {len(bookings)} 节课，"
+                    f"时间：{timezone.localtime(first.start_time).strftime('%Y-%m-%d')} 至 "
+                    f"{timezone.localtime(last.start_time).strftime('%Y-%m-%d')} "
+                    f"{timezone.localtime(first.start_time).strftime('%H:%M')}-"
+                    f"{timezone.localtime(first.end_time).strftime('%H:%M')}，请及时处理。",
+            message_type="booking",
+            data={
+                'booking_ids': [booking.id for booking in bookings],
+                'student_id': student.id,
+                'student_name': student.real_name or student.username,
+                'table_id': table.id,
+                'count': len(bookings),
+                'total_fee': float(total_fee),
+                'action': 'recurring_booking_created'
+            }
+        )
+
+    return Response({
+        'message': f'已创建{len(bookings)}节课的预约，等待教练确认',
+        'count': len(bookings),
+        'total_fee': f'{total_fee:.2f}',
+        'bookings': BookingListSerializer(
+            BookingListSerializer.project(
+                Booking.objects.filter(id__in=[booking.id for booking in bookings]).order_by('start_time')
+            )
+        ).data
+    }, status=status.HTTP_201_CREATED)
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def confirm_booking(request, booking_id):
     """教练确认预约并扣除学员费用"""
     try:
         with transaction.atomic():
-            # 获取预约
-            booking = get_object_or_404(Booking, id=booking_id)
+            # 获取预约（加锁，防止重复确认）
+            booking = get_object_or_404(Booking.objects.select_for_update(), id=booking_id)
             
             # 权限检查：只有教练可以确认预约
             if request.user.user_type != 'coach':
@@ -329,32 +599,23 @@ def confirm_booking(request, booking_id):
             
             # 获取学员账户
             student = booking.relation.student
-            try:
-                student_account = UserAccount.objects.get(user=student)
-            except UserAccount.DoesNotExist:
+            if not UserAccount.objects.filter(user=student).exists():
                 return Response({
                     'error': '学员账户不存在'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # 再次检查余额（防止并发问题）
-            if student_account.balance < booking.total_fee:
+            # 扣除费用（条件更新，余额不足时不会扣款）
+            try:
+                payment_record, _ = ledger.debit(
+                    student, booking.total_fee,
+                    idempotency_key=f'booking:{booking.id}:payment',
+                    description=f'预约课程费用 - 教练：{booking.relation.coach.real_name}，时间：{booking.start_time.strftime("%Y-%m-%d %H:%M")}'
+                )
+            except ledger.InsufficientBalance as e:
                 return Response({
-                    'error': f'学员账户余额不足。当前余额：¥{student_account.balance:.2f}，需要：¥{booking.total_fee:.2f}'
+                    'error': f'学员账户余额不足。当前余额：¥{e.available:.2f}，需要：¥{booking.total_fee:.2f}'
                 }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # 扣除费用
-            student_account.balance -= booking.total_fee
-            student_account.save()
-            
-            # 创建交易记录
-            AccountTransaction.objects.create(
-                account=student_account,
-                transaction_type='payment',
-                amount=booking.total_fee,
-                balance_before=student_account.balance + booking.total_fee,
-                balance_after=student_account.balance,
-                description=f'预约课程费用 - 教练：{booking.relation.coach.real_name}，时间：{booking.start_time.strftime("%Y-%m-%d %H:%M")}'
-            )
+            student_balance = payment_record.balance_after
             
             # 更新预约状态
             booking.status = 'confirmed'
@@ -364,7 +625,7 @@ def confirm_booking(request, booking_id):
             # 发送通知给学员
             from notifications.models import Notification
             try:
-                Notification.create_notification(
+                Notification.enqueue_notification(
                     recipient=student,
                     sender=request.user,
                     title="预约已确认",
@@ -399,7 +660,7 @@ def confirm_booking(request, booking_id):
                     'student_id': student.id,
                     'student_name': student.real_name,
                     'amount': float(booking.total_fee),
-                    'student_balance_after': float(student_account.balance),
+                    'student_balance_after': float(student_balance),
                     'start_time': booking.start_time.isoformat(),
                     'end_time': booking.end_time.isoformat()
                 }
@@ -410,7 +671,7 @@ def confirm_booking(request, booking_id):
             return Response({
                 'message': '预约确认成功，费用已扣除',
                 'booking': serializer.data,
-                'student_balance': float(student_account.balance)
+                'student_balance': float(student_balance)
             }, status=status.HTTP_200_OK)
             
     except Exception as e:
@@ -459,7 +720,7 @@ def reject_booking(request, booking_id):
             # 发送通知给学员
             from notifications.models import Notification
             try:
-                Notification.create_notification(
+                Notification.enqueue_notification(
                     recipient=booking.relation.student,
                     sender=request.user,
                     title="预约被拒绝",
@@ -512,6 +773,58 @@ def reject_booking(request, booking_id):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
+def _bulk_booking_ids(request, verb):
+    """解析批量操作的预约ID列表，返回 (ID列表, 错误响应)"""
+    if request.user.user_type != 'coach':
+        return None, Response({'error': f'只有教练可以{verb}预约'}, status=status.HTTP_403_FORBIDDEN)
+    booking_ids = request.data.get('booking_ids')
+    if not isinstance(booking_ids, list) or not booking_ids:
+        return None, Response({'error': '缺少必需参数: booking_ids'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(booking_ids) > bulk_actions.MAX_BULK_BOOKINGS:
+        return None, Response({
+            'error': f'一次最多{verb}{bulk_actions.MAX_BULK_BOOKINGS}个预约'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        return [int(booking_id) for booking_id in booking_ids], None
+    except (TypeError, ValueError):
+        return None, Response({'error': 'booking_ids 必须为整数列表'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _bulk_response(results, verb):
+    succeeded = sum(1 for result in results if result['success'])
+    return Response({
+        'message': f'成功{verb}{succeeded}个预约，失败{len(results) - succeeded}个',
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'results': results
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def bulk_confirm_bookings(request):
+    """教练批量确认预约并扣除学员费用，逐条返回处理结果"""
+    booking_ids, error_response = _bulk_booking_ids(request, '确认')
+    if error_response:
+        return error_response
+    with transaction.atomic():
+        results = bulk_actions.confirm_bookings(request.user, booking_ids, request=request)
+    return _bulk_response(results, '确认')
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def bulk_reject_bookings(request):
+    """教练批量拒绝预约，逐条返回处理结果"""
+    booking_ids, error_response = _bulk_booking_ids(request, '拒绝')
+    if error_response:
+        return error_response
+    reason = request.data.get('reason', '教练拒绝了预约')
+    with transaction.atomic():
+        results = bulk_actions.reject_bookings(request.user, booking_ids, reason, request=request)
+    return _bulk_response(results, '拒绝')
+
+
 class BookingDetailView(generics.RetrieveUpdateDestroyAPIView):
     """预约详情视图"""
     serializer_class = BookingSerializer
@@ -633,7 +946,6 @@ def approve_cancellation(request, cancellation_id):
     """审核取消申请（支持双向审核）"""
     try:
         from .models import BookingCancellation
-        from payments.models import UserAccount, AccountTransaction
         
         # 获取取消申请
         try:
@@ -698,32 +1010,17 @@ def approve_cancellation(request, cancellation_id):
                 if booking.payment_status == 'paid':
                     should_refund = True
                 elif booking.payment_status in ['unpaid', 'pending']:
-                    # 检查是否存在实际的支付交易记录
-                    from payments.models import Payment
-                    payment_exists = Payment.objects.filter(
-                        booking_id=booking.id,
-                        status='approved'
-                    ).exists()
-                    
-                    if payment_exists:
+                    # 检查是否存在实际的扣费交易记录
+                    if ledger.find_transaction(f'booking:{booking.id}:payment') is not None:
                         should_refund = True
-                        print(f"发现数据不一致：预约{booking.id}存在已批准的支付记录但payment_status为{booking.payment_status}")
+                        print(f"发现数据不一致：预约{booking.id}存在扣费记录但payment_status为{booking.payment_status}")
                 
                 if should_refund:
-                    user_account = UserAccount.objects.get(user=booking.relation.student)
-                    
                     # 直接退还金额到账户余额
                     # 注意：对于已确认的预约，金额已经从冻结转为实际扣费，所以只需要增加余额
-                    user_account.balance += booking.total_fee
-                    user_account.save()
-                    
-                    # 创建退款交易记录
-                    AccountTransaction.objects.create(
-                        account=user_account,
-                        transaction_type='refund',
-                        amount=booking.total_fee,
-                        balance_before=user_account.balance - booking.total_fee,
-                        balance_after=user_account.balance,
+                    ledger.refund(
+                        booking.relation.student, booking.total_fee,
+                        idempotency_key=f'booking:{booking.id}:refund',
                         description=f'预约取消退款 - 预约ID: {booking.id}'
                     )
                     
@@ -763,7 +1060,7 @@ def approve_cancellation(request, cancellation_id):
                 # 发送通知给申请人
                 from notifications.models import Notification
                 try:
-                    Notification.create_notification(
+                    Notification.enqueue_notification(
                         recipient=cancellation.requested_by,
                         sender=request.user,
                         title="取消申请已批准",
@@ -817,7 +1114,7 @@ def approve_cancellation(request, cancellation_id):
                 # 发送通知给申请人
                 from notifications.models import Notification
                 try:
-                    Notification.create_notification(
+                    Notification.enqueue_notification(
                         recipient=cancellation.requested_by,
                         sender=request.user,
                         title="取消申请被拒绝",
@@ -905,91 +1202,105 @@ def pending_cancellations(request):
 @permission_classes([permissions.IsAuthenticated])
 def cancel_stats(request):
     """获取用户的取消统计信息"""
-    user = request.user
-    
-    # 获取当前月份的开始时间
-    current_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    # 统计本月取消次数
-    from django.db.models import Q
-    monthly_cancel_count = Booking.objects.filter(
-        Q(relation__coach=user) | Q(relation__student=user),
-        cancelled_at__gte=current_month,
-        cancelled_by=user
-    ).count()
-    
-    # 最大取消次数限制
-    max_monthly_cancels = 3
-    
-    # 是否还能取消
-    can_cancel_more = monthly_cancel_count < max_monthly_cancels
-    
-    return Response({
+    return Response(_cancel_stats(cancel_quota.monthly_count(request.user)))
+
+
+def _cancel_stats(monthly_cancel_count):
+    max_monthly_cancels = cancel_quota.MAX_MONTHLY_CANCELS
+    return {
         'monthly_cancel_count': monthly_cancel_count,
         'max_monthly_cancels': max_monthly_cancels,
-        'can_cancel_more': can_cancel_more,
-        'remaining_cancels': max_monthly_cancels - monthly_cancel_count
-    })
+        'can_cancel_more': monthly_cancel_count < max_monthly_cancels,
+        'remaining_cancels': max(max_monthly_cancels - monthly_cancel_count, 0)
+    }
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def batch_can_cancel(request):
+    """一次判断当前用户能否取消一批预约（booking_ids=1,2,3），附带本月取消统计"""
+    try:
+        booking_ids = [int(value) for value in request.GET.get('booking_ids', '').split(',') if value.strip()]
+    except ValueError:
+        return Response({'error': 'booking_ids 必须为逗号分隔的整数'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(booking_ids) > cancel_quota.MAX_EVALUATE_BOOKINGS:
+        return Response({
+            'error': f'一次最多查询{cancel_quota.MAX_EVALUATE_BOOKINGS}个预约'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    monthly_cancel_count, evaluated = cancel_quota.evaluate(request.user, booking_ids)
+    results = []
+    for booking_id in dict.fromkeys(booking_ids):
+        can_cancel, reason = evaluated.get(booking_id, (False, '预约不存在'))
+        results.append({'booking_id': booking_id, 'can_cancel': can_cancel, 'reason': reason})
+    return Response({**_cancel_stats(monthly_cancel_count), 'results': results})
+
+
+class CoachDirectoryPagination(PageNumberPagination):
+    """教练目录分页"""
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def _coach_directory_entry(coach):
+    """教练目录中的一项；没有教练资料时相关字段为空"""
+    coach_profile = getattr(coach, 'coach_profile', None)
+    return {
+        'id': coach.id,
+        'username': coach.username,
+        'real_name': coach.real_name,
+        'phone': coach.phone,
+        'email': coach.email,
+        'level': coach_profile.coach_level if coach_profile else None,
+        'hourly_rate': float(coach_profile.hourly_rate) if coach_profile and coach_profile.hourly_rate else 0.0,
+        'max_students': coach_profile.max_students if coach_profile else None,
+        'current_students': coach.current_students if coach_profile else 0,
+        'bio': coach_profile.achievements if coach_profile else None,
+        'specialties': None,
+        'is_available': True
+    }
+
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def coach_list(request):
-    """获取教练列表"""
+    """
+    获取教练列表
+    
+    一次查询取出教练、教练资料（select_related）和已通过的学员数（Count 注解）。
+    传 page 参数时按 PageNumberPagination 分页（page_size 可调整），否则返回完整列表。
+    响应带 ETag，客户端携带 If-None-Match 且目录未变化时返回 304。
+    """
     try:
-        from accounts.models import Coach
-        
-        coaches = User.objects.filter(user_type='coach', is_active=True)
+        coaches = User.objects.filter(
+            user_type='coach', is_active=True
+        ).select_related('coach_profile').annotate(
+            current_students=models.Count(
+                'student_relations', filter=models.Q(student_relations__status='approved')
+            )
+        ).order_by('id')
         
-        coach_data = []
-        for coach in coaches:
-            try:
-                coach_profile = Coach.objects.get(user=coach)
-                # 安全地获取current_students_count
-                try:
-                    current_students = coach_profile.current_students_count
-                except Exception as e:
-                    print(f"获取教练 {coach.real_name} 的学员数量失败: {e}")
-                    current_students = 0
-                
-                coach_info = {
-                    'id': coach.id,
-                    'username': coach.username,
-                    'real_name': coach.real_name,
-                    'phone': coach.phone,
-                    'email': coach.email,
-                    'level': coach_profile.coach_level,
-                    'hourly_rate': float(coach_profile.hourly_rate) if coach_profile.hourly_rate else 0.0,
-                    'max_students': coach_profile.max_students,
-                    'current_students': current_students,
-                    'bio': coach_profile.achievements,
-                    'specialties': None,
-                    'is_available': True
-                }
-            except Coach.DoesNotExist:
-                coach_info = {
-                    'id': coach.id,
-                    'username': coach.username,
-                    'real_name': coach.real_name,
-                    'phone': coach.phone,
-                    'email': coach.email,
-                    'level': None,
-                    'hourly_rate': 0.0,
-                    'max_students': None,
-                    'current_students': 0,
-                    'bio': None,
-                    'specialties': None,
-                    'is_available': True
-                }
-            except Exception as e:
-                print(f"处理教练 {coach.real_name} 信息时出错: {e}")
-                continue
-            
-            coach_data.append(coach_info)
+        if 'page' in request.query_params:
+            paginator = CoachDirectoryPagination()
+            page = paginator.paginate_queryset(coaches, request)
+            data = paginator.get_paginated_response([_coach_directory_entry(coach) for coach in page]).data
+        else:
+            data = [_coach_directory_entry(coach) for coach in coaches]
         
-        return Response(coach_data)
+        etag = quote_etag(hashlib.md5(
+            json.dumps(data, sort_keys=True, ensure_ascii=False, cls=DjangoJSONEncoder).encode()
+        ).hexdigest())
+        response = Response(data)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return get_conditional_response(request, etag=etag, response=response)
         
+    except NotFound:
+        raise
     except Exception as e:
-        print(f"获取教练列表失败: {e}")
+        import logging
+        logger = logging.getLogger(__name__)
+        logger.error(f"获取教练列表失败: {e}")
         return Response({
             'error': f'获取教练列表失败: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -1028,7 +1339,7 @@ class CoachChangeRequestListCreateView(generics.ListCreateAPIView):
         # 发送通知给相关人员
         try:
             # 通知当前教练
-            Notification.create_notification(
+            Notification.enqueue_notification(
                 recipient=coach_change_request.current_coach,
                 sender=coach_change_request.student,
                 title="教练更换申请",
@@ -1043,7 +1354,7 @@ class CoachChangeRequestListCreateView(generics.ListCreateAPIView):
             )
             
             # 通知目标教练
-            Notification.create_notification(
+            Notification.enqueue_notification(
                 recipient=coach_change_request.target_coach,
                 sender=coach_change_request.student,
                 title="教练更换申请",
@@ -1058,22 +1369,21 @@ class CoachChangeRequestListCreateView(generics.ListCreateAPIView):
             )
             
             # 通知校区管理员
-            campus_admins = User.objects.filter(user_type='campus_admin')
-            for admin in campus_admins:
-                Notification.create_notification(
-                    recipient=admin,
-                    sender=coach_change_request.student,
-                    title="教练更换申请待审核",
-                    message=f"学员 {coach_change_request.student.real_name or coach_change_request.student.username} 申请更换教练，从 {coach_change_request.current_coach.real_name or coach_change_request.current_coach.username} 更换到 {coach_change_request.target_coach.real_name or coach_change_request.target_coach.username}",
-                    message_type="system",
-                    data={
-                        'request_id': coach_change_request.id,
-                        'student_name': coach_change_request.student.real_name or coach_change_request.student.username,
-                        'current_coach_name': coach_change_request.current_coach.real_name or coach_change_request.current_coach.username,
-                        'target_coach_name': coach_change_request.target_coach.real_name or coach_change_request.target_coach.username,
-                        'reason': coach_change_request.reason
-                    }
-                )
+            campus_admin_ids = User.objects.filter(user_type='campus_admin').values_list('id', flat=True)
+            Notification.enqueue_notifications(
+                recipients=list(campus_admin_ids),
+                sender=coach_change_request.student,
+                title="教练更换申请待审核",
+                message=f"学员 {coach_change_request.student.real_name or coach_change_request.student.username} 申请更换教练，从 {coach_change_request.current_coach.real_name or coach_change_request.current_coach.username} 更换到 {coach_change_request.target_coach.real_name or coach_change_request.target_coach.username}",
+                message_type="system",
+                data={
+                    'request_id': coach_change_request.id,
+                    'student_name': coach_change_request.student.real_name or coach_change_request.student.username,
+                    'current_coach_name': coach_change_request.current_coach.real_name or coach_change_request.current_coach.username,
+                    'target_coach_name': coach_change_request.target_coach.real_name or coach_change_request.target_coach.username,
+                    'reason': coach_change_request.reason
+                }
+            )
         except Exception as e:
             # 通知发送失败不影响主流程
             print(f"发送教练更换申请通知失败: {e}")
@@ -1204,7 +1514,7 @@ def approve_coach_change(request, request_id):
         if coach_change_request.has_rejection:
             # 发送拒绝通知
             try:
-                Notification.create_notification(
+                Notification.enqueue_notification(
                     recipient=coach_change_request.student,
                     sender=user,
                     title="教练更换申请被拒绝",
@@ -1228,7 +1538,7 @@ def approve_coach_change(request, request_id):
             
             # 发送成功通知
             try:
-                Notification.create_notification(
+                Notification.enqueue_notification(
                     recipient=coach_change_request.student,
                     sender=user,
                     title="教练更换申请已通过",
@@ -1247,7 +1557,7 @@ def approve_coach_change(request, request_id):
             try:
                 # 通知学员审批进度
                 approver_name = user.real_name or user.username
-                Notification.create_notification(
+                Notification.enqueue_notification(
                     recipient=coach_change_request.student,
                     sender=user,
                     title="教练更换申请审批进度",
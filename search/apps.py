@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class SearchConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "search"
+    verbose_name = "全文搜索"
+
+    def ready(self):
+        # 注册索引文档类型及其增量更新的信号处理
+        from . import documents  # noqa: F401
@@ -0,0 +1,15 @@
+"""
+注册参与全文搜索的文档类型
+
+    user        用户名、姓名、手机号（学员列表、教练列表、系统日志的操作用户）
+    coach       教练成就（教练列表）
+    system_log  日志描述、资源名称；日志由缓冲区批量写入，未索引的行由 catch_up 补建
+"""
+from accounts.models import Coach, User
+from logs.models import SystemLog
+
+from .index import register
+
+register('user', User, fields=['username', 'real_name', 'phone'])
+register('coach', Coach, fields=['achievements'])
+register('system_log', SystemLog, fields=['description', 'resource_name'], pending_field='search_indexed')
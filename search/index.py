@@ -0,0 +1,247 @@
+"""
+n-gram 倒排索引
+
+各应用的模型通过 register 注册为文档类型，声明参与搜索的字段：
+
+    register('user', User, fields=['username', 'real_name', 'phone'])
+
+保存（post_save）时按字段内容增量更新该文档的词项，删除（post_delete）时删除词项。
+bulk_create 不触发信号，批量写入的模型需要指定 pending_field（默认 False 的布尔字段），
+未索引的行由 catch_up 补建索引；搜索时未索引的行直接参与 icontains 校验，结果不会遗漏。
+
+搜索时先用 candidates 取包含查询词全部词项的文档作为候选，再由调用方原有的 icontains
+条件校验，结果与原来的 LIKE 查询一致，但只需要校验候选行。查询词没有可用词项
+（如单个汉字、两位数字）、候选过多或 settings.SEARCH_INDEX['ENABLED'] 为 False 时不使用索引。
+
+配置（settings.SEARCH_INDEX，均可省略）：
+    ENABLED          是否使用索引，默认 True
+    BATCH_SIZE       批量建索引时每批文档数，默认 500
+    MAX_QUERY_TERMS  查询最多使用的词项数，默认 12
+    MAX_CANDIDATES   候选文档数上限，超过时不使用索引，默认 2000
+"""
+import logging
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+
+from . import tokenizer
+from .models import SearchTerm
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BATCH_SIZE': 500,
+    'MAX_QUERY_TERMS': 12,
+    'MAX_CANDIDATES': 2000,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'SEARCH_INDEX', {}).get(name, DEFAULTS[name])
+
+
+@dataclass
+class Document:
+    doc_type: str
+    model: type
+    fields: list = field(default_factory=list)
+    pending_field: str = None
+
+    def terms(self, obj):
+        result = set()
+        for name in self.fields:
+            result |= tokenizer.terms(str(getattr(obj, name) or ''))
+        return result
+
+
+_documents = {}
+
+
+def register(doc_type, model, fields, pending_field=None):
+    """注册文档类型，fields 为模型上参与搜索的字段名"""
+    document = Document(doc_type, model, list(fields), pending_field)
+    _documents[doc_type] = document
+    post_save.connect(_on_save, sender=model, weak=False, dispatch_uid=f'search:{doc_type}:save')
+    post_delete.connect(_on_delete, sender=model, weak=False, dispatch_uid=f'search:{doc_type}:delete')
+    return document
+
+
+def get_document(doc_type):
+    return _documents[doc_type]
+
+
+def documents():
+    return list(_documents.values())
+
+
+# ---------- 索引维护 ----------
+
+def index_objects(doc_type, objects):
+    """按对象当前的字段内容更新索引（只写入新增和删除的词项），返回处理的对象数量"""
+    document = _documents[doc_type]
+    objects = [obj for obj in objects if obj.pk is not None]
+    if not objects:
+        return 0
+
+    existing = {}
+    for object_id, term in SearchTerm.objects.filter(
+        doc_type=doc_type, object_id__in=[obj.pk for obj in objects]
+    ).values_list('object_id', 'term'):
+        existing.setdefault(object_id, set()).add(term)
+
+    to_create = []
+    with transaction.atomic():
+        for obj in objects:
+            current = existing.get(obj.pk, set())
+            terms = document.terms(obj)
+            removed = current - terms
+            if removed:
+                SearchTerm.objects.filter(doc_type=doc_type, object_id=obj.pk, term__in=removed).delete()
+            to_create.extend(
+                SearchTerm(doc_type=doc_type, object_id=obj.pk, term=term) for term in terms - current
+            )
+        # 并发建索引时同一词项可能已被写入
+        SearchTerm.objects.bulk_create(to_create, batch_size=1000, ignore_conflicts=True)
+        if document.pending_field:
+            document.model.objects.filter(pk__in=[obj.pk for obj in objects]).update(
+                **{document.pending_field: True}
+            )
+    return len(objects)
+
+
+def remove(doc_type, object_ids):
+    SearchTerm.objects.filter(doc_type=doc_type, object_id__in=list(object_ids)).delete()
+
+
+def catch_up(doc_type, limit=None):
+    """为未索引的行（pending_field 为 False）建索引，最多处理 limit 行，返回处理的行数"""
+    document = _documents[doc_type]
+    batch_size = get_setting('BATCH_SIZE')
+    total = 0
+    while limit is None or total < limit:
+        size = batch_size if limit is None else min(batch_size, limit - total)
+        batch = list(
+            document.model.objects.filter(**{document.pending_field: False})
+            .only('pk', *document.fields).order_by('pk')[:size]
+        )
+        if not batch:
+            break
+        total += index_objects(doc_type, batch)
+    return total
+
+
+def rebuild(doc_type):
+    """删除并重建文档类型的全部索引，返回索引的对象数量"""
+    document = _documents[doc_type]
+    batch_size = get_setting('BATCH_SIZE')
+    SearchTerm.objects.filter(doc_type=doc_type).delete()
+    if document.pending_field:
+        document.model.objects.update(**{document.pending_field: False})
+        return catch_up(doc_type)
+
+    total = 0
+    last_pk = 0
+    queryset = document.model.objects.only('pk', *document.fields).order_by('pk')
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return total
+        total += index_objects(doc_type, batch)
+        last_pk = batch[-1].pk
+
+
+def _on_save(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    for document in _documents.values():
+        if document.model is not sender:
+            continue
+        if update_fields is not None and not set(update_fields) & set(document.fields):
+            continue
+        try:
+            index_objects(document.doc_type, [instance])
+        except Exception as e:
+            # 索引失败不影响业务数据保存；pending_field 的行会在下次 catch_up 时补建
+            logger.error(f"更新搜索索引失败 {document.doc_type}:{instance.pk}: {e}")
+
+
+def _on_delete(sender, instance, **kwargs):
+    for document in _documents.values():
+        if document.model is sender:
+            remove(document.doc_type, [instance.pk])
+
+
+# ---------- 搜索 ----------
+
+def matching_ids(doc_type, query, limit):
+    """
+    包含查询词全部词项的文档ID列表。查询词没有可用词项，或匹配超过 limit 个文档
+    （索引不能有效缩小范围，不如直接 icontains）时返回 None。
+    """
+    terms = sorted(tokenizer.terms(query))[:get_setting('MAX_QUERY_TERMS')]
+    if not terms:
+        return None
+    # 按文档数（最多数到 limit + 1）从少到多排列，从最少的词项开始求交集
+    frequency = {
+        term: SearchTerm.objects.filter(doc_type=doc_type, term=term)[:limit + 1].count()
+        for term in terms
+    }
+    terms.sort(key=frequency.get)
+    if frequency[terms[0]] == 0:
+        return []
+    # 逐个词项嵌套 IN 子查询，每层都走 (doc_type, term, object_id) 唯一索引
+    queryset = SearchTerm.objects.filter(doc_type=doc_type, term=terms[0])
+    for term in terms[1:]:
+        queryset = queryset.filter(
+            object_id__in=SearchTerm.objects.filter(doc_type=doc_type, term=term).values('object_id')
+        )
+    ids = list(queryset.values_list('object_id', flat=True)[:limit + 1])
+    return ids if len(ids) <= limit else None
+
+
+def _pending_ids(document, limit):
+    ids = list(document.model.objects.filter(
+        **{document.pending_field: False}
+    ).values_list('pk', flat=True)[:limit + 1])
+    return ids if len(ids) <= limit else None
+
+
+def candidates(query, sources):
+    """
+    候选行条件。sources 为 [(文档类型, 查询集上指向该文档的路径)]，如
+    [('user', 'coach__user'), ('coach', 'coach')]，任一来源命中即为候选。
+    候选ID先查出来再以 IN 列表过滤，主表按主键/外键索引定位。
+    不能使用索引时返回 None。
+    """
+    if not get_setting('ENABLED'):
+        return None
+    limit = get_setting('MAX_CANDIDATES')
+    ids_by_path = {}
+    for doc_type, path in sources:
+        ids = matching_ids(doc_type, query, limit)
+        if ids is None:
+            # 任一来源不能用索引缩小范围时，候选就是全部行
+            return None
+        document = _documents[doc_type]
+        if document.pending_field:
+            # 未索引的行全部作为候选
+            pending = _pending_ids(document, limit)
+            if pending is None:
+                return None
+            ids += pending
+        ids_by_path.setdefault(path, set()).update(ids)
+
+    condition = Q()
+    for path, ids in ids_by_path.items():
+        condition |= Q(**{f'{path}__in': sorted(ids)})
+    return condition
+
+
+def search_filter(query, sources, condition):
+    """在原有的 icontains 条件 condition 上加上索引候选条件"""
+    indexed = candidates(query, sources)
+    return condition if indexed is None else indexed & condition
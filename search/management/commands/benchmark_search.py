@@ -0,0 +1,194 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.test.utils import override_settings
+
+from accounts.models import User
+from logs.models import SystemLog
+from search import index
+from search.models import SearchTerm
+
+BENCHMARK_PREFIX = 'bench_search_'
+BENCHMARK_USER_AGENT = 'benchmark_search'
+
+SURNAMES = '王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴莫孔向汤'
+GIVEN_NAMES = '伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超秀兰霞平刚桂英华飞鑫波斌宇浩凯健俊帆帅旭宁龙林欣佳琪梦雪慧晨阳睿哲思远博文嘉怡'
+LOG_TEMPLATES = [
+    '学员{name}预约了教练{coach}的课程',
+    '学员{name}取消了与教练{coach}的预约',
+    '教练{coach}确认了学员{name}的预约',
+    '用户{name}完成账户充值',
+    '管理员审核通过了{name}的教练申请',
+    '用户{name}修改了个人资料',
+    '学员{name}报名参加月度比赛',
+]
+PHONE_PREFIXES = ['130', '135', '138', '139', '150', '158', '177', '186', '188', '199']
+RESOURCE_NAMES = ['球台预约', '账户充值', '月度比赛', '个人资料', '教练申请']
+
+
+class Command(BaseCommand):
+    help = '生成测试用户和系统日志，比较 icontains 全表扫描与倒排索引的搜索耗时（结束后删除测试数据）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=100000,
+            help='生成的用户数（默认100000）'
+        )
+        parser.add_argument(
+            '--logs',
+            type=int,
+            default=1000000,
+            help='生成的系统日志数（默认1000000）'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='每个查询重复次数（默认5）'
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='保留生成的测试数据'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['logs'] < 1 or options['repeat'] < 1:
+            raise CommandError('--users、--logs、--repeat 必须大于0')
+        if User.objects.filter(username__startswith=BENCHMARK_PREFIX).exists():
+            raise CommandError('存在上次保留的测试数据，请先删除用户名以 bench_search_ 开头的用户')
+
+        self.random = random.Random(42)
+        try:
+            names, phones = self.create_users(options['users'])
+            self.create_logs(options['logs'], names)
+            self.run_queries(names, phones, options['repeat'])
+        finally:
+            if not options['keep']:
+                self.cleanup()
+
+    def timed(self, label, func):
+        started = time.perf_counter()
+        result = func()
+        self.stdout.write(f'{label}：{time.perf_counter() - started:.1f} s')
+        return result
+
+    def random_name(self):
+        return self.random.choice(SURNAMES) + ''.join(
+            self.random.choice(GIVEN_NAMES) for _ in range(self.random.randint(1, 2))
+        )
+
+    def random_phone(self, existing):
+        while True:
+            phone = self.random.choice(PHONE_PREFIXES) + f'{self.random.randrange(10 ** 8):08d}'
+            if phone not in existing:
+                existing.add(phone)
+                return phone
+
+    def create_users(self, count):
+        existing_phones = set(User.objects.values_list('phone', flat=True))
+
+        def create():
+            names, phones = [], []
+            for start in range(0, count, 5000):
+                users = []
+                for number in range(start, min(start + 5000, count)):
+                    name = self.random_name()
+                    phone = self.random_phone(existing_phones)
+                    names.append(name)
+                    phones.append(phone)
+                    users.append(User(
+                        username=f'{BENCHMARK_PREFIX}{number}', password='!', real_name=name,
+                        phone=phone, user_type='student'
+                    ))
+                User.objects.bulk_create(users)
+            return names, phones
+
+        names, phones = self.timed(f'生成 {count} 个用户', create)
+
+        def build():
+            last_pk = 0
+            queryset = User.objects.filter(username__startswith=BENCHMARK_PREFIX).order_by('pk')
+            while True:
+                batch = list(queryset.filter(pk__gt=last_pk)[:index.get_setting('BATCH_SIZE')])
+                if not batch:
+                    return
+                index.index_objects('user', batch)
+                last_pk = batch[-1].pk
+
+        self.timed('建立用户索引', build)
+        return names, phones
+
+    def create_logs(self, count, names):
+        user_ids = list(User.objects.filter(username__startswith=BENCHMARK_PREFIX).values_list('id', flat=True))
+
+        def create():
+            for start in range(0, count, 5000):
+                logs = []
+                for _ in range(start, min(start + 5000, count)):
+                    logs.append(SystemLog(
+                        user_id=self.random.choice(user_ids),
+                        action_type='other',
+                        resource_type='other',
+                        resource_name=self.random.choice(RESOURCE_NAMES),
+                        description=self.random.choice(LOG_TEMPLATES).format(
+                            name=self.random.choice(names), coach=self.random.choice(names)
+                        ),
+                        user_agent=BENCHMARK_USER_AGENT,
+                    ))
+                SystemLog.objects.bulk_create(logs)
+
+        self.timed(f'生成 {count} 条系统日志', create)
+        self.timed('建立日志索引', lambda: index.catch_up('system_log'))
+
+    def run_queries(self, names, phones, repeat):
+        name = self.random.choice([name for name in names if len(name) == 3])
+        phone = self.random.choice(phones)[3:10]
+        students = User.objects.filter(user_type='student', is_active=True)
+        logs = SystemLog.objects.all()
+
+        cases = [
+            ('学员-姓名', name[1:], students, [('user', 'pk')], ['username', 'real_name', 'phone']),
+            ('学员-手机号', phone, students, [('user', 'pk')], ['username', 'real_name', 'phone']),
+            ('日志-描述', '取消了', logs, [('system_log', 'pk'), ('user', 'user')],
+             ['description', 'resource_name', 'user__username', 'user__real_name']),
+            ('日志-用户', name, logs, [('system_log', 'pk'), ('user', 'user')],
+             ['description', 'resource_name', 'user__username', 'user__real_name']),
+        ]
+        for label, query, queryset, sources, fields in cases:
+            condition = Q()
+            for field in fields:
+                condition |= Q(**{f'{field}__icontains': query})
+            with override_settings(SEARCH_INDEX={'ENABLED': False}):
+                before, count = self.measure(queryset, query, sources, condition, repeat)
+            after, indexed_count = self.measure(queryset, query, sources, condition, repeat)
+            if count != indexed_count:
+                raise CommandError(f'{label}：索引查询结果数 {indexed_count} 与 icontains 结果数 {count} 不一致')
+            self.stdout.write(self.style.SUCCESS(
+                f'{label}「{query}」：{count} 条，icontains {before:.1f} ms，索引 {after:.1f} ms'
+            ))
+
+    def measure(self, queryset, query, sources, condition, repeat):
+        """统计总数并取第一页，返回平均耗时（毫秒）和总数"""
+        durations = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            filtered = queryset.filter(index.search_filter(query, sources, condition))
+            count = filtered.count()
+            list(filtered.order_by('-pk')[:20])
+            durations.append((time.perf_counter() - started) * 1000)
+        return sum(durations) / repeat, count
+
+    def cleanup(self):
+        log_ids = SystemLog.objects.filter(user_agent=BENCHMARK_USER_AGENT).values_list('id', flat=True)
+        user_ids = User.objects.filter(username__startswith=BENCHMARK_PREFIX).values_list('id', flat=True)
+        for doc_type, ids in (('system_log', log_ids), ('user', user_ids)):
+            ids = list(ids)
+            for start in range(0, len(ids), 5000):
+                SearchTerm.objects.filter(doc_type=doc_type, object_id__in=ids[start:start + 5000]).delete()
+        SystemLog.objects.filter(user_agent=BENCHMARK_USER_AGENT).delete()
+        User.objects.filter(username__startswith=BENCHMARK_PREFIX).delete()
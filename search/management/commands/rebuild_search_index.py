@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from search import index
+
+
+class Command(BaseCommand):
+    help = '重建全文搜索索引（默认全部文档类型），或只为未索引的行补建索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'doc_types',
+            nargs='*',
+            help='文档类型（user、coach、system_log），默认全部'
+        )
+        parser.add_argument(
+            '--pending',
+            action='store_true',
+            help='只为未索引的行补建索引（仅适用于批量写入的文档类型，如 system_log）'
+        )
+
+    def handle(self, *args, **options):
+        registered = {document.doc_type: document for document in index.documents()}
+        doc_types = options['doc_types'] or list(registered)
+        unknown = [doc_type for doc_type in doc_types if doc_type not in registered]
+        if unknown:
+            raise CommandError(f"未知的文档类型：{', '.join(unknown)}")
+
+        for doc_type in doc_types:
+            if options['pending']:
+                if not registered[doc_type].pending_field:
+                    continue
+                total = index.catch_up(doc_type)
+                self.stdout.write(self.style.SUCCESS(f'{doc_type}：补建 {total} 条索引'))
+            else:
+                total = index.rebuild(doc_type)
+                self.stdout.write(self.style.SUCCESS(f'{doc_type}：重建 {total} 条索引'))
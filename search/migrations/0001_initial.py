@@ -0,0 +1,54 @@
+# Generated by Django 4.2.24 on 2026-10-18 10:22
+
+from django.db import migrations, models
+
+
+def backfill_user_and_coach_terms(apps, schema_editor):
+    """为已有用户和教练建索引；系统日志数量大，由 rebuild_search_index 命令或日志缓冲区逐步补建"""
+    from search.tokenizer import terms
+
+    SearchTerm = apps.get_model('search', 'SearchTerm')
+    User = apps.get_model('accounts', 'User')
+    Coach = apps.get_model('accounts', 'Coach')
+
+    rows = []
+    for user_id, *values in User.objects.values_list('id', 'username', 'real_name', 'phone').iterator():
+        for term in set().union(*(terms(value or '') for value in values)):
+            rows.append(SearchTerm(doc_type='user', object_id=user_id, term=term))
+    for coach_id, achievements in Coach.objects.values_list('id', 'achievements').iterator():
+        for term in terms(achievements or ''):
+            rows.append(SearchTerm(doc_type='coach', object_id=coach_id, term=term))
+    # MySQL 的排序规则不区分大小写和重音，不同词项可能违反唯一约束
+    SearchTerm.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0004_coach_search_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(max_length=32, verbose_name='文档类型')),
+                ('term', models.CharField(max_length=8, verbose_name='词项')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='对象ID')),
+            ],
+            options={
+                'verbose_name': '搜索词项',
+                'verbose_name_plural': '搜索词项',
+                'db_table': 'search_term',
+                'indexes': [models.Index(fields=['doc_type', 'object_id'], name='search_term_doc_typ_b4fbfb_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchterm',
+            constraint=models.UniqueConstraint(fields=('doc_type', 'term', 'object_id'), name='search_term_unique'),
+        ),
+        migrations.RunPython(backfill_user_and_coach_terms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+from django.db import models
+
+
+class SearchTerm(models.Model):
+    """倒排索引：文档（doc_type + object_id）包含的词项"""
+    doc_type = models.CharField(
+        max_length=32,
+        verbose_name='文档类型'
+    )
+    term = models.CharField(
+        max_length=8,
+        verbose_name='词项'
+    )
+    object_id = models.PositiveBigIntegerField(
+        verbose_name='对象ID'
+    )
+
+    class Meta:
+        verbose_name = '搜索词项'
+        verbose_name_plural = '搜索词项'
+        db_table = 'search_term'
+        constraints = [
+            models.UniqueConstraint(fields=['doc_type', 'term', 'object_id'], name='search_term_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['doc_type', 'object_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.doc_type}:{self.object_id} {self.term}"
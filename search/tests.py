@@ -0,0 +1,100 @@
+from django.db.models import Q
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from accounts.models import Coach, User
+from logs.models import SystemLog
+from . import index, tokenizer
+from .models import SearchTerm
+
+
+class TokenizerTest(TestCase):
+    """分词测试"""
+
+    def test_cjk_bigrams_and_word_trigrams(self):
+        self.assertEqual(
+            tokenizer.terms('张三丰 Coach-Wang 1380'),
+            {'张三', '三丰', 'coa', 'oac', 'ach', 'wan', 'ang', '138', '380'}
+        )
+        self.assertEqual(tokenizer.terms('王 ab'), set())
+
+
+class SearchIndexTest(TestCase):
+    """倒排索引维护与搜索测试"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin', password='testpass123', phone='13800138000', user_type='super_admin'
+        )
+        self.zhang = User.objects.create_user(
+            username='zhangsan', password='testpass123', real_name='张三丰',
+            phone='13900000001', user_type='student'
+        )
+        self.li = User.objects.create_user(
+            username='lisi', password='testpass123', real_name='李四',
+            phone='13900000002', user_type='student'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def search_users(self, query):
+        condition = Q(username__icontains=query) | Q(real_name__icontains=query) | Q(phone__icontains=query)
+        return set(User.objects.filter(index.search_filter(query, [('user', 'pk')], condition)))
+
+    def test_index_follows_saves_and_deletes(self):
+        self.assertEqual(self.search_users('三丰'), {self.zhang})
+        self.assertEqual(self.search_users('0000'), {self.zhang, self.li})
+
+        self.zhang.real_name = '张无忌'
+        self.zhang.save()
+        self.assertEqual(self.search_users('三丰'), set())
+        self.assertEqual(self.search_users('无忌'), {self.zhang})
+
+        # 不涉及索引字段的更新不重建索引
+        with self.assertNumQueries(1):
+            self.zhang.save(update_fields=['last_login'])
+
+        user_id = self.li.id
+        self.li.delete()
+        self.assertFalse(SearchTerm.objects.filter(doc_type='user', object_id=user_id).exists())
+
+    def test_candidates_are_verified_by_icontains(self):
+        # “张三”和“三丰”都在索引中，但“张三丰”不是“张三 三丰”的子串
+        self.li.real_name = '张三 三丰'
+        self.li.save()
+        self.assertEqual(self.search_users('张三丰'), {self.zhang})
+        # 没有可用词项时回退到 icontains
+        self.assertEqual(self.search_users('张'), {self.zhang, self.li})
+
+    def test_bulk_created_logs_searchable_before_and_after_catch_up(self):
+        SystemLog.objects.bulk_create([
+            SystemLog(user=self.zhang, action_type='cancel', resource_type='booking', description='取消了预约'),
+            SystemLog(user=self.li, action_type='create', resource_type='booking', description='创建了预约'),
+        ])
+
+        response = self.client.get('/api/logs/api/system-logs/', {'search': '取消'})
+        self.assertEqual([item['description'] for item in response.data['results']], ['取消了预约'])
+
+        self.assertEqual(index.catch_up('system_log'), 2)
+        self.assertFalse(SystemLog.objects.filter(search_indexed=False).exists())
+        response = self.client.get('/api/logs/api/system-logs/', {'search': '取消'})
+        self.assertEqual([item['description'] for item in response.data['results']], ['取消了预约'])
+        response = self.client.get('/api/logs/api/system-logs/', {'search': '三丰'})
+        self.assertEqual([item['description'] for item in response.data['results']], ['取消了预约'])
+
+    def test_endpoints_use_index(self):
+        coach_user = User.objects.create_user(
+            username='coachwang', password='testpass123', real_name='王教练',
+            phone='13900000003', user_type='coach'
+        )
+        Coach.objects.create(user=coach_user, status='approved', achievements='全国乒乓球锦标赛冠军')
+
+        response = self.client.get('/api/accounts/coaches/', {'search': '锦标赛'})
+        self.assertEqual([item['user'] for item in response.data['results']], [coach_user.id])
+
+        response = self.client.get('/api/payments/api/admin/students/', {'search': '三丰'})
+        self.assertEqual([item['id'] for item in response.data['data']['students']], [self.zhang.id])
+
+        index.rebuild('user')
+        response = self.client.get('/api/payments/api/admin/students/', {'search': '0000'})
+        self.assertEqual(response.data['data']['total'], 2)
@@ -0,0 +1,31 @@
+"""
+分词
+
+文本按连续的中日韩汉字和连续的字母数字切分成片段（空白和标点作为分隔符），
+汉字片段切成二元组（bigram），字母数字片段转小写后切成三元组（trigram）。
+短于 n 的片段不产生词项。
+
+子串匹配的文本一定包含查询词的全部词项，所以“包含全部词项”的文档是 icontains 结果的超集，
+再用原有的 icontains 条件校验即可得到相同的结果。
+"""
+import re
+
+CJK_RANGES = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+SEGMENT_RE = re.compile(rf'[{CJK_RANGES}]+|[^\W_{CJK_RANGES}]+')
+CJK_RE = re.compile(rf'[{CJK_RANGES}]')
+
+CJK_GRAM_SIZE = 2
+WORD_GRAM_SIZE = 3
+
+
+def _grams(segment, size):
+    return {segment[i:i + size] for i in range(len(segment) - size + 1)}
+
+
+def terms(text):
+    """返回文本的词项集合"""
+    result = set()
+    for segment in SEGMENT_RE.findall((text or '').lower()):
+        size = CJK_GRAM_SIZE if CJK_RE.match(segment) else WORD_GRAM_SIZE
+        result |= _grams(segment, size)
+    return result